@@ -0,0 +1,58 @@
+import argparse
+import src.service as sv
+
+
+if __name__ == '__main__':
+    '''
+    Serve Dektak step height and feature width analysis over HTTP on
+    localhost, with warm worker processes, e.g.
+        python analysis_service.py --port 8765 --workers 4
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='address to listen on')
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=8765,
+        help='port to listen on')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='worker processes, default one per CPU')
+    parser.add_argument(
+        '--max-pending',
+        type=int,
+        default=8,
+        help='requests queued or running at once')
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=32,
+        help='jobs sent to a worker in one go')
+    parser.add_argument(
+        '--cache-path',
+        default=None,
+        help='result cache directory')
+    arguments = parser.parse_args()
+    service = sv.AnalysisService(
+        workers=arguments.workers,
+        max_pending=arguments.max_pending,
+        batch_size=arguments.batch_size,
+        cache_path=arguments.cache_path)
+    server = sv.serve(
+        host=arguments.host,
+        port=arguments.port,
+        service=service,
+        verbose=True)
+    print(f'Serving on http://{arguments.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
@@ -9,7 +9,8 @@ def batch_grating_thickness(batch_name,
                             parent_directory,
                             file_paths,
                             plot_files,
-                            figure_path):
+                            figure_path,
+                            grating_mode='Manual'):
     '''
     Calculate sample batch grating thicknesses, and error, from individual files
     within batch.
@@ -19,6 +20,8 @@ def batch_grating_thickness(batch_name,
         filepaths: <array> array of target file paths
         plot_files: <string> "True" or "False" for plotting output
         figure_path: <string> path to results for figure save
+        grating_mode: <string> "Manual" for two selected regions, "Periods"
+            for automatic per-period step heights
     Returns:
         results_dictionary: <dict>
             Batch Name
@@ -27,6 +30,7 @@ def batch_grating_thickness(batch_name,
             Sample Name
             Grating Period
             Individual grating thicknesses and errors
+            Individual measured grating periods and duty cycles
             Individual regions of interest
             Individual trim indices
     '''
@@ -34,30 +38,53 @@ def batch_grating_thickness(batch_name,
         parent=parent_directory,
         batch_name=batch_name,
         file_paths=file_paths)
+    laterals = []
+    profiles = []
+    sample_names = []
     for file in file_paths:
         sample_details = fp.sample_information(file_path=file)
         for key, value in sample_details.items():
             if key in batch_dictionary.keys():
                 batch_dictionary[key].append(value)
         lateral, profile = io.read_thickness_file(
-            parent_directory=parent_directory,
-            file_path=file)
+            file_path=file,
+            file_type=parent_directory)
         out_string = sample_details[f'{parent_directory} Secondary String']
-        thickness_results = anal.calculate_grating_thickness(
-            x_array=lateral,
-            y_array=profile,
-            file_name=sample_details[f'{parent_directory} File Name'],
-            sample_name=sample_details[f'{parent_directory} Secondary String'],
-            plot_files=plot_files,
-            out_path=Path(
-                f'{figure_path}/'
-                f'{batch_name}_{out_string}'
-                f'_GratingThickness.png'),
-            graph_path=Path(
-                f'{figure_path}/'
-                f'{batch_name}_{out_string}'
-                f'_Plain.png'))
+        laterals.append(lateral)
+        profiles.append(profile)
+        sample_names.append(out_string)
+        if grating_mode == 'Periods':
+            thickness_results = anal.calculate_grating_distribution(
+                x_array=lateral,
+                y_array=profile,
+                file_name=sample_details[f'{parent_directory} File Name'],
+                sample_name=out_string,
+                plot_files=plot_files,
+                graph_path=Path(
+                    f'{figure_path}/'
+                    f'{batch_name}_{out_string}'
+                    f'_Plain.png'))
+        else:
+            thickness_results = anal.calculate_grating_thickness(
+                x_array=lateral,
+                y_array=profile,
+                file_name=sample_details[f'{parent_directory} File Name'],
+                sample_name=out_string,
+                plot_files=plot_files,
+                out_path=Path(
+                    f'{figure_path}/'
+                    f'{batch_name}_{out_string}'
+                    f'_GratingThickness.png'),
+                graph_path=Path(
+                    f'{figure_path}/'
+                    f'{batch_name}_{out_string}'
+                    f'_Plain.png'))
         batch_dictionary.update(thickness_results)
+    period_results = anal.calculate_grating_periods(
+        x_arrays=laterals,
+        y_arrays=profiles,
+        sample_names=sample_names)
+    batch_dictionary.update(period_results)
     return batch_dictionary
 
 
@@ -83,7 +110,8 @@ if __name__ == '__main__':
                 parent_directory=parent,
                 file_paths=filepaths,
                 plot_files=info['Plot Figures'],
-                figure_path=Path(f'{directory_paths["Results Path"]}'))
+                figure_path=Path(f'{directory_paths["Results Path"]}'),
+                grating_mode=info.get('Grating Mode', 'Manual'))
 
             io.save_json_dicts(
                 out_path=out_file,
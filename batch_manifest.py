@@ -0,0 +1,22 @@
+import sys
+import src.fileIO as io
+import src.manifest as mf
+
+from pathlib import Path
+
+
+if __name__ == '__main__':
+    '''
+    Root setup for Notebooks repository as root directory. A manifest path
+    can be given as the first command line argument instead.
+    '''
+    root = Path().absolute()
+    if len(sys.argv) > 1:
+        manifest_path = Path(sys.argv[1])
+    else:
+        manifest_path = Path(
+            f'{root}/SurfaceProfileAnalysis/dektak_manifest.json')
+    manifest = io.load_json(file_path=manifest_path)
+    results = mf.run_manifest(manifest=manifest)
+    for out_path in results.keys():
+        print(f'Saved {out_path}')
@@ -1,30 +1,760 @@
+import asyncio
+import zipfile
 import src.fileIO as io
 import src.filepaths as fp
 import src.analysis as anal
 import src.datalevelling as dl
+import src.manifest as man
+import src.prefetch as pf
+import src.pipeline as pl
+import src.resultlog as rl
+import src.resultcache as rc
 
 from pathlib import Path
+from functools import partial
+from src.report import BatchReport
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def open_report(out_path : str,
+                batch_dictionary : dict,
+                suffix : str) -> BatchReport:
+    """
+    Open the batch report if the batch dictionary asks for one.
+
+    Parameters
+    ----------
+    out_path: string
+        Path to save.
+    batch_dictionary: dictionary
+        Batch dictionary. If "report" is "True", figures are collected into
+        {batch_name}_{suffix}_Report.pdf instead of one png per file.
+    suffix: string
+        "Height" or "Width".
+
+    Returns
+    -------
+    report: BatchReport
+        Open report, or None for one png per file.
+
+    See Also
+    --------
+    BatchReport
+    figure_path
+
+    Notes
+    -----
+    With "resume" set to "True" an existing report is kept, and the resumed
+    run writes to {batch_name}_{suffix}_Report_resumed.pdf, or
+    _resumed_2.pdf and so on, as a PDF cannot be appended to.
+
+    Example
+    -------
+    None
+
+    """
+    if batch_dictionary.get("report", "False") != "True":
+        return None
+    stem = f'{out_path}/{batch_dictionary["batch_name"]}_{suffix}_Report'
+    report_path = Path(f'{stem}.pdf')
+    if batch_dictionary.get("resume", "False") == "True":
+        run = 1
+        while report_path.is_file():
+            report_path = Path(
+                f'{stem}_resumed.pdf' if run == 1 else
+                f'{stem}_resumed_{run}.pdf')
+            run += 1
+    return BatchReport(out_path=report_path)
+
+
+def figure_path(report : BatchReport,
+                out_path : str,
+                file_name : str,
+                suffix : str) -> Path:
+    """
+    Where to save the figure for one file.
+
+    Parameters
+    ----------
+    report: BatchReport
+        Open batch report, or None.
+    out_path, file_name, suffix: string
+        Path to save, file name, "Height" or "Width".
+
+    Returns
+    -------
+    figure_path: Path
+        {file_name}_{suffix}.png, or a page of the report.
+
+    See Also
+    --------
+    open_report
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    if report is None:
+        return Path(f'{out_path}/{file_name}_{suffix}.png')
+    return report.page(title=file_name)
+
+
+def summarise_report(report : BatchReport,
+                     results_dictionary : dict,
+                     key : str,
+                     file_names : list = None) -> None:
+    """
+    Add the batch summary page to the end of the batch report.
+
+    Parameters
+    ----------
+    report: BatchReport
+        Open batch report, or None.
+    results_dictionary: dictionary
+        Batch results with the individual file results and the average.
+    key: string
+        Result key, "Thickness" or "Width".
+    file_names: list
+        Names the results are keyed by, default the batch file names.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    BatchReport
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    if report is None:
+        return
+    if file_names is None:
+        file_names = [
+            fp.get_filename(file_path=file)
+            for file in results_dictionary["data_files"]]
+    file_results = {}
+    for file_name in file_names:
+        if f'{file_name} {key}' in results_dictionary:
+            file_results[file_name] = (
+                results_dictionary[f'{file_name} {key}'],
+                results_dictionary[f'{file_name} {key} Error'])
+    report.add_summary(
+        batch_name=results_dictionary["batch_name"],
+        results={
+            "Average Result": results_dictionary.get(
+                "Average Result", float('nan')),
+            "Average Error": results_dictionary.get(
+                "Average Error", float('nan'))},
+        file_results=file_results)
+
+
+def open_log(out_path : str,
+             batch_dictionary : dict,
+             suffix : str) -> rl.ResultLog:
+    """
+    Open the results log of a batch, {batch_name}_{suffix}.jsonl.
+
+    Parameters
+    ----------
+    out_path: string
+        Path to save.
+    batch_dictionary: dictionary
+        Batch dictionary. If "resume" is "True", files already recorded in
+        the log are skipped, otherwise the log is started again.
+    suffix: string
+        "Height" or "Width".
+
+    Returns
+    -------
+    log: ResultLog
+        Open results log.
+
+    See Also
+    --------
+    ResultLog
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    return rl.ResultLog(
+        out_path=Path(
+            f'{out_path}/{batch_dictionary["batch_name"]}_{suffix}.jsonl'),
+        resume=batch_dictionary.get("resume", "False") == "True",
+        sync_every=batch_dictionary.get("log_sync", 16))
+
+
+def log_file_results(log : rl.ResultLog,
+                     process : object,
+                     **kwargs) -> None:
+    """
+    Process one file and record its results, or its error, in the log.
+
+    Parameters
+    ----------
+    log: ResultLog
+        Open results log.
+    process: function
+        Analysis function returning the results dictionary of one file.
+    **kwargs
+        Keyword arguments for process, including file_name.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    open_log
+
+    Notes
+    -----
+    A file that fails is reported and recorded as "{file name} Error", so
+    the rest of the batch carries on and a resumed batch tries it again.
+
+    Example
+    -------
+    None
+
+    """
+    file_name = kwargs["file_name"]
+    try:
+        file_results = process(**kwargs)
+    except Exception as error:
+        print(f'{file_name}: {error}')
+        file_results = {f'{file_name} Error': str(error)}
+    log.append(
+        file_name=file_name,
+        results=file_results)
+
+
+def log_edge_widths(log : rl.ResultLog,
+                    pending : list,
+                    out_paths : list,
+                    batch_dictionary : dict) -> None:
+    """
+    Find edge widths for every pending file and record each in the log.
+
+    Parameters
+    ----------
+    log: ResultLog
+        Open results log.
+    pending: list
+        (file path, file name) pairs not yet in the log.
+    out_paths: list
+        Figure path for each pending file.
+    batch_dictionary: dictionary
+        Batch dictionary containing the plotting dictionary.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    calculate_dektak_edge_widths
+
+    Notes
+    -----
+    The files are processed together, then logged one at a time.
+
+    Example
+    -------
+    None
+
+    """
+    file_paths, file_names = zip(*pending)
+    try:
+        width_results = anal.calculate_dektak_edge_widths(
+            file_paths=file_paths,
+            file_names=file_names,
+            out_paths=out_paths,
+            plot_dict=batch_dictionary,
+            height_fraction=batch_dictionary.get("edge_fraction", 0.5))
+    except Exception as error:
+        print(f'{batch_dictionary["batch_name"]}: {error}')
+        width_results = {
+            f'{file_name} Error': str(error) for file_name in file_names}
+    for file_name in file_names:
+        log.append(
+            file_name=file_name,
+            results={
+                key: width_results[key]
+                for key in (
+                    f'{file_name} Width',
+                    f'{file_name} Width Error',
+                    f'{file_name} Edges',
+                    f'{file_name} Error')
+                if key in width_results})
+
+
+def prepare_step_file(item : tuple) -> tuple:
+    """
+    Read a Dektak file, suggest its regions of interest and reduce it for
+    the selection graph.
+
+    Parameters
+    ----------
+    item: tuple
+        (file path, file name) pair.
+
+    Returns
+    -------
+    lateral, profile, suggestion, display: tuple
+        x- and y-data arrays, suggested (range_left, range_right) and the
+        (x, y) arrays to draw.
+
+    See Also
+    --------
+    suggest_regions
+    display_trace
+    pipelined_step_height
+
+    Notes
+    -----
+    Runs on the prefetch thread. The figure itself is created on the main
+    thread, as GUI backends require.
+
+    Example
+    -------
+    None
+
+    """
+    file, _ = item
+    lateral, profile = io.read_thickness_file(
+        file_path=file,
+        file_type="Dektak")
+    suggestion = dl.suggest_regions(
+        x=lateral,
+        y=profile)
+    display = dl.display_trace(
+        x=lateral,
+        y=profile)
+    return lateral, profile, suggestion, display
+
+
+def pipelined_step_height(log : rl.ResultLog,
+                          pending : list,
+                          report : BatchReport,
+                          out_path : str,
+                          batch_dictionary : dict) -> None:
+    """
+    Measure step heights with reading and fitting kept off the user's path.
+
+    Parameters
+    ----------
+    log: ResultLog
+        Open results log.
+    pending: list
+        (file path, file name) pairs not yet in the log.
+    report: BatchReport
+        Open batch report, or None.
+    out_path: string
+        Path to save.
+    batch_dictionary: dictionary
+        Batch dictionary containing the plotting dictionary. "lookahead"
+        sets how many files are read ahead, default 2.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    prefetch
+    prepare_step_file
+    level_regions_interests
+    calculated_level_film_thickness
+
+    Notes
+    -----
+    A prefetch thread reads upcoming files, suggests their regions and
+    reduces them to the points the selection graph can show, so each
+    selection window opens as soon as the last one closes. Pressing
+    enter accepts the shaded suggestion. The fit, figure and log entry for
+    each selection are then queued on a second thread while the user moves
+    on, and every queued fit is finished before returning. Selection windows
+    are created and drawn serially on the main thread, as GUI backends
+    require, and the fit figures are drawn one at a time on the fitting
+    thread. All log entries are
+    written from the fitting thread, in file order.
+
+    Example
+    -------
+    None
+
+    """
+    with ThreadPoolExecutor(max_workers=1) as fitter:
+        for (file, file_name), prepared in pf.prefetch(
+                items=pending,
+                load=prepare_step_file,
+                lookahead=batch_dictionary.get("lookahead", 2)):
+            try:
+                lateral, profile, suggestion, display = prepared.result()
+                range_left, range_right = dl.level_regions_interests(
+                    x=lateral,
+                    y=profile,
+                    file_name=file_name,
+                    suggestion=suggestion,
+                    display=display)
+            except Exception as error:
+                print(f'{file_name}: {error}')
+                fitter.submit(
+                    log.append,
+                    file_name=file_name,
+                    results={f'{file_name} Error': str(error)})
+                continue
+            fitter.submit(
+                log_file_results,
+                log=log,
+                process=dl.calculated_level_film_thickness,
+                x_array=lateral,
+                y_array=profile,
+                file_name=file_name,
+                plot_dict=batch_dictionary,
+                out_path=figure_path(
+                    report=report,
+                    out_path=out_path,
+                    file_name=file_name,
+                    suffix='Height'),
+                range_left=range_left,
+                range_right=range_right)
+
+
+def staged_step_height(log : rl.ResultLog,
+                       pending : list,
+                       report : BatchReport,
+                       out_path : str,
+                       batch_dictionary : dict) -> None:
+    """
+    Measure step heights unattended with every stage of the work at once.
+
+    Parameters
+    ----------
+    log: ResultLog
+        Open results log.
+    pending: list
+        (file path, file name) pairs not yet in the log.
+    report: BatchReport
+        Open batch report, or None.
+    out_path: string
+        Path to save.
+    batch_dictionary: dictionary
+        Batch dictionary containing the plotting dictionary. "stage_workers"
+        sets how many files each stage works on at once, {"read": 2,
+        "parse": 2, "fit": 2, "render": 1} by default, and "queue_size" how
+        many files may wait between two stages, default 4. "regions" gives
+        {file name: [range_left, range_right]}.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    run_pipeline
+    fit_stage
+    pipelined_step_height
+
+    Notes
+    -----
+    Files are read on I/O threads, parsed on parsing threads, fitted in
+    worker processes, drawn on rendering threads and logged in the event
+    loop, in completion order. The bounded queues between stages hold back
+    reading when fitting or drawing falls behind, so memory stays bounded
+    however long the batch. Files without "regions" use the suggested
+    regions, as no one is there to select them. With a batch report open,
+    pages are drawn one at a time.
+
+    Example
+    -------
+    None
+
+    """
+    stage_workers = dict(
+        {"read": 2, "parse": 2, "fit": 2, "render": 1},
+        **batch_dictionary.get("stage_workers", {}))
+    if report is not None:
+        stage_workers["render"] = 1
+    regions = batch_dictionary.get("regions", {})
+    out_paths = {
+        file_name: figure_path(
+            report=report,
+            out_path=out_path,
+            file_name=file_name,
+            suffix='Height')
+        for _, file_name in pending}
+    items = [
+        {
+            "file_path": file,
+            "file_name": file_name,
+            "regions": regions.get(file_name),
+            "plot_dict": batch_dictionary}
+        for file, file_name in pending]
+    with (
+            ThreadPoolExecutor(max_workers=stage_workers["read"]) as readers,
+            ThreadPoolExecutor(max_workers=stage_workers["parse"]) as parsers,
+            ProcessPoolExecutor(
+                max_workers=stage_workers["fit"],
+                initializer=man.initialise_worker,
+                initargs=(
+                    batch_dictionary.get("cache_path"),
+                    batch_dictionary.get("cache_size", 256))) as fitters,
+            ThreadPoolExecutor(
+                max_workers=stage_workers["render"]) as renderers):
+        outputs = asyncio.run(pl.run_pipeline(
+            items=items,
+            stages=[
+                pl.Stage(
+                    name='read',
+                    function=pl.read_stage,
+                    concurrency=stage_workers["read"],
+                    executor=readers),
+                pl.Stage(
+                    name='parse',
+                    function=pl.parse_stage,
+                    concurrency=stage_workers["parse"],
+                    executor=parsers),
+                pl.Stage(
+                    name='fit',
+                    function=pl.fit_stage,
+                    concurrency=stage_workers["fit"],
+                    executor=fitters,
+                    combine=pl.merge_stage),
+                pl.Stage(
+                    name='render',
+                    function=partial(pl.render_stage, out_paths=out_paths),
+                    concurrency=stage_workers["render"],
+                    executor=renderers),
+                pl.Stage(
+                    name='write',
+                    function=lambda value: log.append(
+                        file_name=value["file_name"],
+                        results=value["step_results"]))],
+            queue_size=batch_dictionary.get("queue_size", 4)))
+    for (_, file_name), (_, error) in zip(pending, outputs):
+        if error is not None:
+            print(f'{file_name}: {error}')
+            log.append(
+                file_name=file_name,
+                results={f'{file_name} Error': error})
+
+
+def reference_scan(file_paths : list,
+                   batch_dictionary : dict) -> dict:
+    """
+    Read the reference scan of a batch and its regions of interest.
+
+    Parameters
+    ----------
+    file_paths: list
+        Batch file paths.
+    batch_dictionary: dictionary
+        Batch dictionary whose "roi_reference" is the file name of a batch
+        file, or the path to any Dektak scan.
+
+    Returns
+    -------
+    reference: dictionary
+        {
+            "Lateral": x-data array,\n
+            "Profile": y-data array,\n
+            "Regions": [range_left, range_right]
+        }
+
+    See Also
+    --------
+    calculate_matched_dektak_thicks
+
+    Notes
+    -----
+    The regions are taken from the batch "regions" dictionary if it has the
+    reference, otherwise they are selected once, with the suggested regions
+    shaded.
+
+    Example
+    -------
+    None
+
+    """
+    reference = batch_dictionary["roi_reference"]
+    named = {fp.get_filename(file_path=file): file for file in file_paths}
+    file = named.get(reference, reference)
+    file_name = fp.get_filename(file_path=file)
+    lateral, profile = io.read_thickness_file(
+        file_path=file,
+        file_type="Dektak")
+    regions = batch_dictionary.get("regions", {}).get(file_name)
+    if regions is None:
+        regions = dl.level_regions_interests(
+            x=lateral,
+            y=profile,
+            file_name=file_name,
+            suggestion=dl.suggest_regions(
+                x=lateral,
+                y=profile))
+    return {
+        "Lateral": lateral,
+        "Profile": profile,
+        "Regions": [
+            [float(bound) for bound in x_range] for x_range in regions]}
+
+
+def scan_groups(file_paths : list,
+                batch_dictionary : dict) -> dict:
+    """
+    Group repeated scans of the same feature for averaging.
+
+    Parameters
+    ----------
+    file_paths: list
+        List of files to process as paths.
+    batch_dictionary: dictionary
+        Batch dictionary. "scan_groups" may give {group name: [file names]};
+        without it every file is one group named after the batch.
+
+    Returns
+    -------
+    groups: dictionary
+        {group name: [file paths]}.
+
+    See Also
+    --------
+    calculate_averaged_dektak_thicks
+
+    Notes
+    -----
+    Files are matched to groups by file name, with or without extension.
+    Files in no group are left out.
+
+    Example
+    -------
+    None
+
+    """
+    groups = batch_dictionary.get("scan_groups")
+    if not groups:
+        return {batch_dictionary["batch_name"]: list(file_paths)}
+    return {
+        group: [
+            file for file in file_paths
+            if Path(file).name in files
+            or fp.get_filename(file_path=file) in files]
+        for group, files in groups.items()}
 
 
 def step_widths(file_paths : list,
                 out_path : str,
                 batch_dictionary : dict) -> dict:
     """
+    Calculate the feature width of a feature for the Bruker Dektak.
+
+    Measure feature widths for multiple measurements on the same sample/batch
+    of samples, either from a selected region or from automatically detected
+    edges. Take an average.
+
+    Parameters
+    ----------
+    file_paths: list
+        List of files to process as paths.
+    out_path: string
+        Path to save.
+    batch_dictionary: dictionary
+        Batch dictionary containing batch name, file names, and data path. It
+        should also contain the plotting dictionary. If "width_method" is
+        "edges", widths are taken between edges found at "edge_fraction" of
+        the feature height, otherwise from a selected region.
+
+    Returns
+    -------
+    results_dictionary: dictionary
+        Feature widths and errors for individual files and the average.
+
+    See Also
+    --------
+    calculate_dektak_widths
+    calculate_dektak_edge_widths
+
+    Notes
+    -----
+    Each file's results are appended to {batch_name}_Width.jsonl as soon as
+    they exist, and the results dictionary is assembled from that log. With
+    "resume" set to "True" files already in the log are skipped.
+
+    Example
+    -------
+    None
+
     """
-    feature_widths = []
-    for file in file_paths:
-        file_name = fp.get_filename(file_path=file)
-        feature_results = anal.calculate_dektak_widths(
-            file_path=file,
-            file_name=file_name,
-            out_path=Path(f'{out_path}/{file_name}_Width.png'),
-            plot_dict=batch_dictionary)
-        batch_dictionary.update(feature_results)
-        feature_widths.append(feature_results[f'{file_name} Width'])
-    width_results = anal.average_step_and_error(x=feature_widths)
-    results_dictionary = dict(
-        batch_dictionary,
-        **width_results)
+    file_names = [fp.get_filename(file_path=file) for file in file_paths]
+    report = open_report(
+        out_path=out_path,
+        batch_dictionary=batch_dictionary,
+        suffix='Width')
+    try:
+        with open_log(
+                out_path=out_path,
+                batch_dictionary=batch_dictionary,
+                suffix='Width') as log:
+            pending = [
+                (file, file_name)
+                for file, file_name in zip(file_paths, file_names)
+                if file_name not in log.completed]
+            if batch_dictionary.get("width_method", "manual") == "edges":
+                if pending:
+                    log_edge_widths(
+                        log=log,
+                        pending=pending,
+                        out_paths=[
+                            figure_path(
+                                report=report,
+                                out_path=out_path,
+                                file_name=file_name,
+                                suffix='Width')
+                            for _, file_name in pending],
+                        batch_dictionary=batch_dictionary)
+            else:
+                for file, file_name in pending:
+                    log_file_results(
+                        log=log,
+                        process=anal.calculate_dektak_widths,
+                        file_path=file,
+                        file_name=file_name,
+                        out_path=figure_path(
+                            report=report,
+                            out_path=out_path,
+                            file_name=file_name,
+                            suffix='Width'),
+                        plot_dict=batch_dictionary)
+        results_dictionary = man.batch_results(
+            batch_dictionary=batch_dictionary,
+            process="width",
+            file_results=rl.read_result_log(file_path=log.out_path))
+        summarise_report(
+            report=report,
+            results_dictionary=results_dictionary,
+            key='Width')
+    finally:
+        if report is not None:
+            report.close()
     return results_dictionary
 
 
@@ -55,23 +785,117 @@ def step_height(file_paths : list,
     --------
     Notes
     -----
+    Each file's results are appended to {batch_name}_Height.jsonl as soon as
+    they exist, and the results dictionary is assembled from that log. With
+    "resume" set to "True" files already in the log are skipped. With
+    "pipeline" set to "True" files are read and fitted in the background,
+    see pipelined_step_height. With "staged" set to "True" files are read,
+    parsed, fitted, drawn and logged by concurrent stages without user
+    input, see staged_step_height. With "roi_reference" naming a reference
+    scan, regions selected on it are carried over to every file, see
+    calculate_matched_dektak_thicks. With "average_scans" set to "True" repeated
+    scans are aligned and averaged and each group is fitted once, see
+    scan_groups; a single group's average is its own fit and error.
     Example
     -------
     """
-    film_thicknesses = []
-    for file in file_paths:
-        file_name = fp.get_filename(file_path=file)
-        step_results = anal.calculate_dektak_thicks(
-            file_path=file,
-            file_name=file_name,
-            plot_dict=batch_dictionary,
-            out_path=Path(f'{out_path}/{file_name}_Height.png'))
-        batch_dictionary.update(step_results)
-        film_thicknesses.append(step_results[f'{file_name} Thickness'])
-    thickness_results = anal.average_step_and_error(x=film_thicknesses)
-    results_dictionary = dict(
-        batch_dictionary,
-        **thickness_results)
+    report = open_report(
+        out_path=out_path,
+        batch_dictionary=batch_dictionary,
+        suffix='Height')
+    try:
+        with open_log(
+                out_path=out_path,
+                batch_dictionary=batch_dictionary,
+                suffix='Height') as log:
+            groups = None
+            if batch_dictionary.get("average_scans", "False") == "True":
+                groups = scan_groups(
+                    file_paths=file_paths,
+                    batch_dictionary=batch_dictionary)
+                for group, group_paths in groups.items():
+                    if group in log.completed:
+                        continue
+                    log_file_results(
+                        log=log,
+                        process=anal.calculate_averaged_dektak_thicks,
+                        file_paths=group_paths,
+                        file_name=group,
+                        plot_dict=batch_dictionary,
+                        out_path=figure_path(
+                            report=report,
+                            out_path=out_path,
+                            file_name=group,
+                            suffix='Height'))
+            else:
+                pending = [
+                    (file, fp.get_filename(file_path=file))
+                    for file in file_paths
+                    if fp.get_filename(file_path=file) not in log.completed]
+                if batch_dictionary.get("roi_reference", ""):
+                    reference = reference_scan(
+                        file_paths=file_paths,
+                        batch_dictionary=batch_dictionary)
+                    for file, file_name in pending:
+                        log_file_results(
+                            log=log,
+                            process=anal.calculate_matched_dektak_thicks,
+                            file_path=file,
+                            file_name=file_name,
+                            reference=reference,
+                            plot_dict=batch_dictionary,
+                            out_path=figure_path(
+                                report=report,
+                                out_path=out_path,
+                                file_name=file_name,
+                                suffix='Height'))
+                elif batch_dictionary.get("staged", "False") == "True":
+                    staged_step_height(
+                        log=log,
+                        pending=pending,
+                        report=report,
+                        out_path=out_path,
+                        batch_dictionary=batch_dictionary)
+                elif batch_dictionary.get("pipeline", "False") == "True":
+                    pipelined_step_height(
+                        log=log,
+                        pending=pending,
+                        report=report,
+                        out_path=out_path,
+                        batch_dictionary=batch_dictionary)
+                else:
+                    for file, file_name in pending:
+                        log_file_results(
+                            log=log,
+                            process=anal.calculate_dektak_thicks,
+                            file_path=file,
+                            file_name=file_name,
+                            plot_dict=batch_dictionary,
+                            out_path=figure_path(
+                                report=report,
+                                out_path=out_path,
+                                file_name=file_name,
+                                suffix='Height'))
+        results_dictionary = man.batch_results(
+            batch_dictionary=batch_dictionary,
+            process="height",
+            file_results=rl.read_result_log(file_path=log.out_path),
+            file_names=None if groups is None else list(groups))
+        if groups is not None and len(groups) == 1:
+            group = next(iter(groups))
+            results_dictionary.update({
+                "Average Result": results_dictionary.get(
+                    f'{group} Thickness', float('nan')),
+                "Average Error": results_dictionary.get(
+                    f'{group} Thickness Error', float('nan'))})
+        summarise_report(
+            report=report,
+            results_dictionary=results_dictionary,
+            key='Thickness',
+            file_names=None if groups is None else list(groups))
+    finally:
+        if report is not None:
+            report.close()
     return results_dictionary
 
 
@@ -84,20 +908,26 @@ if __name__ == '__main__':
     dektak_dict = io.load_json(
         file_path=Path(
             f'{root}/SurfaceProfileAnalysis/dektak_dictionary.json'))
+    rc.configure_cache(
+        directory=dektak_dict.get("cache_path"),
+        max_megabytes=dektak_dict.get("cache_size", 256))
     batch_name = dektak_dict["batch_name"]
-    files = dektak_dict["data_files"]
     data_path = dektak_dict["data_path"]
+    if not dektak_dict["data_files"] and zipfile.is_zipfile(data_path):
+        dektak_dict["data_files"] = io.archive_members(archive_path=data_path)
+    files = dektak_dict["data_files"]
+    out_path = fp.output_directory(data_path=data_path)
     file_paths = [Path(f'{data_path}/{file}') for file in files]
     if dektak_dict["process"] == "height":
         results_dictionary = step_height(
             file_paths=file_paths,
-            out_path=data_path,
+            out_path=out_path,
             batch_dictionary=dektak_dict)
     elif dektak_dict["process"] == "width":
         results_dictionary = step_widths(
             file_paths=file_paths,
-            out_path=data_path,
+            out_path=out_path,
             batch_dictionary=dektak_dict)
     io.save_json_dicts(
-        out_path=Path(f'{data_path}/{batch_name}_Height.json'),
+        out_path=Path(f'{out_path}/{batch_name}_Height.json'),
         dictionary=results_dictionary)
@@ -0,0 +1,64 @@
+import argparse
+import src.catalog as ct
+
+
+def where_condition(text : str) -> tuple:
+    '''
+    Split a --where argument, KEY=TEXT, KEY=NUMBER or KEY=MIN:MAX with
+    either bound optional, into a header key and condition.
+    '''
+    key, _, value = text.partition('=')
+    if ':' in value:
+        bounds = value.split(':', 1)
+        try:
+            return key.strip(), [
+                float(bound) if bound.strip() else None for bound in bounds]
+        except ValueError:
+            return key.strip(), value
+    try:
+        return key.strip(), float(value)
+    except ValueError:
+        return key.strip(), value
+
+
+if __name__ == '__main__':
+    '''
+    Refresh the header catalog of a tree of Dektak exports and list the
+    files matching a selection, e.g.
+        python dektak_catalog.py K:/Dektak --start 2023-08-01
+            --where Recipe=step --where "Scan Length=1000:5000"
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'root',
+        help='directory tree of Dektak exports')
+    parser.add_argument(
+        '--catalog',
+        default=None,
+        help='catalog file, default dektak_catalog.json in root')
+    parser.add_argument(
+        '--start',
+        default=None,
+        help='first scan date, e.g. 2023-08-01')
+    parser.add_argument(
+        '--end',
+        default=None,
+        help='last scan date, e.g. 2023-08-31')
+    parser.add_argument(
+        '--where',
+        action='append',
+        default=[],
+        help='header condition, KEY=TEXT, KEY=NUMBER or KEY=MIN:MAX')
+    arguments = parser.parse_args()
+    catalog = ct.update_catalog(
+        root=arguments.root,
+        catalog_path=arguments.catalog)
+    file_paths = ct.select_files(
+        catalog=catalog,
+        start=arguments.start,
+        end=arguments.end,
+        criteria=dict(
+            where_condition(text=text) for text in arguments.where))
+    for file_path in file_paths:
+        print(file_path)
+    print(f'{len(file_paths)} of {len(catalog["files"])} files selected')
@@ -0,0 +1,74 @@
+import argparse
+import src.fileIO as io
+import src.workqueue as wq
+
+from pathlib import Path
+from multiprocessing import Process
+
+
+if __name__ == '__main__':
+    '''
+    Share a batch manifest between machines through a queue directory on a
+    share they all mount, e.g.
+        python distributed_batch.py enqueue /share/queue dektak_manifest.json
+        python distributed_batch.py work /share/queue    (on each machine)
+        python distributed_batch.py reduce /share/queue  (on one machine)
+    or run several local workers and reduce in one go, e.g.
+        python distributed_batch.py local /share/queue --workers 4
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'command',
+        choices=['enqueue', 'work', 'reduce', 'local'],
+        help='queue the manifest, work on it, combine its results, or all')
+    parser.add_argument(
+        'queue',
+        help='queue directory')
+    parser.add_argument(
+        'manifest',
+        nargs='?',
+        default=None,
+        help='manifest path, for enqueue and local')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=2,
+        help='worker processes started by local')
+    parser.add_argument(
+        '--lease',
+        type=float,
+        default=600,
+        help='seconds before an unfinished task is taken over')
+    parser.add_argument(
+        '--poll',
+        type=float,
+        default=5,
+        help='seconds between checks for finished tasks')
+    arguments = parser.parse_args()
+    if arguments.command in ('enqueue', 'local') and arguments.manifest:
+        tasks = wq.enqueue_manifest(
+            manifest=io.load_json(file_path=Path(arguments.manifest)),
+            queue_path=arguments.queue)
+        print(f'Queued {tasks} files')
+    if arguments.command == 'work':
+        processed = wq.run_queue_worker(
+            queue_path=arguments.queue,
+            lease_time=arguments.lease,
+            poll=arguments.poll)
+        print(f'Processed {processed} files')
+    if arguments.command == 'local':
+        workers = [
+            Process(
+                target=wq.run_queue_worker,
+                args=(arguments.queue, arguments.lease, arguments.poll))
+            for _ in range(arguments.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    if arguments.command in ('reduce', 'local'):
+        results = wq.reduce_queue(
+            queue_path=arguments.queue,
+            poll=arguments.poll)
+        for out_path in results.keys():
+            print(f'Saved {out_path}')
@@ -0,0 +1,33 @@
+import glob
+import argparse
+import src.plotting as plot
+
+
+if __name__ == '__main__':
+    '''
+    Re-render preview figures at publication quality from their stored plot
+    data. Pass .npz paths or glob patterns, e.g.
+        python publish_figures.py "K:/Dektak/Sample_AL1_*.npz" --suffix .pdf
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'data_paths',
+        nargs='+',
+        help='stored plot data (.npz) paths or glob patterns')
+    parser.add_argument(
+        '--suffix',
+        default='.png',
+        help='output extension, .png, .pdf or .svg')
+    parser.add_argument(
+        '--dpi',
+        type=float,
+        default=None,
+        help='resolution override')
+    arguments = parser.parse_args()
+    for pattern in arguments.data_paths:
+        for data_path in sorted(glob.glob(pattern)):
+            out_path = plot.publish_figure(
+                data_path=data_path,
+                suffix=arguments.suffix,
+                dpi=arguments.dpi)
+            print(f'Saved {out_path}')
@@ -3,7 +3,12 @@ import numpy as np
 from src.userinput import trimindices
 from src.fileIO import read_thickness_file
 from src.plotting import xy_tworois_plot, plotafm, xy_roi_plot
+from src.edgedetection import edge_widths
+from src.scanalignment import average_scans, match_regions
 from src.datalevelling import calculated_level_film_thickness
+from src.grating import (
+    period_step_heights, step_height_distribution, spectral_periods,
+    duty_cycles, level_gratings)
 
 
 def standard_error_mean(x : list) -> float:
@@ -189,25 +194,194 @@ def calculate_grating_thickness(x_array,
     return thickness_results
 
 
-def calculate_dektak_widths(file_path : str,
-                            file_name : str,
-                            out_path : str,
-                            plot_dict : dict) -> dict:
+def calculate_grating_distribution(x_array : list,
+                                   y_array : list,
+                                   file_name : str,
+                                   sample_name : str,
+                                   plot_files : str,
+                                   graph_path : str,
+                                   plateau_fraction : float = 0.5,
+                                   outlier_threshold : float = 3.5) -> dict:
     """
+    Calculate the step height of every grating period without user input.
+
     Parameters
     ----------
+    x_array, y_array: list
+        x- and y-data arrays.
+    file_name, sample_name: string
+        File identifier string, sample identifier string.
+    plot_files: string
+        "True" or "False" for plotting output.
+    graph_path: string
+        Path to save the plain profile plot.
+    plateau_fraction: float
+        Fraction of each top and bottom segment averaged as the plateau.
+    outlier_threshold: float
+        Modified z-score above which a period is reported as an outlier.
+
     Returns
     -------
+    thickness_results: dictionary
+        {
+            Period Step Heights,
+            Period Step Height Errors,
+            Period Lateral Positions,
+            Step Height,
+            Step Height Error,
+            Step Height Spread,
+            Outlier Periods
+        }, or {Error} if no complete grating period is found.
+
     See Also
     --------
+    level_gratings
+    period_step_heights
+    step_height_distribution
+    calculate_grating_thickness
+
     Notes
     -----
+    The profile is levelled with level_gratings first, as in
+    calculate_grating_periods, so that tilt does not move the tooth and
+    trench thresholds. Step Height and Step Height Error use the same keys as
+    calculate_grating_thickness so batch results are interchangeable, but are
+    the mean and standard error over all non-outlier periods.
+
     Example
     -------
+    None
+
+    """
+    levelled = level_gratings(
+        lateral_arrays=[x_array],
+        profile_arrays=[y_array])[0]
+    periods = period_step_heights(
+        y=levelled,
+        plateau_fraction=plateau_fraction)
+    step_heights = periods["Step Heights"]
+    if step_heights.size == 0:
+        return {f'{file_name} Error': 'no complete grating period found'}
+    distribution = step_height_distribution(
+        step_heights=np.abs(step_heights),
+        outlier_threshold=outlier_threshold)
+    period_starts = periods["Period Indices"][:, 0]
+    thickness_results = {
+        f'{sample_name} Period Step Heights': np.abs(step_heights),
+        f'{sample_name} Period Step Height Errors': (
+            periods["Step Height Errors"]),
+        f'{sample_name} Period Lateral Positions': x_array[period_starts],
+        f'{sample_name} Step Height': distribution["Mean Step Height"],
+        f'{sample_name} Step Height Error': distribution["Step Height Error"],
+        f'{sample_name} Step Height Spread': (
+            distribution["Step Height Spread"]),
+        f'{sample_name} Outlier Periods': distribution["Outlier Periods"]}
+    if plot_files == 'True':
+        plotafm(
+            x=x_array,
+            y=y_array,
+            label=f'{sample_name}',
+            xlabel='Lateral [um]',
+            ylabel='Profile [nm]',
+            title=f'{file_name}',
+            out_path=graph_path,
+            line=True)
+    return thickness_results
+
+
+def calculate_grating_periods(x_arrays : list,
+                              y_arrays : list,
+                              sample_names : list) -> dict:
+    """
+    Calculate grating period and duty cycle for a batch of grating profiles.
+
+    Parameters
+    ----------
+    x_arrays, y_arrays: list
+        Lists of x- and y-data arrays, one pair per file.
+    sample_names: list
+        Sample identifier string for each file.
+
+    Returns
+    -------
+    period_results: dictionary
+        {
+            Grating Period,
+            Duty Cycle
+        } for each sample name.
+
+    See Also
+    --------
+    spectral_periods
+    duty_cycles
+    calculate_grating_thickness
+
+    Notes
+    -----
+    Profiles are levelled with level_gratings first, as any tilt would
+    bias the duty cycle thresholds, then the whole batch is evaluated as
+    one array operation. The period is in the lateral units of x.
+
+    Example
+    -------
+    None
+
+    """
+    y_arrays = level_gratings(
+        lateral_arrays=x_arrays,
+        profile_arrays=y_arrays)
+    periods = spectral_periods(
+        lateral_arrays=x_arrays,
+        profile_arrays=y_arrays)
+    fills = duty_cycles(profile_arrays=y_arrays)
+    period_results = {}
+    for sample_name, period, fill in zip(sample_names, periods, fills):
+        period_results.update({
+            f'{sample_name} Grating Period': period,
+            f'{sample_name} Duty Cycle': fill})
+    return period_results
+
+
+def calculate_profile_widths(lateral : list,
+                             profile : list,
+                             file_name : str,
+                             out_path : str,
+                             plot_dict : dict) -> dict:
+    """
+    Measure a feature width from a selected region of a profile in memory.
+
+    Parameters
+    ----------
+    lateral, profile: list
+        x- and y-data arrays.
+    file_name, out_path: string
+        File name string, path to save out.
+    plot_dict : dictionary
+        Plot settings dictionary, see calculate_dektak_thicks.
+
+    Returns
+    -------
+    results: dictionary
+        {
+            Region Trim Index
+            Width (mm)
+            Width Error (mm)
+        }
+
+    See Also
+    --------
+    trimindices
+    calculate_dektak_widths
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
     """
-    lateral, profile = read_thickness_file(
-        file_type="Dektak",
-        file_path=file_path)
     region = trimindices(
         x_array=lateral,
         y_array=profile,
@@ -242,6 +416,214 @@ def calculate_dektak_widths(file_path : str,
     return results
 
 
+def calculate_dektak_widths(file_path : str,
+                            file_name : str,
+                            out_path : str,
+                            plot_dict : dict) -> dict:
+    """
+    Read Dektak file and calculate the width of a selected region.
+
+    Parameters
+    ----------
+    file_path, file_name, out_path: string
+        Path to file, file name string, path to save out.
+    plot_dict : dictionary
+        Plot settings dictionary, see calculate_dektak_thicks.
+
+    Returns
+    -------
+    results: dictionary
+        {
+            Region Trim Index
+            Width (mm)
+            Width Error (mm)
+        }
+
+    See Also
+    --------
+    read_thickness_file
+    calculate_profile_widths
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    lateral, profile = read_thickness_file(
+        file_type="Dektak",
+        file_path=file_path)
+    return calculate_profile_widths(
+        lateral=lateral,
+        profile=profile,
+        file_name=file_name,
+        out_path=out_path,
+        plot_dict=plot_dict)
+
+
+def calculate_profile_edge_widths(x_arrays : list,
+                                  y_arrays : list,
+                                  file_names : list,
+                                  out_paths : list,
+                                  plot_dict : dict,
+                                  height_fraction : float = 0.5) -> dict:
+    """
+    Measure feature widths from detected edges of profiles already in memory.
+
+    Parameters
+    ----------
+    x_arrays, y_arrays: list
+        Lists of x- and y-data arrays, one pair per file.
+    file_names, out_paths: list
+        File name strings, paths to save out.
+    plot_dict : dictionary
+        Plot settings dictionary, see calculate_dektak_edge_widths.
+    height_fraction: float
+        Fraction of the feature height at which edges are located.
+
+    Returns
+    -------
+    width_results: dictionary
+        {
+            Width (mm)
+            Width Error (mm)
+            Edges (mm)
+        } for each file name, or {Error} if no edges were found.
+
+    See Also
+    --------
+    edge_widths
+    calculate_dektak_edge_widths
+
+    Notes
+    -----
+    A profile whose edges are not found is recorded as an error and not
+    plotted, so it is left out of the batch average.
+
+    Example
+    -------
+    None
+
+    """
+    edges = edge_widths(
+        lateral_arrays=x_arrays,
+        profile_arrays=y_arrays,
+        height_fraction=height_fraction)
+    width_results = {}
+    for index, file_name in enumerate(file_names):
+        width = edges["Widths"][index]
+        width_error = edges["Width Errors"][index]
+        left = edges["Left Edges"][index]
+        right = edges["Right Edges"][index]
+        if not np.isfinite(width):
+            width_results[f'{file_name} Error'] = (
+                f'no edges found at {height_fraction} of the feature height')
+            continue
+        width_results.update({
+            f'{file_name} Width': width,
+            f'{file_name} Width Error': width_error,
+            f'{file_name} Edges': [left, right]})
+        text_string = (
+            f'Width = ({round(width * 1000, 2)}'
+            r'${\pm}$'
+            f'{round(width_error * 1000, 3)})'
+            r'${\mu}$m')
+        xy_roi_plot(
+            x_array=x_arrays[index],
+            y_array=y_arrays[index],
+            x1=left,
+            x2=right,
+            text_string=text_string,
+            plot_dict=plot_dict,
+            out_path=out_paths[index])
+    return width_results
+
+
+def calculate_dektak_edge_widths(file_paths : list,
+                                 file_names : list,
+                                 out_paths : list,
+                                 plot_dict : dict,
+                                 height_fraction : float = 0.5) -> dict:
+    """
+    Read Dektak files and measure feature widths from detected edges.
+
+    Parameters
+    ----------
+    file_paths, file_names, out_paths: list
+        Paths to files, file name strings, paths to save out.
+    plot_dict : dictionary
+        Plot settings dictionary containing:
+            {
+                "width": plot width,\n
+                "height": plot height,\n
+                "dpi": dots per square inch,\n
+                "grid": True/False,\n
+                "legend_loc": legend location,\n
+                "legend_col": legend column number,\n
+                "legend_size": size of legend text,\n
+                "axis_fontsize": font size for axis labels,\n
+                "label_size": size for tick labels
+            }
+    height_fraction: float
+        Fraction of the feature height at which edges are located.
+
+    Returns
+    -------
+    width_results: dictionary
+        {
+            Width (mm)
+            Width Error (mm)
+            Edges (mm)
+        } for each file name, or {Error} for files that cannot be read or
+        whose edges were not found.
+
+    See Also
+    --------
+    read_thickness_file
+    calculate_profile_edge_widths
+    calculate_dektak_widths
+
+    Notes
+    -----
+    Replaces the manual region selection of calculate_dektak_widths. Each
+    file is read on its own, so an unreadable file only records an error for
+    itself. The files that were read are analysed together, then plotted one
+    by one with the detected edges marked.
+
+    Example
+    -------
+    None
+
+    """
+    laterals = []
+    profiles = []
+    read = []
+    width_results = {}
+    for index, (file_path, file_name) in enumerate(zip(file_paths, file_names)):
+        try:
+            lateral, profile = read_thickness_file(
+                file_type="Dektak",
+                file_path=file_path)
+        except Exception as error:
+            width_results[f'{file_name} Error'] = str(error)
+            continue
+        laterals.append(lateral)
+        profiles.append(profile)
+        read.append(index)
+    if read:
+        width_results.update(calculate_profile_edge_widths(
+            x_arrays=laterals,
+            y_arrays=profiles,
+            file_names=[file_names[index] for index in read],
+            out_paths=[out_paths[index] for index in read],
+            plot_dict=plot_dict,
+            height_fraction=height_fraction))
+    return width_results
+
+
 def calculate_dektak_thicks(file_path : str,
                             file_name : str,
                             out_path : str,
@@ -264,7 +646,8 @@ def calculate_dektak_thicks(file_path : str,
                 "legend_col": legend column number,\n
                 "legend_size": size of legend text,\n
                 "axis_fontsize": font size for axis labels,\n
-                "label_size": size for tick labels
+                "label_size": size for tick labels,\n
+                "polynomial_order": baseline polynomial degree
             }
     
     Returns
@@ -274,8 +657,8 @@ def calculate_dektak_thicks(file_path : str,
             {
                 Step height (nm)
                 Step height error (nm)
-                Quadratic (a, b, c)
-                Quadratic errors (a, b, c)
+                Polynomial (highest power first)
+                Polynomial errors
             }
 
     See Also
@@ -299,4 +682,152 @@ def calculate_dektak_thicks(file_path : str,
         file_name=file_name,
         plot_dict=plot_dict,
         out_path=out_path)
+    return step_results
+
+
+def calculate_averaged_dektak_thicks(file_paths : list,
+                                     file_name : str,
+                                     out_path : str,
+                                     plot_dict : dict) -> dict:
+    """
+    Read repeated Dektak scans, align and average them, and fit the step once.
+
+    Parameters
+    ----------
+    file_paths: list
+        Paths to repeated scans of the same feature.
+    file_name, out_path: string
+        Name for the averaged scan, path to save out.
+    plot_dict : dictionary
+        Plot settings dictionary, see calculate_dektak_thicks.
+
+    Returns
+    -------
+    step_results: dictionary
+        Calculated step height data of the averaged scan:
+            {
+                Step height (nm)
+                Step height error (nm)
+                Polynomial (highest power first)
+                Polynomial errors
+                Scan shifts (mm), one per file
+                Scans, the number of files averaged
+            }
+
+    See Also
+    --------
+    read_thickness_file
+    average_scans
+    calculated_level_film_thickness
+
+    Notes
+    -----
+    Scans are aligned on their edges to a fraction of a sample before
+    averaging, so the step is not smeared by stage drift between scans.
+    Averaging N scans reduces the random noise by root N, and the regions of
+    interest are selected once for the whole group.
+
+    Example
+    -------
+    None
+
+    """
+    scans = [
+        read_thickness_file(
+            file_type="Dektak",
+            file_path=file_path)
+        for file_path in file_paths]
+    average = average_scans(
+        lateral_arrays=[lateral for lateral, _ in scans],
+        profile_arrays=[profile for _, profile in scans])
+    step_results = calculated_level_film_thickness(
+        x_array=average["Lateral"],
+        y_array=average["Profile"],
+        file_name=file_name,
+        plot_dict=plot_dict,
+        out_path=out_path)
+    step_results.update({
+        f'{file_name} Scan Shifts': average["Shifts"],
+        f'{file_name} Scans': len(scans)})
+    return step_results
+
+
+def calculate_matched_dektak_thicks(file_path : str,
+                                    file_name : str,
+                                    reference : dict,
+                                    out_path : str,
+                                    plot_dict : dict) -> dict:
+    """
+    Read a Dektak file and fit its step on regions carried over from a
+    reference scan.
+
+    Parameters
+    ----------
+    file_path: string
+        Path to file.
+    file_name, out_path: string
+        File name, path to save out.
+    reference: dictionary
+        {
+            "Lateral": reference x-data array,\n
+            "Profile": reference y-data array,\n
+            "Regions": [range_left, range_right] on the reference
+        }
+    plot_dict : dictionary
+        Plot settings dictionary, see calculate_dektak_thicks, with
+        optional "match_threshold", default 0.9, and "match_scale_range",
+        default 0.02.
+
+    Returns
+    -------
+    step_results: dictionary
+        Calculated step height data, see calculate_dektak_thicks, with the
+        region offset (mm), region scale, match score and whether the
+        carried over regions were used.
+
+    See Also
+    --------
+    match_regions
+    calculated_level_film_thickness
+
+    Notes
+    -----
+    If the match score is below "match_threshold", or the carried over
+    regions fall outside the scan, the regions are selected by hand as
+    usual.
+
+    Example
+    -------
+    None
+
+    """
+    lateral, profile = read_thickness_file(
+        file_type="Dektak",
+        file_path=file_path)
+    match = match_regions(
+        reference_lateral=reference["Lateral"],
+        reference_profile=reference["Profile"],
+        regions=reference["Regions"],
+        lateral=lateral,
+        profile=profile,
+        scale_range=plot_dict.get("match_scale_range", 0.02))
+    matched = match["Score"] >= plot_dict.get("match_threshold", 0.9) and all(
+        np.min(lateral) <= bound <= np.max(lateral)
+        for x_range in match["Regions"] for bound in x_range)
+    if not matched:
+        print(f'{file_name}: match score {match["Score"]:.2f}, select regions')
+    range_left, range_right = match["Regions"] if matched else (None, None)
+    step_results = calculated_level_film_thickness(
+        x_array=lateral,
+        y_array=profile,
+        file_name=file_name,
+        plot_dict=plot_dict,
+        out_path=out_path,
+        range_left=range_left,
+        range_right=range_right)
+    step_results.update({
+        f'{file_name} Region Offset': match["Offset"],
+        f'{file_name} Region Scale': match["Scale"],
+        f'{file_name} Match Score': match["Score"],
+        f'{file_name} Regions Matched': matched})
     return step_results
\ No newline at end of file
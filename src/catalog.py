@@ -0,0 +1,280 @@
+import os
+import json
+import zipfile
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from src.filepaths import compressed_suffixes
+from src.fileIO import convert, read_dektak_header, archive_members
+
+
+def catalog_entries(root : str,
+                    suffixes : tuple = ('.csv',)) -> dict:
+    """
+    Find every candidate data file under a directory tree.
+
+    Parameters
+    ----------
+    root: string
+        Directory to search.
+    suffixes: tuple
+        Data file extensions, also matched with a compression extension,
+        e.g. '.csv.gz'.
+
+    Returns
+    -------
+    entries: dictionary
+        {path relative to root: (size in bytes, modification time in ns)},
+        with files inside zip archives given as archive.zip/member.csv.
+
+    See Also
+    --------
+    update_catalog
+    archive_members
+
+    Notes
+    -----
+    Uses os.scandir, whose directory entries carry their file details on
+    most systems, so no data file is opened. Only the directory of each zip
+    archive is read, and its members take the size and modification time of
+    the archive, so changing the archive refreshes all of them. Archives
+    that cannot be read are skipped.
+
+    Example
+    -------
+    None
+
+    """
+    entries = {}
+    directories = [Path(root)]
+    while directories:
+        with os.scandir(directories.pop()) as scan:
+            for entry in scan:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(Path(entry.path))
+                    continue
+                name = entry.name.lower()
+                relative = Path(entry.path).relative_to(root).as_posix()
+                if name.endswith('.zip'):
+                    try:
+                        members = archive_members(
+                            archive_path=entry.path,
+                            suffixes=suffixes)
+                    except (OSError, zipfile.BadZipFile):
+                        continue
+                    details = entry.stat()
+                    for member in members:
+                        entries[f'{relative}/{member}'] = (
+                            details.st_size, details.st_mtime_ns)
+                    continue
+                for suffix in compressed_suffixes:
+                    if name.endswith(suffix):
+                        name = name[: -len(suffix)]
+                if not name.endswith(suffixes):
+                    continue
+                details = entry.stat()
+                entries[relative] = (details.st_size, details.st_mtime_ns)
+    return entries
+
+
+def load_catalog(catalog_path : str) -> dict:
+    """
+    Load a catalog, or an empty one if it does not exist or is unreadable.
+    """
+    try:
+        with open(catalog_path, 'r') as infile:
+            return json.load(infile)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"root": None, "files": {}}
+
+
+def update_catalog(root : str,
+                   catalog_path : str = None,
+                   threads : int = 8) -> dict:
+    """
+    Build or refresh the header catalog of every Dektak file under root.
+
+    Parameters
+    ----------
+    root: string
+        Directory tree of Dektak exports.
+    catalog_path: string
+        Catalog file, default {root}/dektak_catalog.json.
+    threads: int
+        Number of headers read at once. Reads of network shares spend most
+        of their time waiting, so several in flight hide the latency.
+
+    Returns
+    -------
+    catalog: dictionary
+        {
+            "root": root directory,\n
+            "files": {relative path: record}
+        }
+        where each record holds the file's "Size" and "Modified" time with
+        the read_dektak_header record, or "Header" None for files that are
+        not Dektak exports or cannot be read, e.g. truncated archives.
+
+    See Also
+    --------
+    catalog_entries
+    read_dektak_header
+    select_files
+
+    Notes
+    -----
+    Only new or changed files, by size and modification time, have their
+    headers read, and deleted files are dropped, so refreshing a large
+    archive reads only what has changed. No profile data is parsed. The
+    catalog is written to a temporary file and moved into place, so an
+    interrupted update leaves the previous catalog intact.
+
+    Example
+    -------
+    >>> catalog = update_catalog(root='K:/Dektak')
+
+    """
+    catalog_path = catalog_path or Path(f'{root}/dektak_catalog.json')
+    catalog = load_catalog(catalog_path=catalog_path)
+    known = catalog["files"] if catalog["root"] == str(root) else {}
+    entries = catalog_entries(root=root)
+    files = {}
+    changed = []
+    for relative, (size, modified) in entries.items():
+        record = known.get(relative)
+        if record and (record["Size"], record["Modified"]) == (
+                size, modified):
+            files[relative] = record
+        else:
+            changed.append(relative)
+
+    def read_record(relative : str) -> dict:
+        try:
+            record = read_dektak_header(file_path=Path(f'{root}/{relative}'))
+        except Exception:
+            record = None
+        size, modified = entries[relative]
+        return dict(record or {"Header": None}, Size=size, Modified=modified)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for relative, record in zip(changed, pool.map(read_record, changed)):
+            files[relative] = record
+    catalog = {"root": str(root), "files": dict(sorted(files.items()))}
+    temporary = Path(f'{catalog_path}.tmp')
+    with open(temporary, 'w') as outfile:
+        json.dump(catalog, outfile, default=convert)
+    os.replace(temporary, catalog_path)
+    return catalog
+
+
+def header_matches(header : dict,
+                   key : str,
+                   condition : object) -> bool:
+    """
+    True if a header value meets a condition.
+
+    Parameters
+    ----------
+    header: dictionary
+        Header record from read_dektak_header.
+    key: string
+        Header key, matched ignoring case.
+    condition: object
+        [minimum, maximum] for numbers, either of which may be None, a
+        number for an exact match, or text found anywhere in the value,
+        ignoring case.
+
+    Returns
+    -------
+    match: bool
+        False if the header has no such key.
+
+    See Also
+    --------
+    select_files
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    values = [
+        value for name, value in header.items()
+        if name.lower() == key.lower()]
+    if not values or values[0] is None:
+        return False
+    value = values[0]
+    if isinstance(condition, (list, tuple)):
+        minimum, maximum = condition
+        return isinstance(value, float) and (
+            minimum is None or value >= minimum) and (
+            maximum is None or value <= maximum)
+    if isinstance(condition, (int, float)):
+        return value == condition
+    return str(condition).lower() in str(value).lower()
+
+
+def select_files(catalog : dict,
+                 start : str = None,
+                 end : str = None,
+                 criteria : dict = None) -> list:
+    """
+    Select cataloged files by scan date and header values.
+
+    Parameters
+    ----------
+    catalog: dictionary
+        Catalog from update_catalog.
+    start, end: string
+        ISO 8601 dates or times, e.g. "2023-08-01", the first and last scan
+        times to include. Either may be None.
+    criteria: dictionary
+        {header key: condition}, see header_matches, e.g.
+        {"Recipe": "step", "Scan Length": [1000, 5000]}.
+
+    Returns
+    -------
+    file_paths: list
+        Paths of every Dektak file meeting all conditions, in path order.
+
+    See Also
+    --------
+    update_catalog
+    header_matches
+
+    Notes
+    -----
+    Works on the catalog alone, so no data file is opened. An end date
+    without a time includes the whole of that day. Files without a scan
+    date are left out when start or end is given.
+
+    Example
+    -------
+    >>> select_files(
+    ...     catalog=catalog,
+    ...     start="2023-08-01",
+    ...     criteria={"Stylus Force": [None, 5]})
+
+    """
+    if end is not None and 'T' not in end:
+        end = f'{end}T23:59:59.999999'
+    file_paths = []
+    for relative, record in catalog["files"].items():
+        header = record["Header"]
+        if header is None:
+            continue
+        timestamp = record.get("Timestamp")
+        if start is not None and (timestamp is None or timestamp < start):
+            continue
+        if end is not None and (timestamp is None or timestamp > end):
+            continue
+        if all(
+                header_matches(header=header, key=key, condition=condition)
+                for key, condition in (criteria or {}).items()):
+            file_paths.append(Path(f'{catalog["root"]}/{relative}'))
+    return file_paths
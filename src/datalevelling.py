@@ -1,12 +1,125 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
-from scipy.optimize import least_squares
+from scipy.special import erf
+from src.plotting import render_dektak_thicknesses
+from src.grating import grating_states, plateau_bounds
+from src.roughness import region_roughness
+from src.resultcache import get_cache, cache_key, plot_settings
+
+
+def suggest_regions(x : list,
+                    y : list,
+                    plateau_fraction : float = 0.5,
+                    hysteresis : float = 0.1) -> list:
+    """
+    Suggest base and step regions of interest for a single step.
+
+    Parameters
+    ----------
+    x, y: list
+        x- and y- data arrays.
+    plateau_fraction: float
+        Fraction of each level kept, centred on the level middle.
+    hysteresis: float
+        Fraction of the profile range used as the dead band between levels.
+
+    Returns
+    -------
+    range_left, range_right: list
+        x ranges on the longest stretch of each level, the left-most first,
+        or None, None if the profile has only one level.
+
+    See Also
+    --------
+    grating_states
+    plateau_bounds
+    level_regions_interests
+
+    Notes
+    -----
+    Points are split into upper and lower levels with the hysteresis
+    threshold used for gratings, and the centre of the longest run on each
+    level is suggested, away from the step edge.
+
+    Example
+    -------
+    None
+
+    """
+    x = np.asarray(x, dtype=float)
+    states = grating_states(y=y, hysteresis=hysteresis)
+    changes = np.flatnonzero(np.diff(states)) + 1
+    starts = np.concatenate(([0], changes))
+    stops = np.concatenate((changes, [states.size]))
+    lengths = stops - starts
+    levels = states[starts]
+    if levels.all() or not levels.any():
+        return None, None
+    runs = np.sort([
+        np.argmax(np.where(levels, lengths, -1)),
+        np.argmax(np.where(levels, -1, lengths))])
+    starts, stops = plateau_bounds(
+        starts=starts[runs],
+        stops=stops[runs],
+        plateau_fraction=plateau_fraction)
+    range_left, range_right = (
+        x[[start, stop - 1]] for start, stop in zip(starts, stops))
+    return range_left, range_right
+
+
+def display_trace(x : list,
+                  y : list,
+                  columns : int = 2000) -> tuple:
+    """
+    Reduce a profile to the points a selection graph can show.
+
+    Parameters
+    ----------
+    x, y: list
+        x- and y- data arrays.
+    columns: int
+        Number of x bins, about the pixel width of the graph.
+
+    Returns
+    -------
+    x_display, y_display: tuple
+        The lowest and highest point of each bin in x order, or x and y
+        themselves if they hold no more than 2 * columns points.
+
+    See Also
+    --------
+    level_regions_interests
+
+    Notes
+    -----
+    Keeping each bin's minimum and maximum keeps every spike and step edge
+    visible, so the graph looks the same as the full profile while the
+    window opens and redraws in a fraction of the time. Selections are read
+    in data coordinates, so they are unaffected.
+
+    Example
+    -------
+    None
+
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if x.size <= 2 * columns:
+        return x, y
+    bins = np.array_split(np.arange(x.size), columns)
+    keep = np.concatenate([
+        np.sort(part[[np.nanargmin(y[part]), np.nanargmax(y[part])]])
+        if np.isfinite(y[part]).any() else part[:1]
+        for part in bins])
+    return x[keep], y[keep]
 
 
 def level_regions_interests(x : list,
                             y : list,
-                            file_name : str) -> list:
+                            file_name : str,
+                            suggestion : list = None,
+                            display : tuple = None) -> list:
     """
     Level data between two regions of interest.
 
@@ -18,6 +131,11 @@ def level_regions_interests(x : list,
         x- and y- data arrays.
     file_name: string
         File name identifier for legend.
+    suggestion: list
+        Suggested range_left, range_right, from suggest_regions, shaded on
+        the graph. Pressing enter without selecting accepts them.
+    display: tuple
+        (x, y) arrays drawn instead of x and y, from display_trace.
     
     Returns
     -------
@@ -27,6 +145,8 @@ def level_regions_interests(x : list,
     See Also
     --------
     matplotlib ginput
+    suggest_regions
+    display_trace
 
     Notes
     -----
@@ -45,19 +165,27 @@ def level_regions_interests(x : list,
         ncols=1,
         figsize=[10, 7])
     ax.plot(
-        x,
-        y,
+        *(display if display is not None else (x, y)),
         'b',
         lw=2,
         label=file_name)
+    if suggestion is not None and suggestion[0] is not None:
+        for x_range, colour in zip(suggestion, ['g', 'r']):
+            ax.axvspan(
+                *x_range,
+                color=colour,
+                alpha=0.2)
+        ax.set_title('Select 4 points, or press enter to accept the shading')
     ax.legend(
         loc=0,
         prop={'size': 14})
     fig.show()
     regions = np.array(plt.ginput(4)).astype(float)
+    plt.close(fig)
+    if len(regions) < 4 and suggestion is not None and suggestion[0] is not None:
+        return suggestion
     range_left = regions[0: 2, 0]
     range_right = regions[2: 4, 0]
-    plt.close(fig)
     return range_left, range_right
 
 
@@ -169,32 +297,29 @@ def residual_quadratic_equation(parameters : list,
         - y)
 
 
-def residual_quadratic_step(step_parameters : list,
-                            x_base : list,
-                            y_base : list,
-                            x_step : list,
-                            y_step : list) -> list:
+def standard_polynomial_equation(parameters : list,
+                                 x : float) -> float:
     """
-    Calculate the residual quadratic step function.
-
-    Return the residuals from both quadratic equations before and after step.
+    Evaluate a polynomial of any degree at specified x value.
 
     Parameters
     ----------
-    step_parameters, x_base, y_base, x_step, y_step: list
-        Quadratic step parameters, x y data from left x-range data, x y data
-        from right x-range data.
-    
+    parameters: list
+        Polynomial coefficients, highest power first, e.g. [a, b, c] for a
+        quadratic.
+    x: float
+        x value at which to evaluate.
+
     Returns
     -------
-    residual: list
-        Residual parameters from the quadratic equation.
-    
+    y: float
+        Evaluation of the polynomial at specified x value.
+
     See Also
     --------
-    residual_quadratic_equation
     standard_quadratic_equation
-    
+    numpy polyval
+
     Notes
     -----
     None
@@ -204,41 +329,27 @@ def residual_quadratic_step(step_parameters : list,
     None
 
     """
-    quadratic_parameters = step_parameters[0: -1]
-    initial_step = step_parameters[-1]
-    residual = np.append(
-        residual_quadratic_equation(
-            quadratic_parameters,
-            x_base,
-            y_base),
-        residual_quadratic_equation(
-            quadratic_parameters,
-            x_step,
-            y_step - initial_step))
-    return residual
+    return np.polyval(parameters, x)
 
 
-def fit_quadratic(x : list, y: list) -> list:
+def scale_lateral(x : list,
+                  domain : list) -> list:
     """
-    Fit quadratic equation.
-    
-    Calculate least squares parameters.
+    Map x values from domain onto the interval [-1, 1].
 
     Parameters
     ----------
-    x, y: list
-        x y data sets
-    
+    x, domain: list
+        x data array, [minimum, maximum] of the fitted x range.
+
     Returns
     -------
-    parameters: list
-        Quadratic equation parameters.
-    
+    u: list
+        Scaled x data array.
+
     See Also
     --------
-    least_squares
-    residual_quadratic_equation
-    standard_quadratic_equation
+    polynomial_step_design
 
     Notes
     -----
@@ -249,34 +360,401 @@ def fit_quadratic(x : list, y: list) -> list:
     None
 
     """
-    initial_parameters = [0, np.average(x), np.average(y)]
-    scales = [1e-3, np.average(x), np.abs(np.average(y))]
-    residual_least_squares = least_squares(
-        residual_quadratic_equation,
-        initial_parameters,
-        args=(x, y),
-        x_scale=scales)
-    parameters = residual_least_squares.x
-    return parameters
+    centre = 0.5 * (domain[1] + domain[0])
+    half_span = 0.5 * (domain[1] - domain[0])
+    return (np.asarray(x) - centre) / half_span
+
+
+def polynomial_step_design(x_base : list,
+                           x_step : list,
+                           polynomial_order : int,
+                           domain : list) -> list:
+    """
+    Design matrix for a polynomial baseline plus a step.
+
+    Parameters
+    ----------
+    x_base, x_step: list
+        x data array for base crop, x data array for step crop.
+    polynomial_order: int
+        Degree of the baseline polynomial.
+    domain: list
+        [minimum, maximum] x value used to scale the baseline basis.
 
+    Returns
+    -------
+    design: list
+        Matrix with one row per data point. The first polynomial_order + 1
+        columns are Legendre polynomials of the scaled x values, the last
+        column is 1 for step points and 0 for base points.
 
-def calculate_filmthickness(initial_parameters : list,
-                            x_base : list,
-                            y_base : list,
-                            x_step : list,
-                            y_step : list,
-                            scales : list,
+    See Also
+    --------
+    scale_lateral
+    numpy polynomial legendre legvander
+
+    Notes
+    -----
+    Legendre polynomials on [-1, 1] are close to orthogonal for evenly
+    sampled data, which keeps the least squares problem well conditioned at
+    any degree. Raw powers of x in mm are not.
+
+    Example
+    -------
+    None
+
+    """
+    x = np.concatenate((x_base, x_step))
+    basis = np.polynomial.legendre.legvander(
+        scale_lateral(x=x, domain=domain),
+        polynomial_order)
+    step = np.concatenate((np.zeros(len(x_base)), np.ones(len(x_step))))
+    return np.column_stack((basis, step))
+
+
+def legendre_to_polynomial(coefficients : list,
+                           covariance : list,
+                           domain : list) -> list:
+    """
+    Convert scaled Legendre coefficients to ordinary polynomial coefficients.
+
+    Parameters
+    ----------
+    coefficients: list
+        Legendre coefficients, lowest degree first.
+    covariance: list
+        Covariance matrix of the Legendre coefficients.
+    domain: list
+        [minimum, maximum] x value used to scale the basis.
+
+    Returns
+    -------
+    parameters, errors: list
+        Polynomial coefficients in x and their errors, highest power first.
+
+    See Also
+    --------
+    standard_polynomial_equation
+
+    Notes
+    -----
+    The conversion is linear, so the covariance is propagated exactly through
+    the conversion matrix.
+
+    Example
+    -------
+    None
+
+    """
+    size = len(coefficients)
+    conversion = np.zeros((size, size))
+    for index in range(size):
+        unit = np.zeros(size)
+        unit[index] = 1
+        power = np.polynomial.Legendre(unit, domain=domain).convert(
+            kind=np.polynomial.Polynomial).coef
+        conversion[: power.size, index] = power
+    parameters = conversion @ coefficients
+    errors = np.sqrt(np.diag(conversion @ covariance @ conversion.T))
+    return parameters[::-1], errors[::-1]
+
+
+def fit_polynomial_step(x_base : list,
+                        y_base : list,
+                        x_step : list,
+                        y_step : list,
+                        polynomial_order : int = 2,
+                        weights : list = None) -> list:
+    """
+    Fit a polynomial baseline and step height by linear least squares.
+
+    Parameters
+    ----------
+    x_base, y_base, x_step, y_step: list
+        x y data from left x-range data, x y data from right x-range data.
+    polynomial_order: int
+        Degree of the baseline polynomial.
+    weights: list
+        Optional weight of each point, base points first then step points.
+
+    Returns
+    -------
+    parameters, errors: list
+        Polynomial coefficients (highest power first) followed by the step
+        height, and their errors.
+
+    See Also
+    --------
+    polynomial_step_design
+    legendre_to_polynomial
+    numpy linalg lstsq
+
+    Notes
+    -----
+    The model is linear in all parameters, so it is solved directly rather
+    than iteratively. Errors are the square root of the diagonal of
+    (J^T W J)^-1, as for a least squares fit.
+
+    Example
+    -------
+    None
+
+    """
+    x = np.concatenate((x_base, x_step))
+    y = np.concatenate((y_base, y_step))
+    domain = [np.min(x), np.max(x)]
+    design = polynomial_step_design(
+        x_base=x_base,
+        x_step=x_step,
+        polynomial_order=polynomial_order,
+        domain=domain)
+    if weights is None:
+        weights = np.ones_like(y)
+    root_weights = np.sqrt(weights)
+    solution, _, _, _ = np.linalg.lstsq(
+        design * root_weights[:, None],
+        y * root_weights,
+        rcond=None)
+    covariance = np.linalg.inv(design.T @ (design * weights[:, None]))
+    parameters, errors = legendre_to_polynomial(
+        coefficients=solution[:-1],
+        covariance=covariance[:-1, :-1],
+        domain=domain)
+    return (
+        np.append(parameters, solution[-1]),
+        np.append(errors, np.sqrt(covariance[-1, -1])))
+
+
+def block_means(values : list,
+                block_size : int) -> list:
+    """
+    Average consecutive blocks of points.
+
+    Parameters
+    ----------
+    values: list
+        Data array.
+    block_size: int
+        Points per block. The last block holds whatever is left over.
+
+    Returns
+    -------
+    means, counts: list
+        Mean of each block and the number of points in it.
+
+    See Also
+    --------
+    numpy add reduceat
+
+    Notes
+    -----
+    A block mean is a boxcar filter followed by decimation, so noise above
+    the new sampling rate is averaged out rather than aliased.
+
+    Example
+    -------
+    None
+
+    """
+    values = np.asarray(values, dtype=float)
+    starts = np.arange(0, len(values), block_size)
+    counts = np.diff(np.append(starts, len(values)))
+    return np.add.reduceat(values, starts) / counts, counts
+
+
+def fit_decimated_polynomial_step(x_base : list,
+                                  y_base : list,
+                                  x_step : list,
+                                  y_step : list,
+                                  polynomial_order : int = 2,
+                                  max_points : int = 4096,
+                                  refine : bool = True,
+                                  threshold : float = 3.0) -> list:
+    """
+    Fit a polynomial baseline and step height on block averaged data.
+
+    Parameters
+    ----------
+    x_base, y_base, x_step, y_step: list
+        x y data from left x-range data, x y data from right x-range data.
+    polynomial_order: int
+        Degree of the baseline polynomial.
+    max_points: int
+        Maximum number of points to fit. Regions with more points between
+        them are block averaged down to about this many.
+    refine: bool
+        If True, fit again at full resolution when the block averaged data
+        do not fit the model to within their noise.
+    threshold: float
+        Number of standard deviations of the reduced chi squared above one
+        at which the residual check fails.
+
+    Returns
+    -------
+    parameters, errors: list
+        Polynomial coefficients (highest power first) followed by the step
+        height, and their errors.
+    points: int
+        Number of points fitted.
+
+    See Also
+    --------
+    block_means
+    fit_polynomial_step
+
+    Notes
+    -----
+    Each region is averaged separately, so no block spans both. Each block
+    is weighted by its point count, the inverse of the variance of its mean,
+    so the errors match those of a full resolution fit. The noise variance
+    for the residual check is estimated from the point to point differences
+    of the full data, which are insensitive to tilt and curvature.
+
+    Example
+    -------
+    None
+
+    """
+    block_size = int(np.ceil((len(y_base) + len(y_step)) / max_points))
+    if block_size < 2:
+        parameters, errors = fit_polynomial_step(
+            x_base=x_base,
+            y_base=y_base,
+            x_step=x_step,
+            y_step=y_step,
+            polynomial_order=polynomial_order)
+        return parameters, errors, len(y_base) + len(y_step)
+    x_base_means, base_counts = block_means(
+        values=x_base,
+        block_size=block_size)
+    y_base_means, _ = block_means(
+        values=y_base,
+        block_size=block_size)
+    x_step_means, step_counts = block_means(
+        values=x_step,
+        block_size=block_size)
+    y_step_means, _ = block_means(
+        values=y_step,
+        block_size=block_size)
+    counts = np.concatenate((base_counts, step_counts))
+    parameters, errors = fit_polynomial_step(
+        x_base=x_base_means,
+        y_base=y_base_means,
+        x_step=x_step_means,
+        y_step=y_step_means,
+        polynomial_order=polynomial_order,
+        weights=counts)
+    if not refine:
+        return parameters, errors, len(counts)
+    residuals = np.concatenate((
+        y_base_means - standard_polynomial_equation(
+            parameters=parameters[:-1],
+            x=x_base_means),
+        y_step_means - parameters[-1] - standard_polynomial_equation(
+            parameters=parameters[:-1],
+            x=x_step_means)))
+    variance = np.mean(np.concatenate((
+        np.diff(y_base),
+        np.diff(y_step))) ** 2) / 2
+    freedom = max(len(counts) - len(parameters), 1)
+    chi_squared = np.sum(counts * residuals ** 2) / variance / freedom
+    if chi_squared <= 1 + threshold * np.sqrt(2 / freedom):
+        return parameters, errors, len(counts)
+    parameters, errors = fit_polynomial_step(
+        x_base=x_base,
+        y_base=y_base,
+        x_step=x_step,
+        y_step=y_step,
+        polynomial_order=polynomial_order)
+    return parameters, errors, len(y_base) + len(y_step)
+
+
+def fit_polynomial_steps(x_bases : list,
+                         y_bases : list,
+                         x_steps : list,
+                         y_steps : list,
+                         polynomial_order : int = 2) -> list:
+    """
+    Fit polynomial baselines and step heights for many profiles at once.
+
+    Parameters
+    ----------
+    x_bases, y_bases, x_steps, y_steps: list
+        Lists of base and step crop x y arrays, one entry per profile.
+    polynomial_order: int
+        Degree of the baseline polynomials.
+
+    Returns
+    -------
+    parameters, errors: list
+        2D arrays, one row per profile, of polynomial coefficients (highest
+        power first) followed by the step height, and their errors.
+
+    See Also
+    --------
+    fit_polynomial_step
+
+    Notes
+    -----
+    Every profile is padded to a common length with zero weight rows and the
+    normal equations for all profiles are solved as one stacked linear
+    algebra call. The Legendre basis keeps the normal equations well
+    conditioned.
+
+    Example
+    -------
+    None
+
+    """
+    designs = []
+    targets = []
+    domains = []
+    for x_base, y_base, x_step, y_step in zip(
+            x_bases, y_bases, x_steps, y_steps):
+        x = np.concatenate((x_base, x_step))
+        domains.append([np.min(x), np.max(x)])
+        designs.append(polynomial_step_design(
+            x_base=x_base,
+            x_step=x_step,
+            polynomial_order=polynomial_order,
+            domain=domains[-1]))
+        targets.append(np.concatenate((y_base, y_step)))
+    length = max(len(target) for target in targets)
+    size = polynomial_order + 2
+    design = np.zeros((len(designs), length, size))
+    target = np.zeros((len(designs), length))
+    for index, (rows, values) in enumerate(zip(designs, targets)):
+        design[index, : len(values)] = rows
+        target[index, : len(values)] = values
+    normal = np.einsum('bnp,bnq->bpq', design, design)
+    projection = np.einsum('bnp,bn->bp', design, target)
+    solutions = np.linalg.solve(normal, projection[..., None])[..., 0]
+    covariances = np.linalg.inv(normal)
+    parameters = np.zeros((len(designs), size))
+    errors = np.zeros((len(designs), size))
+    for index, domain in enumerate(domains):
+        polynomial, polynomial_errors = legendre_to_polynomial(
+            coefficients=solutions[index, :-1],
+            covariance=covariances[index, :-1, :-1],
+            domain=domain)
+        parameters[index] = np.append(polynomial, solutions[index, -1])
+        errors[index] = np.append(
+            polynomial_errors,
+            np.sqrt(covariances[index, -1, -1]))
+    return parameters, errors
+
+
+def polynomial_step_results(parameters : list,
+                            errors : list,
                             file_name : str) -> dict:
     """
-    Use residual least squares with the residual quadratic step function to
-    calculate the step height after data levelling.
+    Arrange fitted polynomial step parameters into a results dictionary.
 
     Parameters
     ----------
-    initial_parameters, x_base, y_base, x_step, y_step, scales: list
-        Initial parameters for a, b, c, step, x data array for base crop, y data
-        array for base crop, x data array for step crop, y data array for step
-        crop, scales for a, b, c, step values.
+    parameters, errors: list
+        Polynomial coefficients (highest power first) followed by the step
+        height, and their errors.
     file_name: string
         Sample name identifier.
 
@@ -287,43 +765,678 @@ def calculate_filmthickness(initial_parameters : list,
             {
                 Film Thickness (nm)
                 Film Thickness Error (nm)
-                Quadratic (a, b, c)
-                Quadratic Errors (a, b, c)
+                Polynomial (highest power first)
+                Polynomial Errors
             }
-    
+        Quadratic baselines also carry the Quadratic (a, b, c) and Quadratic
+        Errors keys of earlier results files.
+
+    See Also
+    --------
+    fit_polynomial_step
+    fit_polynomial_steps
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    step_results = {
+        f'{file_name} Thickness': parameters[-1],
+        f'{file_name} Thickness Error': errors[-1],
+        f'{file_name} Polynomial': list(parameters[:-1]),
+        f'{file_name} Polynomial Errors': list(errors[:-1])}
+    if len(parameters) == 4:
+        step_results.update({
+            f'{file_name} Quadratic': list(parameters[:-1]),
+            f'{file_name} Quadratic Errors': list(errors[:-1])})
+    return step_results
+
+
+def level_film_thickness(x_array : list,
+                         y_array : list,
+                         range_left : list,
+                         range_right : list,
+                         file_name : str,
+                         polynomial_order : int = 2,
+                         max_points : int = None,
+                         refine : bool = True) -> dict:
+    """
+    Calculate the film thickness between two regions of interest.
+
+    Parameters
+    ----------
+    x_array, y_array, range_left, range_right: list
+        x- and y- data arrays, base and step x ranges.
+    file_name: string
+        Sample name identifier.
+    polynomial_order: int
+        Degree of the baseline polynomial.
+    max_points: int
+        If given, regions with more points between them are block averaged
+        down to about this many before fitting, see
+        fit_decimated_polynomial_step. None or 0 fits every point.
+    refine: bool
+        If True, decimated fits that fail the residual check are fitted
+        again at full resolution.
+
+    Returns
+    -------
+    step_results: dictionary
+        Results dictionary from polynomial_step_results. Decimated fits also
+        give "{file_name} Fit Points", the number of points fitted.
+
     See Also
     --------
-    least_squares
-    residual_quadratic_step
-    residual_least_squares
+    crop_xydata
+    fit_polynomial_step
+    fit_decimated_polynomial_step
+    polynomial_step_results
 
     Notes
     -----
+    No user input or plotting, so regions can come from level_regions_interests
+    or any other source. Results are memoised in the shared result cache,
+    keyed on the data, regions, file name, polynomial order and decimation.
+
+    Example
+    -------
     None
 
+    """
+    key = cache_key(
+        'level_film_thickness',
+        np.asarray(x_array),
+        np.asarray(y_array),
+        np.asarray(range_left, dtype=float),
+        np.asarray(range_right, dtype=float),
+        file_name,
+        polynomial_order,
+        max_points or 0,
+        refine)
+    step_results = get_cache().get(key=key)
+    if step_results is not None:
+        return step_results
+    x_base, y_base = crop_xydata(
+        x=x_array,
+        y=y_array,
+        x_range=range_left)
+    x_step, y_step = crop_xydata(
+        x=x_array,
+        y=y_array,
+        x_range=range_right)
+    if max_points:
+        parameters, errors, points = fit_decimated_polynomial_step(
+            x_base=x_base,
+            y_base=y_base,
+            x_step=x_step,
+            y_step=y_step,
+            polynomial_order=polynomial_order,
+            max_points=max_points,
+            refine=refine)
+    else:
+        parameters, errors = fit_polynomial_step(
+            x_base=x_base,
+            y_base=y_base,
+            x_step=x_step,
+            y_step=y_step,
+            polynomial_order=polynomial_order)
+    step_results = polynomial_step_results(
+        parameters=parameters,
+        errors=errors,
+        file_name=file_name)
+    if max_points:
+        step_results[f'{file_name} Fit Points'] = points
+    get_cache().put(key=key, value=step_results)
+    return step_results
+
+
+def level_film_thicknesses(x_arrays : list,
+                           y_arrays : list,
+                           ranges_left : list,
+                           ranges_right : list,
+                           file_names : list,
+                           polynomial_order : int = 2) -> dict:
+    """
+    Calculate the film thickness of many profiles with one batched solve.
+
+    Parameters
+    ----------
+    x_arrays, y_arrays, ranges_left, ranges_right, file_names: list
+        Lists of x- and y- data arrays, base and step x ranges and sample
+        name identifiers, one entry per profile.
+    polynomial_order: int
+        Degree of the baseline polynomials.
+
+    Returns
+    -------
+    step_results: dictionary
+        Results dictionary from polynomial_step_results for every profile.
+
+    See Also
+    --------
+    level_film_thickness
+    fit_polynomial_steps
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    crops = [
+        crop_xydata(x=x, y=y, x_range=x_range)
+        for x, y, left, right in zip(
+            x_arrays, y_arrays, ranges_left, ranges_right)
+        for x_range in (left, right)]
+    parameters, errors = fit_polynomial_steps(
+        x_bases=[crop[0] for crop in crops[0::2]],
+        y_bases=[crop[1] for crop in crops[0::2]],
+        x_steps=[crop[0] for crop in crops[1::2]],
+        y_steps=[crop[1] for crop in crops[1::2]],
+        polynomial_order=polynomial_order)
+    step_results = {}
+    for file_name, parameter, error in zip(file_names, parameters, errors):
+        step_results.update(polynomial_step_results(
+            parameters=parameter,
+            errors=error,
+            file_name=file_name))
+    return step_results
+
+
+class SigmoidStepModel:
+    """
+    Full profile model of a polynomial baseline plus an error function step.
+
+    y = sum(c_k P_k(u)) + h S(x), with P_k Legendre polynomials of the
+    scaled lateral position u and S(x) = (1 + d erf((x - x0) / (root2 w))) / 2
+    a step of height h, edge position x0 and edge width w, rising in the
+    direction d (1 for base on the left, -1 for base on the right).
+
+    Parameters
+    ----------
+    x, y: list
+        x- and y- data arrays of the whole profile.
+    polynomial_order: int
+        Degree of the baseline polynomial.
+    direction: int
+        1 if the step level is to the right of the base level, otherwise -1.
+
+    Notes
+    -----
+    The Legendre design matrix is built once. Residuals are written into two
+    preallocated buffers, alternating between the current and the trial
+    parameters, and the Jacobian into one preallocated array, so fitting
+    allocates no profile sized arrays per iteration. Parameters are ordered
+    as the Legendre coefficients, lowest degree first, then h, x0 and w.
+
+    """
+
+    def __init__(self,
+                 x : list,
+                 y : list,
+                 polynomial_order : int = 2,
+                 direction : int = 1):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.polynomial_order = polynomial_order
+        self.direction = direction
+        self.domain = [np.min(self.x), np.max(self.x)]
+        self.basis = np.polynomial.legendre.legvander(
+            scale_lateral(x=self.x, domain=self.domain),
+            polynomial_order)
+        size = polynomial_order + 1
+        self.jacobian_buffer = np.empty((self.x.size, size + 3))
+        self.jacobian_buffer[:, : size] = self.basis
+        self.residual_buffers = [np.empty(self.x.size) for _ in range(2)]
+        self.argument = np.empty(self.x.size)
+        self.step = np.empty(self.x.size)
+        self.slope = np.empty(self.x.size)
+
+    def edge(self,
+             parameters : list) -> None:
+        """
+        Evaluate the step shape and its slope into the model buffers.
+
+        Parameters
+        ----------
+        parameters: list
+            Model parameters, of which only the last two, x0 and w, are
+            used.
+
+        Returns
+        -------
+        None
+
+        See Also
+        --------
+        residuals
+        jacobian
+
+        Notes
+        -----
+        Writes z = (x - x0) / (root2 w) into argument, S into step and
+        d exp(-z^2) / root(pi), the derivative of S with respect to z, into
+        slope, all in place.
+
+        Example
+        -------
+        None
+
+        """
+        position, width = parameters[-2:]
+        np.subtract(self.x, position, out=self.argument)
+        self.argument /= np.sqrt(2) * width
+        erf(self.argument, out=self.step)
+        self.step *= 0.5 * self.direction
+        self.step += 0.5
+        np.square(self.argument, out=self.slope)
+        np.negative(self.slope, out=self.slope)
+        np.exp(self.slope, out=self.slope)
+        self.slope *= self.direction / np.sqrt(np.pi)
+
+    def residuals(self,
+                  parameters : list,
+                  buffer : int = 0) -> list:
+        """
+        Calculate the model minus the data.
+
+        Parameters
+        ----------
+        parameters: list
+            Legendre coefficients, lowest degree first, then h, x0 and w.
+        buffer: int
+            Residual buffer, 0 or 1, to write into.
+
+        Returns
+        -------
+        residuals: list
+            The residual buffer, holding one residual per data point.
+
+        See Also
+        --------
+        edge
+        jacobian
+
+        Notes
+        -----
+        Two buffers let fit_sigmoid_step keep the residuals of the current
+        parameters while evaluating a trial step. The returned array is
+        overwritten by the next call with the same buffer, and the step
+        shape is left in the model buffers for jacobian.
+
+        Example
+        -------
+        None
+
+        """
+        out = self.residual_buffers[buffer]
+        self.edge(parameters=parameters)
+        np.dot(self.basis, parameters[: -3], out=out)
+        out += parameters[-3] * self.step
+        out -= self.y
+        return out
+
+    def jacobian(self,
+                 parameters : list) -> list:
+        """
+        Calculate the analytic Jacobian of the residuals.
+
+        Parameters
+        ----------
+        parameters: list
+            Legendre coefficients, lowest degree first, then h, x0 and w,
+            as passed to the last residuals call.
+
+        Returns
+        -------
+        jacobian: list
+            The (points, parameters) Jacobian buffer.
+
+        See Also
+        --------
+        residuals
+        edge
+
+        Notes
+        -----
+        Uses the step shape left by the last residuals call, so it must be
+        called at the same parameters. The baseline columns are the fixed
+        Legendre design matrix, and the h, x0 and w columns are S,
+        -h dS/dz / (root2 w) and -h z dS/dz / w. The returned array is
+        overwritten by the next call.
+
+        Example
+        -------
+        None
+
+        """
+        height, _, width = parameters[-3:]
+        self.jacobian_buffer[:, -3] = self.step
+        np.multiply(
+            self.slope,
+            -height / (np.sqrt(2) * width),
+            out=self.jacobian_buffer[:, -2])
+        np.multiply(
+            self.slope,
+            self.argument,
+            out=self.jacobian_buffer[:, -1])
+        self.jacobian_buffer[:, -1] *= -height / width
+        return self.jacobian_buffer
+
+
+def sigmoid_warm_start(x : list,
+                       y : list,
+                       range_left : list,
+                       range_right : list,
+                       polynomial_order : int = 2) -> list:
+    """
+    Starting parameters for SigmoidStepModel from the linear step fit.
+
+    Parameters
+    ----------
+    x, y: list
+        x- and y- data arrays of the whole profile.
+    range_left, range_right: list
+        Base and step x ranges.
+    polynomial_order: int
+        Degree of the baseline polynomial.
+
+    Returns
+    -------
+    model, parameters: list
+        SigmoidStepModel for the profile and its starting parameters.
+
+    See Also
+    --------
+    fit_polynomial_step
+    SigmoidStepModel
+
+    Notes
+    -----
+    The region fit gives the baseline and step height. The edge starts where
+    the levelled profile crosses half the step height between the two
+    regions, with a width of a tenth of the gap between them, and the
+    baseline is then refitted to the whole profile with that edge fixed.
+
     Example
     -------
     None
 
     """
-    residual_least_squares = least_squares(
-        residual_quadratic_step,
-        initial_parameters,
-        args=(
-            x_base,
-            y_base,
-            x_step,
-            y_step),
-        x_scale=scales)
-    a, b, c, step_height = residual_least_squares.x
-    raw_errors = residual_least_squares.jac
-    cov = np.linalg.inv(raw_errors.T.dot(raw_errors))
-    a_error, b_error, c_error, step_error = np.sqrt(np.diag(cov))
-    return {
-        f'{file_name} Thickness': step_height,
-        f'{file_name} Thickness Error': step_error,
-        f'{file_name} Quadratic': [a, b, c],
-        f'{file_name} Quadratic Errors': [a_error, b_error, c_error]}
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_base, y_base = crop_xydata(x=x, y=y, x_range=range_left)
+    x_step, y_step = crop_xydata(x=x, y=y, x_range=range_right)
+    parameters, _ = fit_polynomial_step(
+        x_base=x_base,
+        y_base=y_base,
+        x_step=x_step,
+        y_step=y_step,
+        polynomial_order=polynomial_order)
+    height = parameters[-1]
+    direction = 1 if np.mean(x_step) > np.mean(x_base) else -1
+    gap = sorted([
+        np.max(x_base) if direction > 0 else np.max(x_step),
+        np.min(x_step) if direction > 0 else np.min(x_base)])
+    inside = (x >= gap[0]) & (x <= gap[1])
+    levelled = y[inside] - standard_polynomial_equation(
+        parameters=parameters[:-1],
+        x=x[inside])
+    step_side = direction * (levelled - 0.5 * height) * np.sign(height) > 0
+    if step_side.any() and (~step_side).any():
+        position = x[inside][np.argmax(step_side)] if direction > 0 else (
+            x[inside][::-1][np.argmax(step_side[::-1])])
+    else:
+        position = 0.5 * (gap[0] + gap[1])
+    spacing = np.median(np.abs(np.diff(x)))
+    width = max(0.1 * (gap[1] - gap[0]), 2 * spacing)
+    model = SigmoidStepModel(
+        x=x,
+        y=y,
+        polynomial_order=polynomial_order,
+        direction=direction)
+    start = np.concatenate((
+        np.zeros(polynomial_order + 1),
+        [height, position, width]))
+    model.edge(parameters=start)
+    coefficients, _, _, _ = np.linalg.lstsq(
+        np.column_stack((model.basis, model.step)),
+        y,
+        rcond=None)
+    start[: polynomial_order + 2] = coefficients
+    return model, start
+
+
+def fit_sigmoid_step(model : SigmoidStepModel,
+                     parameters : list,
+                     max_iterations : int = 100,
+                     tolerance : float = 1e-10) -> list:
+    """
+    Fit SigmoidStepModel by Levenberg-Marquardt from starting parameters.
+
+    Parameters
+    ----------
+    model: SigmoidStepModel
+        Model of the profile.
+    parameters: list
+        Starting parameters, from sigmoid_warm_start.
+    max_iterations: int
+        Maximum number of Jacobian evaluations.
+    tolerance: float
+        Relative change in the sum of squares at which the fit stops.
+
+    Returns
+    -------
+    parameters, covariance: list
+        Fitted parameters and their covariance matrix, inv(J^T J) as for
+        the other levelling fits.
+
+    See Also
+    --------
+    SigmoidStepModel
+    sigmoid_warm_start
+
+    Notes
+    -----
+    Damping is scaled by the diagonal of J^T J, so the Legendre
+    coefficients, step height, edge position and edge width do not need
+    manual scales. A step is only taken if it lowers the sum of squares, in
+    which case the trial residual buffer becomes the current one.
+
+    Example
+    -------
+    None
+
+    """
+    parameters = np.array(parameters, dtype=float)
+    current = 0
+    cost = np.dot(
+        model.residuals(parameters=parameters, buffer=current),
+        model.residual_buffers[current])
+    damping = 1e-3
+    for _ in range(max_iterations):
+        jacobian = model.jacobian(parameters=parameters)
+        normal = jacobian.T @ jacobian
+        gradient = jacobian.T @ model.residual_buffers[current]
+        improved = False
+        while damping < 1e12:
+            damped = normal + damping * np.diag(np.diag(normal))
+            try:
+                delta = np.linalg.solve(damped, -gradient)
+            except np.linalg.LinAlgError:
+                damping *= 10
+                continue
+            trial = parameters + delta
+            trial[-1] = abs(trial[-1])
+            trial_residuals = model.residuals(
+                parameters=trial,
+                buffer=1 - current)
+            trial_cost = np.dot(trial_residuals, trial_residuals)
+            if trial_cost < cost:
+                improved = True
+                break
+            damping *= 10
+        if not improved:
+            break
+        change = (cost - trial_cost) / max(cost, np.finfo(float).tiny)
+        parameters = trial
+        cost = trial_cost
+        current = 1 - current
+        damping = max(damping / 10, 1e-12)
+        if change < tolerance:
+            break
+    model.residuals(parameters=parameters, buffer=current)
+    jacobian = model.jacobian(parameters=parameters)
+    covariance = np.linalg.pinv(jacobian.T @ jacobian)
+    return parameters, covariance
+
+
+def level_sigmoid_thickness(x_array : list,
+                            y_array : list,
+                            range_left : list,
+                            range_right : list,
+                            file_name : str,
+                            polynomial_order : int = 2) -> dict:
+    """
+    Calculate film thickness and edge shape with the full profile model.
+
+    Parameters
+    ----------
+    x_array, y_array: list
+        x- and y- data arrays of the whole profile.
+    range_left, range_right: list
+        Base and step x ranges, used for the starting fit.
+    file_name: string
+        Sample name identifier.
+    polynomial_order: int
+        Degree of the baseline polynomial.
+
+    Returns
+    -------
+    step_results: dictionary
+        Results dictionary from polynomial_step_results, with
+            {
+                Edge Position (mm)
+                Edge Position Error (mm)
+                Edge Width (mm)
+                Edge Width Error (mm)
+            }
+
+    See Also
+    --------
+    SigmoidStepModel
+    sigmoid_warm_start
+    fit_sigmoid_step
+    level_film_thickness
+
+    Notes
+    -----
+    Fits every point of the profile, including the sidewall, rather than
+    only the two regions, so narrow features and slanted sidewalls are
+    measured too. The edge width is the standard deviation of the error
+    function edge. Results are memoised like level_film_thickness.
+
+    Example
+    -------
+    None
+
+    """
+    key = cache_key(
+        'level_sigmoid_thickness',
+        np.asarray(x_array),
+        np.asarray(y_array),
+        np.asarray(range_left, dtype=float),
+        np.asarray(range_right, dtype=float),
+        file_name,
+        polynomial_order)
+    step_results = get_cache().get(key=key)
+    if step_results is not None:
+        return step_results
+    model, start = sigmoid_warm_start(
+        x=x_array,
+        y=y_array,
+        range_left=range_left,
+        range_right=range_right,
+        polynomial_order=polynomial_order)
+    parameters, covariance = fit_sigmoid_step(
+        model=model,
+        parameters=start)
+    size = polynomial_order + 1
+    polynomial, polynomial_errors = legendre_to_polynomial(
+        coefficients=parameters[: size],
+        covariance=covariance[: size, : size],
+        domain=model.domain)
+    errors = np.sqrt(np.diag(covariance))
+    step_results = polynomial_step_results(
+        parameters=np.append(polynomial, parameters[size]),
+        errors=np.append(polynomial_errors, errors[size]),
+        file_name=file_name)
+    step_results.update({
+        f'{file_name} Edge Position': parameters[size + 1],
+        f'{file_name} Edge Position Error': errors[size + 1],
+        f'{file_name} Edge Width': parameters[size + 2],
+        f'{file_name} Edge Width Error': errors[size + 2]})
+    get_cache().put(key=key, value=step_results)
+    return step_results
+
+
+def levelled_regions(x_array : list,
+                     y_array : list,
+                     range_left : list,
+                     range_right : list,
+                     baseline_parameters : list,
+                     step_height : float) -> dict:
+    """
+    Level the base and step regions of interest with a fitted baseline.
+
+    Parameters
+    ----------
+    x_array, y_array: list
+        x- and y- data arrays.
+    range_left, range_right: list
+        Base and step x ranges.
+    baseline_parameters: list
+        Levelling polynomial, highest power first.
+    step_height: float
+        Levelled step height.
+
+    Returns
+    -------
+    regions: dictionary
+        {"Base": (x, heights), "Step": (x, heights)}, heights measured from
+        the levelling reference line on each plateau.
+
+    See Also
+    --------
+    crop_xydata
+    region_roughness
+
+    Notes
+    -----
+    The step region also has the step height removed.
+
+    Example
+    -------
+    None
+
+    """
+    regions = {}
+    for region, x_range, offset in (
+            ("Base", range_left, 0),
+            ("Step", range_right, step_height)):
+        x, y = crop_xydata(x=x_array, y=y_array, x_range=x_range)
+        regions[region] = (x, y - offset - standard_polynomial_equation(
+            parameters=baseline_parameters,
+            x=x))
+    return regions
 
 
 def cm_to_inches(cm: float) -> float:
@@ -365,7 +1478,7 @@ def cm_to_inches(cm: float) -> float:
 
 def plot_dektak_thicknesses(x_array : list,
                             y_array : list,
-                            quadratic_parameters : list,
+                            baseline_parameters : list,
                             step_height : float,
                             plot_dict : dict,
                             out_path : str) -> None:
@@ -374,8 +1487,9 @@ def plot_dektak_thicknesses(x_array : list,
 
     Parameters
     ----------
-    x_array, y_array, quadratic_parameters: list
-        x-data array, y-data array, quadratic parameters [a, b, c].
+    x_array, y_array, baseline_parameters: list
+        x-data array, y-data array, baseline polynomial parameters of any
+        degree, highest power first (e.g. [a, b, c] for a quadratic).
     step_height: float
         Calculated step height (nm).
     plot_dict : dictionary
@@ -404,111 +1518,135 @@ def plot_dektak_thicknesses(x_array : list,
 
     Notes
     -----
+    Skipped if the same figure, from the same data and plot settings, has
+    already been saved to out_path and the file there is unchanged since. Otherwise the
+    shared figure template for plot_dict is redrawn with the new data.
+
+    Example
+    -------
     None
 
+    """
+    key = cache_key(
+        'plot_dektak_thicknesses',
+        np.asarray(x_array),
+        np.asarray(y_array),
+        np.asarray(baseline_parameters, dtype=float),
+        float(step_height),
+        plot_settings(plot_dict=plot_dict),
+        str(out_path))
+    if get_cache().figure_current(key=key, out_path=out_path):
+        return
+    render_dektak_thicknesses(
+        x_array=x_array,
+        y_array=y_array,
+        y_baseline=standard_polynomial_equation(
+            parameters=baseline_parameters,
+            x=x_array),
+        step_height=step_height,
+        plot_dict=plot_dict,
+        out_path=out_path)
+    get_cache().store_figure(key=key, out_path=out_path)
+
+
+def fit_step_height(x_array : list,
+                    y_array : list,
+                    range_left : list,
+                    range_right : list,
+                    file_name : str,
+                    plot_dict : dict) -> dict:
+    """
+    Fit the step height of Dektak data between two regions of interest.
+
+    Parameters
+    ----------
+    x_array, y_array: list
+        x- and y-data arrays.
+    range_left, range_right: list
+        Base and step x ranges.
+    file_name: string
+        File name identifier for the results keys.
+    plot_dict: dictionary
+        Batch dictionary holding the "step_model", "polynomial_order",
+        "fit_points", "refine_fit", "roughness" and "psd_segment" options,
+        see calculated_level_film_thickness.
+
+    Returns
+    -------
+    step_results: dictionary
+        Results dictionary of level_film_thickness or
+        level_sigmoid_thickness, with the region_roughness results if
+        "roughness" is "True".
+
+    See Also
+    --------
+    level_film_thickness
+    level_sigmoid_thickness
+    region_roughness
+    calculated_level_film_thickness
+
+    Notes
+    -----
+    Draws nothing, so it can run in a worker process, see
+    src/pipeline.py fit_stage.
+
     Example
     -------
     None
 
     """
-    fig, (ax1, ax2) = plt.subplots(
-        nrows=1,
-        ncols=2,
-        figsize=[
-            cm_to_inches(cm=plot_dict["width"]),
-            cm_to_inches(cm=plot_dict["height"])],
-        dpi=plot_dict["dpi"])
-    ax1.plot(
-        x_array,
-        y_array,
-        'b',
-        lw=2,
-        label='Data')
-    y_baseline = standard_quadratic_equation(
-        a=quadratic_parameters[0],
-        b=quadratic_parameters[1],
-        c=quadratic_parameters[2],
-        x=x_array)
-    if plot_dict["grid"] == "True":
-        grid = True
+    if plot_dict.get("step_model", "linear") == "sigmoid":
+        step_results = level_sigmoid_thickness(
+            x_array=x_array,
+            y_array=y_array,
+            range_left=range_left,
+            range_right=range_right,
+            file_name=file_name,
+            polynomial_order=plot_dict.get("polynomial_order", 2))
     else:
-        grid = False
-    ax1.grid(
-        visible=grid,
-        alpha=0.5)
-    ax1.plot(
-        x_array,
-        y_baseline,
-        'r',
-        lw=2,
-        label='Quadratic Baseline')
-    ax1.legend(
-        loc=plot_dict["legend_loc"],
-        ncol=plot_dict["legend_col"],
-        prop={'size': plot_dict["legend_size"]})
-    y_corrected = y_array - y_baseline
-    ax2.plot(
-        x_array,
-        y_corrected,
-        'b',
-        lw=2,
-        label='Level Data')
-    y_step = step_height * np.ones_like(y_array)
-    ax2.plot(
-        x_array,
-        y_step,
-        'r',
-        lw=2,
-        label=f'step = {step_height:.2f} nm')
-    ax2.plot(
-        x_array,
-        np.zeros_like(y_array),
-        'g',
-        lw=2)
-    ax2.grid(
-        visible=grid,
-        alpha=0.5)
-    ax2.legend(
-        loc=plot_dict["legend_loc"],
-        ncol=plot_dict["legend_col"],
-        prop={'size': plot_dict["legend_size"]})
-    ax1.set_xlabel(
-        'Lateral (mm)',
-        fontsize=plot_dict["axis_fontsize"],
-        fontweight='bold',
-        color='black')
-    ax2.set_xlabel(
-        'Lateral (mm)',
-        fontsize=plot_dict["axis_fontsize"],
-        fontweight='bold',
-        color='black')
-    ax1.set_ylabel(
-        'Profile (nm)',
-        fontsize=plot_dict["axis_fontsize"],
-        fontweight='bold',
-        color='black')
-    ax2.set_ylabel(
-        'Vertical (nm)',
-        fontsize=plot_dict["axis_fontsize"],
-        fontweight='bold',
-        color='black')
-    fig.tight_layout()
-    plt.savefig(out_path)
-    fig.clf()
-    plt.cla()
-    plt.close(fig)
+        step_results = level_film_thickness(
+            x_array=x_array,
+            y_array=y_array,
+            range_left=range_left,
+            range_right=range_right,
+            file_name=file_name,
+            polynomial_order=plot_dict.get("polynomial_order", 2),
+            max_points=plot_dict.get("fit_points", 0),
+            refine=plot_dict.get("refine_fit", "True") == "True")
+    if plot_dict.get("roughness", "False") == "True":
+        step_results.update(region_roughness(
+            regions=levelled_regions(
+                x_array=x_array,
+                y_array=y_array,
+                range_left=range_left,
+                range_right=range_right,
+                baseline_parameters=step_results[f'{file_name} Polynomial'],
+                step_height=step_results[f'{file_name} Thickness']),
+            file_name=file_name,
+            segment_length=plot_dict.get("psd_segment", 256)))
+    return step_results
 
 
 def calculated_level_film_thickness(x_array : list,
                                     y_array : list,
                                     file_name : str,
                                     plot_dict : dict,
-                                    out_path : str) -> dict:
+                                    out_path : str,
+                                    range_left : list = None,
+                                    range_right : list = None) -> dict:
     """
     Calculate the film thickness of levelled Dektak data.
 
-    Calculate the film thickness, error, quadratic parameters, and errors for
-    levelled film thickness data measured with the Bruker Dektak.
+    Calculate the film thickness, error, baseline polynomial parameters, and
+    errors for levelled film thickness data measured with the Bruker Dektak.
+    The baseline degree is set by plot_dict["polynomial_order"], default 2.
+    With plot_dict["step_model"] set to "sigmoid" the whole profile is fitted
+    with an error function edge, see level_sigmoid_thickness. With
+    plot_dict["roughness"] set to "True" the roughness and PSD of both
+    levelled regions are added, see region_roughness. A non-zero
+    plot_dict["fit_points"] fits block averaged regions of about that many
+    points, refined at full resolution if plot_dict["refine_fit"] is "True"
+    and the residual check fails, see fit_decimated_polynomial_step.
 
     Parameters
     ----------
@@ -525,10 +1663,19 @@ def calculated_level_film_thickness(x_array : list,
                 "legend_col": legend column number,\n
                 "legend_size": size of legend text,\n
                 "axis_fontsize": font size for axis labels,\n
-                "label_size": size for tick labels
+                "label_size": size for tick labels,\n
+                "polynomial_order": baseline polynomial degree,\n
+                "step_model": "linear" or "sigmoid",\n
+                "roughness": "True" or "False",\n
+                "psd_segment": Welch segment length,\n
+                "fit_points": decimated fit size, 0 for every point,\n
+                "refine_fit": "True" or "False"
             }
     file_name, out_path: string
         File name and path to save.
+    range_left, range_right: list
+        Base and step x ranges. If not given, they are selected by the user
+        with level_regions_interests.
 
     Returns
     -------
@@ -537,16 +1684,15 @@ def calculated_level_film_thickness(x_array : list,
             {
                 Step height (nm)
                 Step height error (nm)
-                Quadratic (a, b, c)
-                Quadratic errors (a, b, c)
+                Polynomial (highest power first)
+                Polynomial errors
             }
 
     See Also
     --------
     level_regions_interests
-    crop_xydata
-    fit_quadratic
-    calculate_filmthickness
+    fit_step_height
+    level_film_thickness
     plot_dektak_thicknesses
 
     Example
@@ -554,43 +1700,22 @@ def calculated_level_film_thickness(x_array : list,
     None
 
     """
-    range_left, range_right = level_regions_interests(
-        x=x_array,
-        y=y_array,
-        file_name=file_name)
-    x_base, y_base = crop_xydata(
-        x=x_array,
-        y=y_array,
-        x_range=range_left)
-    x_step, y_step = crop_xydata(
-        x=x_array,
-        y=y_array,
-        x_range=range_right)
-    initial_parameters_base = fit_quadratic(
-        x=x_base,
-        y=y_base)
-    initial_parameters_step = fit_quadratic(
-        x=x_step,
-        y=y_step)
-    step_estimate = np.average(y_step) - np.average(y_base)
-    initial_parameters = np.average([
-        initial_parameters_base,
-        initial_parameters_step],
-        0)
-    initial_parameters = np.append(initial_parameters, step_estimate)
-    scales = [1e-3, 500, 1, np.abs(step_estimate)]
-    step_results = calculate_filmthickness(
-        initial_parameters=initial_parameters,
-        x_base=x_base,
-        y_base=y_base,
-        x_step=x_step,
-        y_step=y_step,
-        scales=scales,
-        file_name=file_name)
+    if range_left is None or range_right is None:
+        range_left, range_right = level_regions_interests(
+            x=x_array,
+            y=y_array,
+            file_name=file_name)
+    step_results = fit_step_height(
+        x_array=x_array,
+        y_array=y_array,
+        range_left=range_left,
+        range_right=range_right,
+        file_name=file_name,
+        plot_dict=plot_dict)
     plot_dektak_thicknesses(
         x_array=x_array,
         y_array=y_array,
-        quadratic_parameters=step_results[f'{file_name} Quadratic'],
+        baseline_parameters=step_results[f'{file_name} Polynomial'],
         step_height=step_results[f'{file_name} Thickness'],
         plot_dict=plot_dict,
         out_path=out_path)
@@ -0,0 +1,281 @@
+import numpy as np
+
+from src.grating import pad_profiles, noise_levels
+
+
+def end_regions(lengths : list,
+                points : int,
+                end_fraction : float = 0.1) -> tuple:
+    """
+    Mask the points at either end of many padded profiles.
+
+    Parameters
+    ----------
+    lengths: list
+        Number of valid points in each row.
+    points: int
+        Padded row length.
+    end_fraction: float
+        Fraction of each profile at either end that is masked.
+
+    Returns
+    -------
+    head, tail: tuple
+        2D boolean arrays, True on the first and last end_fraction of the
+        valid points of each row, at least one point each.
+
+    See Also
+    --------
+    level_endpoints
+    feature_levels
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    index = np.arange(points)
+    span = np.maximum((end_fraction * lengths).astype(int), 1)[:, None]
+    head = index < span
+    tail = (index >= lengths[:, None] - span) & (index < lengths[:, None])
+    return head, tail
+
+
+def level_endpoints(lateral : list,
+                    profiles : list,
+                    lengths : list,
+                    end_fraction : float = 0.1) -> list:
+    """
+    Remove a straight line through both ends of many padded profiles.
+
+    Parameters
+    ----------
+    lateral, profiles: list
+        2D NaN padded x- and y-data arrays, one profile per row.
+    lengths: list
+        Number of valid points in each row.
+    end_fraction: float
+        Fraction of each profile at either end used to place the line.
+
+    Returns
+    -------
+    levelled: list
+        Profiles with the end to end tilt removed.
+
+    See Also
+    --------
+    pad_profiles
+    end_regions
+
+    Notes
+    -----
+    Intended for isolated features, where both ends of the scan sit on the
+    same surface.
+
+    Example
+    -------
+    None
+
+    """
+    head, tail = end_regions(
+        lengths=lengths,
+        points=profiles.shape[1],
+        end_fraction=end_fraction)
+    x_head = np.nanmean(np.where(head, lateral, np.nan), axis=1)
+    y_head = np.nanmean(np.where(head, profiles, np.nan), axis=1)
+    x_tail = np.nanmean(np.where(tail, lateral, np.nan), axis=1)
+    y_tail = np.nanmean(np.where(tail, profiles, np.nan), axis=1)
+    slope = (y_tail - y_head) / (x_tail - x_head)
+    return profiles - (y_head[:, None] + slope[:, None] * (
+        lateral - x_head[:, None]))
+
+
+def feature_levels(profiles : list,
+                   lengths : list,
+                   end_fraction : float = 0.1) -> tuple:
+    """
+    Estimate the surface and feature levels of many padded profiles.
+
+    Parameters
+    ----------
+    profiles: list
+        2D NaN padded y-data array, one profile per row.
+    lengths: list
+        Number of valid points in each row.
+    end_fraction: float
+        Fraction of each profile at either end taken as the surface.
+
+    Returns
+    -------
+    base, feature: tuple
+        Surface level, from both ends of each profile, and feature level,
+        above the surface for ridges and below it for trenches, equal to the
+        surface level for flat profiles.
+
+    See Also
+    --------
+    end_regions
+    edge_widths
+
+    Notes
+    -----
+    The feature lies on the side of the surface with the largest excursion.
+    Points beyond half that excursion are split off as the feature, as
+    grating_states splits a grating into teeth and gaps, and their median is
+    the feature level. Unlike percentiles of the whole profile this does not
+    depend on how much of the scan the feature covers, and a single spike
+    cannot set the level of a wide feature.
+
+    Example
+    -------
+    None
+
+    """
+    head, tail = end_regions(
+        lengths=lengths,
+        points=profiles.shape[1],
+        end_fraction=end_fraction)
+    base = np.nanmedian(np.where(head | tail, profiles, np.nan), axis=1)
+    deviation = profiles - base[:, None]
+    high = np.nanmax(deviation, axis=1)
+    low = np.nanmin(deviation, axis=1)
+    peak = np.where(high >= -low, high, low)
+    beyond = deviation * np.sign(peak)[:, None] > 0.5 * np.abs(peak)[:, None]
+    raised = beyond.any(axis=1)
+    feature = base.copy()
+    feature[raised] += np.nanmedian(
+        np.where(beyond, deviation, np.nan)[raised], axis=1)
+    return base, feature
+
+
+def edge_widths(lateral_arrays : list,
+                profile_arrays : list,
+                height_fraction : float = 0.5,
+                level : bool = True,
+                hysteresis : float = 0.1,
+                min_contrast : float = 8) -> dict:
+    """
+    Find the outer edges and width of a single feature in many profiles.
+
+    Parameters
+    ----------
+    lateral_arrays, profile_arrays: list
+        Lists of x- and y-data arrays, one pair per profile.
+    height_fraction: float
+        Height, as a fraction of the range from the surface to the feature
+        level, at which the edges are located. 0.5 gives the full width at
+        half maximum.
+    level: bool
+        If True, remove the end to end tilt before finding edges.
+    hysteresis: float
+        Fraction of the feature height used as the dead band around the
+        edge height.
+    min_contrast: float
+        Smallest feature height, in units of the profile noise, that is
+        measured.
+
+    Returns
+    -------
+    edges: dictionary
+        {
+            "Left Edges": x position of the first crossing,
+            "Right Edges": x position of the last crossing,
+            "Widths": feature widths,
+            "Width Errors": feature width errors
+        }
+        Profiles whose feature is not resolved return NaN.
+
+    See Also
+    --------
+    pad_profiles
+    level_endpoints
+    feature_levels
+    noise_levels
+
+    Notes
+    -----
+    The surface and feature levels come from feature_levels. Each point is
+    then classed as on or off the feature with a dead band of the larger of
+    hysteresis and six noise standard deviations around the edge height, as
+    in grating_states, so noise on the surface or a sidewall cannot create
+    spurious edges. The edges are the last crossings of the edge height
+    before the first switch onto the feature and before the last switch off
+    it. A feature lower than min_contrast noise standard deviations, or one
+    that does not both start and end on the surface, is not resolved.
+
+    Edge positions are linearly interpolated between the two samples either
+    side of the crossing, so they are not limited to the sampling grid. For
+    a crossing a fraction t of the way between samples the position error
+    is sigma * dx * sqrt((1 - t)^2 + t^2) / |dy|, with sigma the profile
+    noise, and the two edge errors add in quadrature. Works for both ridges
+    and trenches. All profiles are processed together as one padded array.
+
+    Example
+    -------
+    None
+
+    """
+    lateral, lengths = pad_profiles(arrays=lateral_arrays)
+    profiles, _ = pad_profiles(arrays=profile_arrays)
+    if level:
+        profiles = level_endpoints(
+            lateral=lateral,
+            profiles=profiles,
+            lengths=lengths)
+    sigma = noise_levels(profiles=profiles)
+    base, feature = feature_levels(
+        profiles=profiles,
+        lengths=lengths)
+    height = np.abs(feature - base)
+    resolved = height > min_contrast * sigma
+    heights = (profiles - base[:, None]) * np.sign(feature - base)[:, None]
+    threshold = (height_fraction * height)[:, None]
+    band = np.maximum(0.5 * hysteresis * height, 3 * sigma)[:, None]
+    index = np.arange(profiles.shape[1])
+    valid = index < lengths[:, None]
+    above = (heights > threshold + band) & valid
+    decided = (above | (heights < threshold - band)) & valid
+    last_decided = np.maximum.accumulate(
+        np.where(decided, index, 0), axis=1)
+    states = np.take_along_axis(above, last_decided, axis=1)
+    switches = states[:, 1:] != states[:, :-1]
+    width = switches.shape[1]
+    on = np.argmax(switches, axis=1)
+    off = width - 1 - np.argmax(switches[:, ::-1], axis=1)
+    rows = np.arange(lengths.size)
+    found = (
+        resolved
+        & switches.any(axis=1)
+        & (off > on)
+        & states[rows, on + 1]
+        & ~states[rows, off + 1]
+        & ~states[rows, lengths - 1])
+    crossings = (
+        (heights[:, 1:] > threshold) != (heights[:, :-1] > threshold))
+    samples = np.stack([
+        np.max(np.where(crossings & (index[:-1] <= switch[:, None]),
+                        index[:-1], 0), axis=1)
+        for switch in (on, off)], axis=1)
+    rows = rows[:, None]
+    x0 = lateral[rows, samples]
+    x1 = lateral[rows, samples + 1]
+    y0 = heights[rows, samples]
+    y1 = heights[rows, samples + 1]
+    rise = y1 - y0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (threshold - y0) / rise
+        errors = sigma[:, None] * np.abs((x1 - x0) / rise) * np.sqrt(
+            (1 - t) ** 2 + t ** 2)
+    positions = x0 + t * (x1 - x0)
+    positions[~found] = np.nan
+    errors[~found] = np.nan
+    left, right = positions.T
+    return {
+        "Left Edges": left,
+        "Right Edges": right,
+        "Widths": right - left,
+        "Width Errors": np.sqrt(np.sum(errors ** 2, axis=1))}
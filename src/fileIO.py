@@ -1,6 +1,16 @@
+import re
+import bz2
+import gzip
 import json
+import lzma
+import zipfile
+import warnings
 import numpy as np
 
+from io import TextIOWrapper
+from pathlib import Path
+from datetime import datetime
+
 
 def load_json(file_path):
     """
@@ -39,7 +49,428 @@ def load_json(file_path):
         return json.load(file)
 
 
-def read_dektak_file(file_path : str) -> list:
+compressed_openers = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open}
+
+
+def split_archive_path(file_path : str) -> list:
+    """
+    Split a path into a zip archive and the archive member it points to.
+
+    Parameters
+    ----------
+    file_path: string
+        Path to file, where a file inside a zip archive is given as
+        /path/to/archive.zip/member.csv.
+
+    Returns
+    -------
+    archive, member: list
+        Path to the zip archive and the member name, or None, None if the
+        path is not inside a zip archive.
+
+    See Also
+    --------
+    open_text
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    >>> split_archive_path(file_path="/Dektak/2023.zip/Sample_AL1.csv")
+    (PosixPath('/Dektak/2023.zip'), 'Sample_AL1.csv')
+
+    """
+    file_path = Path(file_path)
+    for parent in file_path.parents:
+        if parent.suffix.lower() == '.zip' and parent.is_file():
+            return parent, file_path.relative_to(parent).as_posix()
+    return None, None
+
+
+def open_text(file_path : str,
+              errors : str = None) -> TextIOWrapper:
+    """
+    Open a plain, compressed or archived text file for reading.
+
+    Parameters
+    ----------
+    file_path: string
+        Path to file. Files ending .gz, .bz2 or .xz are decompressed, and
+        files inside zip archives are given as /path/to/archive.zip/member.
+    errors: string
+        Text decoding error handling, as for open.
+
+    Returns
+    -------
+    infile: file
+        Text file object, to be used as a context manager.
+
+    See Also
+    --------
+    split_archive_path
+    archive_members
+
+    Notes
+    -----
+    Files are decompressed as they are read, with nothing extracted to disk,
+    so reading only the start of a file only decompresses the start.
+
+    Example
+    -------
+    >>> with open_text(file_path="/Dektak/2023.zip/Sample_AL1.csv") as infile:
+    ...     lines = infile.read().splitlines()
+
+    """
+    archive, member = split_archive_path(file_path=file_path)
+    if archive is not None:
+        with zipfile.ZipFile(archive) as zip_file:
+            return TextIOWrapper(zip_file.open(member), errors=errors)
+    opener = compressed_openers.get(Path(file_path).suffix.lower(), open)
+    return opener(file_path, 'rt', errors=errors)
+
+
+def archive_members(archive_path : str,
+                    suffixes : tuple = ('.csv', '.txt')) -> list:
+    """
+    List the data files inside a zip archive.
+
+    Parameters
+    ----------
+    archive_path: string
+        Path to zip archive.
+    suffixes: tuple
+        File extensions to include.
+
+    Returns
+    -------
+    members: list
+        Sorted member names, relative to the archive.
+
+    See Also
+    --------
+    open_text
+
+    Notes
+    -----
+    Only the archive directory is read.
+
+    Example
+    -------
+    None
+
+    """
+    with zipfile.ZipFile(archive_path) as zip_file:
+        return sorted(
+            name for name in zip_file.namelist()
+            if Path(name).suffix.lower() in suffixes)
+
+
+thickness_readers = {}
+
+
+def register_reader(file_type : str,
+                    reader : object,
+                    sniffer : object) -> None:
+    """
+    Register a reader for a surface profile file format.
+
+    Parameters
+    ----------
+    file_type: string
+        Format name, e.g. "AFM" or "Dektak".
+    reader: function
+        reader(file_path, **options) returning lateral, profile arrays. It
+        is called without options when the file type is given, so it must
+        then find them itself.
+    sniffer: function
+        sniffer(head) taking the first few kilobytes of a file as a string,
+        returning a dictionary of reader options if the file is in this
+        format, otherwise None.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    sniff_file
+    read_thickness_file
+
+    Notes
+    -----
+    Formats are sniffed in the order they were registered, so register
+    formats with the most specific sniffers first. Registering an existing
+    file_type replaces it, so new instruments and formats can be added from
+    outside this module.
+
+    Example
+    -------
+    register_reader(
+        file_type="Profiler",
+        reader=read_profiler_file,
+        sniffer=sniff_profiler)
+
+    """
+    thickness_readers[file_type] = {"reader": reader, "sniffer": sniffer}
+
+
+def sniff_file(file_path : str,
+               file_type : str = None,
+               sample_size : int = 8192) -> list:
+    """
+    Identify the format of a surface profile file from its first kilobytes.
+
+    Parameters
+    ----------
+    file_path: string
+        Path to file.
+    file_type: string
+        Known format, if any. Only its sniffer is used, to find the reader
+        options.
+    sample_size: int
+        Number of characters read from the start of the file.
+
+    Returns
+    -------
+    file_type, options: list
+        Format name and reader options, e.g. the delimiter.
+
+    See Also
+    --------
+    register_reader
+
+    Notes
+    -----
+    Raises ValueError if no registered format recognises the file.
+
+    Example
+    -------
+    None
+
+    """
+    with open_text(file_path=file_path, errors='replace') as infile:
+        head = infile.read(sample_size)
+    if file_type is not None:
+        options = thickness_readers[file_type]["sniffer"](head)
+        return file_type, options or {}
+    for file_type, formats in thickness_readers.items():
+        options = formats["sniffer"](head)
+        if options is not None:
+            return file_type, options
+    raise ValueError(f'{file_path}: unrecognised surface profile format')
+
+
+def parse_columns(lines : list,
+                  delimiter : str,
+                  usecols : tuple = (0, 1),
+                  allocate : object = None,
+                  block_rows : int = 65536) -> list:
+    """
+    Parse delimited numeric text lines into column arrays.
+
+    Parameters
+    ----------
+    lines: list
+        Data lines, without any header.
+    delimiter: string
+        Column delimiter.
+    usecols: tuple
+        Columns to return.
+    allocate: function
+        Optional allocate(rows) returning one writeable float array of
+        length rows per column in usecols, which the columns are written
+        into and returned, e.g. views of shared memory.
+    block_rows: int
+        Number of lines parsed at a time.
+
+    Returns
+    -------
+    columns: list
+        One array per column in usecols.
+
+    See Also
+    --------
+    parse_block
+
+    Notes
+    -----
+    The output arrays are allocated once, from the number of data lines,
+    and filled block by block, so on top of the text itself at most one
+    block of block_rows lines is held as a private table, whatever the size
+    of the file. With allocate the columns are therefore written into its
+    arrays without a full private copy of the profile.
+
+    Example
+    -------
+    None
+
+    """
+    lines = [line for line in lines if line.strip()]
+    rows = len(lines)
+    if allocate is None:
+        out = [np.empty(rows) for _ in usecols]
+    else:
+        out = allocate(rows)
+    if not rows:
+        return out
+    columns = len(lines[0].strip().strip(delimiter).split(delimiter))
+    for start in range(0, rows, block_rows):
+        block = parse_block(
+            lines=lines[start: start + block_rows],
+            delimiter=delimiter,
+            columns=columns,
+            usecols=usecols)
+        for array, column in zip(out, block):
+            array[start: start + block_rows] = column
+    return out
+
+
+def parse_block(lines : list,
+                delimiter : str,
+                columns : int,
+                usecols : tuple) -> list:
+    """
+    Parse a block of delimited numeric text lines.
+
+    Parameters
+    ----------
+    lines: list
+        Non-empty data lines.
+    delimiter: string
+        Column delimiter.
+    columns: int
+        Number of columns in a regular line.
+    usecols: tuple
+        Columns to return.
+
+    Returns
+    -------
+    columns: list
+        One array per column in usecols, one value per line.
+
+    See Also
+    --------
+    parse_columns
+    numpy fromstring
+    numpy genfromtxt
+
+    Notes
+    -----
+    Regular blocks, the usual case, are parsed in a single pass of numpy's
+    C text parser. Blocks with missing values or trailing text fall back to
+    genfromtxt on the same lines, so the file is still only read once.
+
+    Example
+    -------
+    None
+
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)
+            values = np.fromstring(
+                ' '.join(lines).replace(delimiter, ' '),
+                sep=' ')
+    except (ValueError, DeprecationWarning):
+        values = np.array([])
+    if columns > max(usecols) and values.size == len(lines) * columns:
+        table = values.reshape(len(lines), columns)
+        return [table[:, column] for column in usecols]
+    return list(np.genfromtxt(
+        lines,
+        delimiter=delimiter,
+        usecols=usecols,
+        unpack=True))
+
+
+def sniff_dektak(head : str) -> dict:
+    """
+    Recognise a Bruker Dektak csv file from its first lines.
+
+    Parameters
+    ----------
+    head: string
+        Start of the file.
+
+    Returns
+    -------
+    options: dictionary
+        {"skip_header": number of lines before the data} if the 'Lateral'
+        column header is in head, {} for a Dektak file with a longer header,
+        otherwise None.
+
+    See Also
+    --------
+    read_dektak_file
+
+    Notes
+    -----
+    Dektak files open with a metadata block before the 'Lateral' column
+    header. A 'Lateral' header on the very first line is left to the AFM
+    sniffer.
+
+    Example
+    -------
+    None
+
+    """
+    for index, line in enumerate(head.splitlines()):
+        if 'Lateral' in line:
+            return {"skip_header": index + 1} if index > 0 else None
+    return {} if head.startswith('Meta Data') else None
+
+
+def sniff_afm(head : str) -> dict:
+    """
+    Recognise a Bruker AFM csv or txt file and its delimiter.
+
+    Parameters
+    ----------
+    head: string
+        Start of the file.
+
+    Returns
+    -------
+    options: dictionary
+        {"delimiter": "," or tab} if the line after the single header line
+        holds at least two numbers, otherwise None.
+
+    See Also
+    --------
+    read_afm_file
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    lines = head.splitlines()
+    if len(lines) < 2:
+        return None
+    for delimiter in (',', '\t'):
+        fields = lines[1].strip().strip(delimiter).split(delimiter)
+        if len(fields) < 2:
+            continue
+        try:
+            [float(field) for field in fields]
+        except ValueError:
+            continue
+        return {"delimiter": delimiter}
+    return None
+
+
+def read_dektak_file(file_path : str,
+                     skip_header : int = None,
+                     allocate : object = None) -> list:
     """
     Loads Bruker Dektak csv file.
 
@@ -49,6 +480,11 @@ def read_dektak_file(file_path : str) -> list:
     ----------
     file_path: string
         Path to file.
+    skip_header: int
+        Number of lines before the data, if already known from sniff_dektak.
+    allocate: function
+        Optional allocate(rows) returning writeable lateral and profile
+        arrays to parse into, see parse_columns.
     
     Returns
     -------
@@ -57,7 +493,7 @@ def read_dektak_file(file_path : str) -> list:
     
     See Also
     --------
-    numpy genfromtxt
+    parse_columns
     read_afm_file
 
     Notes
@@ -66,29 +502,255 @@ def read_dektak_file(file_path : str) -> list:
     point of the Dektak profile measurement data. Skips any data levelling, mark
     position, or calculated step height data from the header of the file which
     may be present due to the Dektak software. Converts lateral position to mm
-    and profile to nm.
+    and profile to nm. The file is read and parsed once, and may be compressed
+    or inside a zip archive.
 
     Example
     -------
     None
 
     """
-    with open(file_path) as infile:
-        lines = infile.readlines()
+    with open_text(file_path=file_path) as infile:
+        text = infile.read()
+    return parse_dektak_text(
+        text=text,
+        skip_header=skip_header,
+        allocate=allocate)
+
+
+def parse_dektak_text(text : str,
+                      skip_header : int = None,
+                      allocate : object = None) -> list:
+    """
+    Parse the text of a Bruker Dektak csv file.
+
+    Parameters
+    ----------
+    text: string
+        Whole file contents.
+    skip_header: int
+        Number of lines before the data. Found from the 'Lateral' column
+        header if not given.
+    allocate: function
+        Optional allocate(rows) returning writeable lateral and profile
+        arrays to parse into, see parse_columns.
+
+    Returns
+    -------
+    lateral, profile: list
+        Lateral (mm) and profile (nm) data arrays.
+
+    See Also
+    --------
+    read_dektak_file
+    parse_columns
+
+    Notes
+    -----
+    Reading and parsing are separate so that they can run as separate
+    stages, see src/pipeline.py.
+
+    Example
+    -------
+    None
+
+    """
+    lines = text.splitlines()
+    if skip_header is None:
         for index, line in enumerate(lines):
             if 'Lateral' in line:
-                lateral, profile = np.genfromtxt(
-                    fname=file_path,
-                    delimiter=',',
-                    skip_header=index + 1,
-                    usecols=(0, 1),
-                    unpack=True)
-                lateral /= 1000  # convert to mm
-                profile /= 10  # convert to nm
+                skip_header = index + 1
+                break
+    lateral, profile = parse_columns(
+        lines=lines[skip_header:],
+        delimiter=',',
+        allocate=allocate)
+    lateral /= 1000  # convert to mm
+    profile /= 10  # convert to nm
     return lateral, profile
 
 
-def read_afm_file(file_path : str) -> list:
+header_formats = (
+    '%m/%d/%y %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%y %I:%M:%S %p',
+    '%m/%d/%Y %I:%M:%S %p',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%d.%m.%Y %H:%M:%S',
+    '%m/%d/%y',
+    '%m/%d/%Y',
+    '%Y-%m-%d',
+    '%d.%m.%Y')
+
+
+def header_value(fields : list) -> list:
+    """
+    Value and unit of one Dektak header line, from the fields after its key.
+
+    Parameters
+    ----------
+    fields: list
+        Non-empty fields after the key, e.g. ["3.00", "mg"] or ["3.00 mg"].
+
+    Returns
+    -------
+    value, unit: list
+        Number if the first field is a number, optionally followed by a
+        unit, otherwise the fields joined as text, or None for no fields.
+        Unit text, or None.
+
+    See Also
+    --------
+    read_dektak_header
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    if not fields:
+        return None, None
+    match = re.match(
+        r'^([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+        r'(?:\s*([^\W\d_][^,]*|[%°µÅ][^,]*))?$',
+        fields[0])
+    if match is None:
+        return ', '.join(fields), None
+    unit = match.group(2) or (fields[1] if len(fields) > 1 else None)
+    return float(match.group(1)), unit or None
+
+
+def header_timestamp(header : dict) -> str:
+    """
+    Get the scan date and time from a Dektak header as an ISO 8601 string.
+
+    Parameters
+    ----------
+    header: dictionary
+        Header values keyed by name, as parsed by read_dektak_header.
+
+    Returns
+    -------
+    timestamp: string
+        ISO 8601 date and time, e.g. '2023-08-14T09:30:00', or None if no
+        header date can be parsed.
+
+    See Also
+    --------
+    read_dektak_header
+    header_formats
+
+    Notes
+    -----
+    Every key containing 'date' is tried, first joined with the 'Time'
+    value if there is one and then on its own, against each of
+    header_formats in turn, as the date format depends on the locale of the
+    instrument computer. A date without a time is taken as midnight.
+
+    Example
+    -------
+    >>> header_timestamp(header={"Date": "08/14/23", "Time": "09:30:00"})
+    '2023-08-14T09:30:00'
+
+    """
+    dates = [
+        str(value) for key, value in header.items()
+        if 'date' in key.lower() and value is not None]
+    times = [
+        str(value) for key, value in header.items()
+        if key.lower() == 'time' and value is not None]
+    for date in dates:
+        for text in ([f'{date} {times[0]}', date] if times else [date]):
+            for date_format in header_formats:
+                try:
+                    return datetime.strptime(
+                        text.strip(),
+                        date_format).isoformat()
+                except ValueError:
+                    continue
+    return None
+
+
+def read_dektak_header(file_path : str,
+                       max_bytes : int = 65536) -> dict:
+    """
+    Read the metadata header of a Dektak file without reading its data.
+
+    Parameters
+    ----------
+    file_path: string
+        Path to file, which may be compressed or inside a zip archive.
+    max_bytes: int
+        Most header text to read before giving up on finding the 'Lateral'
+        column header.
+
+    Returns
+    -------
+    record: dictionary
+        {
+            "Header": {key: value} of every header line, numbers as floats,\n
+            "Units": {key: unit} for values with a unit,\n
+            "Timestamp": ISO 8601 scan date and time, or None,\n
+            "Columns": data column names,\n
+            "Skip Header": number of lines before the data
+        }
+        or None if the 'Lateral' line is not found, i.e. not a Dektak file.
+
+    See Also
+    --------
+    read_dektak_file
+    header_value
+    header_timestamp
+
+    Notes
+    -----
+    The file is read a line at a time and closed at the 'Lateral' line, so
+    only the header is read, or decompressed, however long the profile.
+    Each header line is split on commas into a key, e.g. 'Stylus Force',
+    and its value and unit. Dates are read month first, as the Dektak
+    software writes them.
+
+    Example
+    -------
+    >>> read_dektak_header(file_path='Sample_AL1_230801.csv')["Header"]
+    {'Recipe': 'Step.ds', 'Stylus Force': 3.0, 'Scan Length': 2000.0, ...}
+
+    """
+    header = {}
+    units = {}
+    read = 0
+    with open_text(file_path=file_path, errors='replace') as infile:
+        for index, line in enumerate(infile):
+            read += len(line)
+            if 'Lateral' in line:
+                return {
+                    "Header": header,
+                    "Units": units,
+                    "Timestamp": header_timestamp(header=header),
+                    "Columns": [
+                        column.strip() for column in line.split(',')
+                        if column.strip()],
+                    "Skip Header": index + 1}
+            if read > max_bytes:
+                return None
+            fields = [field.strip() for field in line.split(',')]
+            if not fields[0]:
+                continue
+            value, unit = header_value(fields=[
+                field for field in fields[1:] if field])
+            header[fields[0]] = value
+            if unit is not None:
+                units[fields[0]] = unit
+    return None
+
+
+def read_afm_file(file_path : str,
+                  delimiter : str = None) -> list:
     """
     Loads Bruker AFM csv file.
 
@@ -98,6 +760,8 @@ def read_afm_file(file_path : str) -> list:
     ----------
     file_path: string
         Path to file.
+    delimiter: string
+        Column delimiter, if already known from sniff_afm.
     
     Returns
     -------
@@ -106,35 +770,33 @@ def read_afm_file(file_path : str) -> list:
     
     See Also
     --------
-    numpy genfromtxt
+    parse_columns
     read_dektak_file
 
     Notes
     -----
     Can distinguish between delimiters depending on the AFM save parameters.
+    The delimiter is found from the first data line, so the file is read and
+    parsed once. The file may be compressed or inside a zip archive.
 
     Example
     -------
     None
 
     """
-    try:
-        lateral, profile = np.genfromtxt(
-            fname=file_path,
-            delimiter=',',
-            skip_header=1,
-            unpack=True)
-    except:
-        lateral, profile = np.genfromtxt(
-            fname=file_path,
-            delimiter='\t',
-            skip_header=1,
-            unpack=True)
+    with open_text(file_path=file_path) as infile:
+        lines = infile.read().splitlines()
+    if delimiter is None:
+        delimiter = (sniff_afm(head='\n'.join(lines[:2])) or {}).get(
+            "delimiter", ',')
+    lateral, profile = parse_columns(
+        lines=lines[1:],
+        delimiter=delimiter)
     return lateral, profile
 
 
-def read_thickness_file(file_type : str,
-                        file_path : str) -> list:
+def read_thickness_file(file_path : str,
+                        file_type : str = None) -> list:
     """
     Reads either Dektak or AFM file.
     
@@ -142,8 +804,9 @@ def read_thickness_file(file_type : str,
 
     Parameters
     ----------
-    file_type, file_path: string
-        "AFM" or "Dektak", path to file.
+    file_path, file_type: string
+        Path to file, "AFM", "Dektak" or another registered format. If
+        file_type is None it is sniffed from the start of the file.
     
     Returns
     -------
@@ -152,36 +815,41 @@ def read_thickness_file(file_type : str,
     
     See Also
     --------
+    register_reader
+    sniff_file
     read_afm_file
     read_dektak_file
 
     Notes
     -----
-    Uses the file_type key to access different loading functions for the Bruker
-    AFM and Dektak surface profilometers.
+    If file_type is None, the format sniffer reads only the first few
+    kilobytes of the file, and passes what it finds, such as the delimiter
+    or header length, to the format's reader. A given file_type goes
+    straight to its reader, which finds those itself, so the file is only
+    opened once. Unregistered file types return empty lists.
 
     Example
     -------
     None
 
     """
-    if file_type == 'AFM':
-        lateral, profile = read_afm_file(
-            file_path=file_path)
-    elif file_type == 'Dektak':
-        lateral, profile = read_dektak_file(
-            file_path=file_path)
+    if file_type is None:
+        file_type, options = sniff_file(file_path=file_path)
+    elif file_type in thickness_readers:
+        options = {}
     else:
-        lateral = []
-        profile = []
-    return lateral, profile
+        return [], []
+    return thickness_readers[file_type]["reader"](
+        file_path=file_path,
+        **options)
 
 
 def convert(o):
     """
     Check data type.
 
-    Check type of data string.
+    Check type of data string. Numpy scalars and arrays are converted to their
+    python equivalents.
 
     Parameters
     ----------
@@ -209,6 +877,8 @@ def convert(o):
     """
     if isinstance(o, np.generic):
         return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
     raise TypeError
 
 
@@ -253,3 +923,13 @@ def save_json_dicts(out_path : str,
             indent=2,
             default=convert)
         outfile.write('\n')
+
+
+register_reader(
+    file_type="Dektak",
+    reader=read_dektak_file,
+    sniffer=sniff_dektak)
+register_reader(
+    file_type="AFM",
+    reader=read_afm_file,
+    sniffer=sniff_afm)
@@ -1,11 +1,16 @@
 import os
 
 
+compressed_suffixes = ('.gz', '.bz2', '.xz')
+
+
 def get_filename(file_path):
     """
     Get the file name of a file without the directory path or file extension.
 
-    Split file path and remove directory path and file extensions.
+    Split file path and remove directory path and file extensions. A
+    compression extension, such as .gz, is removed along with the file
+    extension underneath it.
 
     Parameters
     ----------
@@ -33,4 +38,40 @@ def get_filename(file_path):
     "File1"
 
     """
-    return os.path.splitext(os.path.basename(file_path))[0]
+    file_name, extension = os.path.splitext(os.path.basename(file_path))
+    if extension.lower() in compressed_suffixes:
+        file_name = os.path.splitext(file_name)[0]
+    return file_name
+
+
+def output_directory(data_path : str) -> str:
+    """
+    Get the directory to save results for a data path.
+
+    Parameters
+    ----------
+    data_path: string
+        Data directory, or zip archive of data files.
+
+    Returns
+    -------
+    out_path: string
+        data_path, or the directory containing it if it is an archive.
+
+    See Also
+    --------
+    get_filename
+
+    Notes
+    -----
+    Results are never written inside an archive.
+
+    Example
+    -------
+    >>> output_directory(data_path="/Path/To/Dektak/2023.zip")
+    "/Path/To/Dektak"
+
+    """
+    if os.path.isfile(data_path):
+        return os.path.dirname(data_path)
+    return data_path
@@ -0,0 +1,594 @@
+import numpy as np
+
+
+def grating_threshold(y : list,
+                      hysteresis : float = 0.1) -> list:
+    """
+    Calculate upper and lower switching thresholds for a grating profile.
+
+    Parameters
+    ----------
+    y: list
+        Profile (y) data array.
+    hysteresis: float
+        Fraction of the peak-to-peak profile range used as the dead band
+        around the mid-level threshold.
+
+    Returns
+    -------
+    lower, upper: float
+        Lower and upper switching thresholds.
+
+    See Also
+    --------
+    grating_states
+
+    Notes
+    -----
+    The grating top and bottom levels are taken as the 95th and 5th percentile
+    of the profile so that single spikes do not move the threshold.
+
+    Example
+    -------
+    None
+
+    """
+    bottom, top = np.percentile(y, [5, 95])
+    middle = 0.5 * (top + bottom)
+    band = 0.5 * hysteresis * (top - bottom)
+    return middle - band, middle + band
+
+
+def grating_states(y : list,
+                   hysteresis : float = 0.1) -> list:
+    """
+    Classify each profile point as grating top (True) or bottom (False).
+
+    Parameters
+    ----------
+    y: list
+        Profile (y) data array.
+    hysteresis: float
+        Fraction of the peak-to-peak profile range used as the dead band
+        around the mid-level threshold.
+
+    Returns
+    -------
+    states: list
+        Boolean array, True where the profile is on a grating tooth.
+
+    See Also
+    --------
+    grating_threshold
+
+    Notes
+    -----
+    Points inside the dead band inherit the state of the last point outside
+    it, so noise on a sidewall cannot create spurious edges. The hysteresis is
+    evaluated without a python loop by carrying forward the index of the last
+    point outside the band with a running maximum.
+
+    Example
+    -------
+    None
+
+    """
+    y = np.asarray(y, dtype=float)
+    lower, upper = grating_threshold(y=y, hysteresis=hysteresis)
+    above = y > upper
+    decided = above | (y < lower)
+    index = np.where(decided, np.arange(y.size), 0)
+    last_decided = np.maximum.accumulate(index)
+    states = above[last_decided]
+    first = np.argmax(decided)
+    states[:first] = above[first]
+    return states
+
+
+def grating_edges(states : list) -> list:
+    """
+    Find rising and falling edges in a grating state array.
+
+    Parameters
+    ----------
+    states: list
+        Boolean grating state array from grating_states.
+
+    Returns
+    -------
+    rising, falling: list
+        Indices of the first point after each rising and falling edge.
+
+    See Also
+    --------
+    grating_states
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    change = np.diff(states.astype(np.int8))
+    rising = np.flatnonzero(change == 1) + 1
+    falling = np.flatnonzero(change == -1) + 1
+    return rising, falling
+
+
+def segment_statistics(y : list,
+                       starts : list,
+                       stops : list) -> list:
+    """
+    Mean, variance and point count of many slices of one array at once.
+
+    Parameters
+    ----------
+    y: list
+        Data array.
+    starts, stops: list
+        Start (inclusive) and stop (exclusive) index of each slice.
+
+    Returns
+    -------
+    means, variances, counts: list
+        Mean, population variance and number of points for each slice.
+
+    See Also
+    --------
+    numpy cumsum
+
+    Notes
+    -----
+    Uses cumulative sums of y and y squared, so every slice costs two lookups
+    regardless of its length. The data are centred before summing to avoid
+    cancellation when the profile sits on a large offset.
+
+    Example
+    -------
+    None
+
+    """
+    y = np.asarray(y, dtype=float)
+    centred = y - np.mean(y)
+    first = np.concatenate(([0.0], np.cumsum(centred)))
+    second = np.concatenate(([0.0], np.cumsum(centred ** 2)))
+    counts = stops - starts
+    means = (first[stops] - first[starts]) / counts
+    variances = (second[stops] - second[starts]) / counts - means ** 2
+    return means + np.mean(y), np.clip(variances, 0, None), counts
+
+
+def plateau_bounds(starts : list,
+                   stops : list,
+                   plateau_fraction : float = 0.5) -> list:
+    """
+    Shrink segments to their central plateau.
+
+    Parameters
+    ----------
+    starts, stops: list
+        Start and stop indices of each segment.
+    plateau_fraction: float
+        Fraction of each segment kept, centred on the segment middle.
+
+    Returns
+    -------
+    starts, stops: list
+        Start and stop indices of each plateau, at least two points long.
+
+    See Also
+    --------
+    None
+
+    Notes
+    -----
+    Trimming the segment ends removes the sidewalls and tip convolution
+    around each edge from the plateau average.
+
+    Example
+    -------
+    None
+
+    """
+    trim = np.floor(0.5 * (1 - plateau_fraction) * (stops - starts))
+    trim = trim.astype(int)
+    new_starts = starts + trim
+    new_stops = np.maximum(stops - trim, new_starts + 2)
+    return new_starts, np.minimum(new_stops, stops)
+
+
+def period_step_heights(y : list,
+                        plateau_fraction : float = 0.5,
+                        hysteresis : float = 0.1,
+                        min_contrast : float = 8) -> dict:
+    """
+    Calculate the step height of every complete grating period.
+
+    Split the profile at each rising edge, find the top and bottom plateau of
+    each tooth and difference their mean values.
+
+    Parameters
+    ----------
+    y: list
+        Profile (y) data array.
+    plateau_fraction: float
+        Fraction of each top and bottom segment averaged as the plateau.
+    hysteresis: float
+        Fraction of the peak-to-peak range used as the threshold dead band.
+    min_contrast: float
+        Smallest median step height, in units of the profile noise, that is
+        taken as a grating.
+
+    Returns
+    -------
+    periods: dictionary
+        {
+            "Period Indices": [start, fall, stop] for each period,
+            "Step Heights": step height of each period,
+            "Step Height Errors": standard error of each step height
+        }
+        All empty if no complete period is found.
+
+    See Also
+    --------
+    grating_states
+    grating_edges
+    segment_statistics
+    plateau_bounds
+    noise_levels
+
+    Notes
+    -----
+    A period runs from one rising edge to the next, so partial periods at the
+    ends of the scan are discarded. All periods are evaluated together from
+    cumulative sums. The dead band scales with the profile range, so pure
+    noise is still split into "periods"; their step heights are then close to
+    the point to point noise, and are discarded unless their median is at
+    least min_contrast noise standard deviations.
+
+    Example
+    -------
+    None
+
+    """
+    none = {
+        "Period Indices": np.empty((0, 3), dtype=int),
+        "Step Heights": np.empty(0),
+        "Step Height Errors": np.empty(0)}
+    states = grating_states(y=y, hysteresis=hysteresis)
+    rising, falling = grating_edges(states=states)
+    if rising.size < 2:
+        return none
+    falling = falling[falling > rising[0]][: rising.size - 1]
+    starts = rising[:-1]
+    stops = rising[1:]
+    top_starts, top_stops = plateau_bounds(
+        starts=starts,
+        stops=falling,
+        plateau_fraction=plateau_fraction)
+    bottom_starts, bottom_stops = plateau_bounds(
+        starts=falling,
+        stops=stops,
+        plateau_fraction=plateau_fraction)
+    means, variances, counts = segment_statistics(
+        y=y,
+        starts=np.concatenate((top_starts, bottom_starts)),
+        stops=np.concatenate((top_stops, bottom_stops)))
+    errors = np.sqrt(variances / np.maximum(counts - 1, 1))
+    top_means, bottom_means = np.split(means, 2)
+    top_errors, bottom_errors = np.split(errors, 2)
+    sigma = noise_levels(profiles=np.asarray(y, dtype=float)[None, :])[0]
+    if np.median(top_means - bottom_means) < min_contrast * sigma:
+        return none
+    return {
+        "Period Indices": np.stack((starts, falling, stops), axis=1),
+        "Step Heights": top_means - bottom_means,
+        "Step Height Errors": np.sqrt(top_errors ** 2 + bottom_errors ** 2)}
+
+
+def step_height_distribution(step_heights : list,
+                             outlier_threshold : float = 3.5) -> dict:
+    """
+    Summarise per-period step heights and flag outlier periods.
+
+    Parameters
+    ----------
+    step_heights: list
+        Step height of each grating period.
+    outlier_threshold: float
+        Modified z-score above which a period is an outlier.
+
+    Returns
+    -------
+    distribution: dictionary
+        {
+            "Mean Step Height": mean of non-outlier periods,
+            "Step Height Spread": standard deviation of non-outlier periods,
+            "Step Height Error": standard error on the mean,
+            "Outlier Periods": indices of outlier periods
+        }
+
+    See Also
+    --------
+    period_step_heights
+
+    Notes
+    -----
+    Outliers use the modified z-score 0.6745 * (h - median) / MAD, which is
+    not pulled by the outliers themselves the way a standard deviation is.
+
+    Example
+    -------
+    None
+
+    """
+    step_heights = np.asarray(step_heights, dtype=float)
+    median = np.median(step_heights)
+    deviation = np.abs(step_heights - median)
+    mad = np.median(deviation)
+    if mad > 0:
+        outliers = 0.6745 * deviation / mad > outlier_threshold
+    else:
+        outliers = np.zeros_like(step_heights, dtype=bool)
+    inliers = step_heights[~outliers]
+    spread = np.std(inliers, ddof=1) if inliers.size > 1 else 0.0
+    return {
+        "Mean Step Height": np.mean(inliers),
+        "Step Height Spread": spread,
+        "Step Height Error": spread / np.sqrt(inliers.size),
+        "Outlier Periods": np.flatnonzero(outliers)}
+
+
+def pad_profiles(arrays : list) -> list:
+    """
+    Stack arrays of different lengths into one NaN padded 2D array.
+
+    Parameters
+    ----------
+    arrays: list
+        List of 1D data arrays.
+
+    Returns
+    -------
+    padded: list
+        2D array, one row per input array, padded at the end with NaN.
+    lengths: list
+        Number of valid points in each row.
+
+    See Also
+    --------
+    None
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    lengths = np.array([len(array) for array in arrays])
+    padded = np.full((len(arrays), lengths.max()), np.nan)
+    valid = np.arange(lengths.max()) < lengths[:, None]
+    padded[valid] = np.concatenate([
+        np.asarray(array, dtype=float) for array in arrays])
+    return padded, lengths
+
+
+def noise_levels(profiles : list) -> list:
+    """
+    Estimate the point to point noise of many padded profiles.
+
+    Parameters
+    ----------
+    profiles: list
+        2D NaN padded y-data array, one profile per row.
+
+    Returns
+    -------
+    sigma: list
+        Standard deviation of the noise on each profile.
+
+    See Also
+    --------
+    pad_profiles
+
+    Notes
+    -----
+    Uses the median absolute deviation of the first differences, scaled to a
+    Gaussian standard deviation and divided by root two for the differencing.
+    Steps and slow tilt only affect a handful of differences, so they do not
+    inflate the estimate the way a plain standard deviation would.
+
+    Example
+    -------
+    None
+
+    """
+    differences = np.diff(profiles, axis=1)
+    median = np.nanmedian(differences, axis=1)
+    mad = np.nanmedian(np.abs(differences - median[:, None]), axis=1)
+    return 1.4826 * mad / np.sqrt(2)
+
+
+def spectral_periods(lateral_arrays : list,
+                     profile_arrays : list) -> list:
+    """
+    Estimate the dominant period of many grating profiles with one FFT.
+
+    Parameters
+    ----------
+    lateral_arrays, profile_arrays: list
+        Lists of x- and y-data arrays, one pair per profile. Profiles may have
+        different lengths and sample spacings.
+
+    Returns
+    -------
+    periods: list
+        Dominant period of each profile in lateral units.
+
+    See Also
+    --------
+    pad_profiles
+    numpy fft rfft
+
+    Notes
+    -----
+    Each profile has its mean removed and a Hann window of its own length
+    applied before all rows are zero padded to a common power of two length
+    and transformed together. The DC leakage of the window is masked and the
+    spectral peak is refined below the bin spacing with a Gaussian (log
+    parabolic) interpolation, which is exact for a Gaussian peak and close
+    for the Hann main lobe. Assumes uniform lateral sampling within a
+    profile.
+
+    Example
+    -------
+    None
+
+    """
+    lateral, lengths = pad_profiles(arrays=lateral_arrays)
+    profile, _ = pad_profiles(arrays=profile_arrays)
+    rows = np.arange(lengths.size)
+    spacing = (lateral[rows, lengths - 1] - lateral[:, 0]) / (lengths - 1)
+    index = np.arange(profile.shape[1])
+    window = 0.5 - 0.5 * np.cos(
+        2 * np.pi * index / (lengths[:, None] - 1))
+    centred = profile - np.nanmean(profile, axis=1)[:, None]
+    windowed = np.where(index < lengths[:, None], centred * window, 0)
+    n_fft = 2 ** int(np.ceil(np.log2(2 * profile.shape[1])))
+    spectrum = np.abs(np.fft.rfft(windowed, n=n_fft, axis=1))
+    leakage = 2 * n_fft / lengths
+    bins = np.arange(spectrum.shape[1])
+    spectrum[bins <= leakage[:, None]] = 0
+    peak = np.clip(np.argmax(spectrum, axis=1), 1, spectrum.shape[1] - 2)
+    log_spectrum = np.log(spectrum[rows[:, None], peak[:, None] + [-1, 0, 1]]
+                          + np.finfo(float).tiny)
+    left, centre, right = log_spectrum.T
+    curvature = left - 2 * centre + right
+    offset = np.divide(
+        0.5 * (left - right),
+        curvature,
+        out=np.zeros_like(curvature),
+        where=curvature < 0)
+    frequency = (peak + offset) / (n_fft * spacing)
+    return 1 / frequency
+
+
+def duty_cycles(profile_arrays : list) -> list:
+    """
+    Fraction of each grating period occupied by the tooth, for many profiles.
+
+    Parameters
+    ----------
+    profile_arrays: list
+        List of levelled y-data arrays, one per profile.
+
+    Returns
+    -------
+    duty_cycles: list
+        Duty cycle (fill factor) of each profile, between 0 and 1.
+
+    See Also
+    --------
+    pad_profiles
+
+    Notes
+    -----
+    Each profile is thresholded at the midpoint of its 5th and 95th
+    percentiles. Only points between the first and last rising edge are
+    counted, so the result covers whole periods and partial periods at the
+    scan ends cannot bias it.
+
+    Example
+    -------
+    None
+
+    """
+    profile, lengths = pad_profiles(arrays=profile_arrays)
+    bottom, top = np.nanpercentile(profile, [5, 95], axis=1)
+    states = profile > (0.5 * (top + bottom))[:, None]
+    rising = states[:, 1:] & ~states[:, :-1]
+    width = rising.shape[1]
+    first = np.argmax(rising, axis=1) + 1
+    last = width - np.argmax(rising[:, ::-1], axis=1)
+    index = np.arange(profile.shape[1])
+    whole = (index >= first[:, None]) & (index < last[:, None])
+    counts = np.sum(whole, axis=1)
+    fills = np.sum(states & whole, axis=1)
+    return np.divide(
+        fills,
+        counts,
+        out=np.full(counts.shape, np.nan),
+        where=counts > 0)
+
+
+def level_gratings(lateral_arrays : list,
+                   profile_arrays : list,
+                   hysteresis : float = 0.1,
+                   iterations : int = 3) -> list:
+    """
+    Remove the tilt of grating profiles.
+
+    Parameters
+    ----------
+    lateral_arrays, profile_arrays: list
+        Lists of x- and y-data arrays, one pair per profile.
+    hysteresis: float
+        Dead band fraction used to classify tooth and trench points, see
+        grating_states.
+    iterations: int
+        Number of classify and refit passes.
+
+    Returns
+    -------
+    levelled: list
+        Profile arrays with their fitted line removed.
+
+    See Also
+    --------
+    grating_states
+    duty_cycles
+
+    Notes
+    -----
+    A straight line fitted to a whole grating is pulled by the teeth, so
+    each profile is fitted with a line plus a tooth height times the
+    grating state of every point, as one linear least squares problem. The
+    states are found again on the levelled profile and the fit repeated,
+    as a tilt of more than the tooth height hides the teeth from the first
+    classification. Thresholding for duty cycles is only meaningful on
+    levelled profiles.
+
+    Example
+    -------
+    None
+
+    """
+    levelled = []
+    for lateral, profile in zip(lateral_arrays, profile_arrays):
+        lateral = np.asarray(lateral, dtype=float)
+        profile = np.asarray(profile, dtype=float)
+        if lateral.size < 3:
+            levelled.append(profile)
+            continue
+        centred = lateral - np.mean(lateral)
+        slope, intercept = np.polyfit(centred, profile, deg=1)
+        flat = profile - (slope * centred + intercept)
+        for _ in range(iterations):
+            states = grating_states(y=flat, hysteresis=hysteresis)
+            design = np.column_stack([
+                centred,
+                np.ones_like(centred),
+                states.astype(float)])
+            (slope, intercept, _), *_ = np.linalg.lstsq(
+                design,
+                profile,
+                rcond=None)
+            flat = profile - (slope * centred + intercept)
+        levelled.append(flat)
+    return levelled
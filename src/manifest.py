@@ -0,0 +1,744 @@
+import os
+import glob
+import zipfile
+import matplotlib
+import numpy as np
+
+from pathlib import Path
+from contextlib import closing
+from concurrent.futures import (
+    ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED)
+
+from src.filepaths import get_filename, output_directory
+from src.resultcache import configure_cache
+from src.sharedarrays import SharedArrayPool, attached
+from src.datalevelling import calculated_level_film_thickness
+from src.fileIO import (
+    load_json, read_thickness_file, read_dektak_file, save_json_dicts,
+    archive_members)
+from src.analysis import (
+    average_step_and_error, calculate_profile_widths,
+    calculate_profile_edge_widths)
+
+
+process_suffixes = {
+    "height": ("Height", "Thickness"),
+    "width": ("Width", "Width")}
+
+
+def load_batches(manifest : dict) -> list:
+    """
+    Collect every batch dictionary named in a manifest.
+
+    Parameters
+    ----------
+    manifest: dictionary
+        Manifest dictionary containing any of:
+            {
+                "batches": list of batch dictionaries or paths to them,\n
+                "dictionaries": list of glob patterns of batch dictionaries,\n
+                "defaults": settings shared by every batch,\n
+                "workers": number of worker processes,\n
+                "cache_path": result cache directory,\n
+                "cache_size": result cache size in MB
+            }
+
+    Returns
+    -------
+    batches: list
+        Batch dictionaries, each with the defaults filled in.
+
+    See Also
+    --------
+    load_json
+
+    Notes
+    -----
+    Batch dictionaries have the same layout as dektak_dictionary.json, but
+    "process" may also be a list, e.g. ["height", "width"], to run several
+    jobs on the same files. Keys in a batch dictionary override the defaults.
+    "data_path" may be a zip archive, in which case an empty "data_files"
+    list selects every csv and txt file in the archive.
+
+    Example
+    -------
+    None
+
+    """
+    defaults = manifest.get("defaults", {})
+    entries = list(manifest.get("batches", []))
+    for pattern in manifest.get("dictionaries", []):
+        entries.extend(sorted(glob.glob(pattern, recursive=True)))
+    batches = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            entry = load_json(file_path=entry)
+        batch = dict(defaults, **entry)
+        if not batch.get("data_files") and zipfile.is_zipfile(
+                batch["data_path"]):
+            batch["data_files"] = archive_members(
+                archive_path=batch["data_path"])
+        batches.append(batch)
+    return batches
+
+
+def batch_processes(batch_dictionary : dict) -> list:
+    """
+    List the processes requested by a batch dictionary.
+
+    Parameters
+    ----------
+    batch_dictionary: dictionary
+        Batch dictionary with a "process" string or list of strings.
+
+    Returns
+    -------
+    processes: list
+        Process strings, "height" and/or "width".
+
+    See Also
+    --------
+    None
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    processes = batch_dictionary["process"]
+    if isinstance(processes, str):
+        processes = [processes]
+    return processes
+
+
+def schedule_file_jobs(batches : list) -> dict:
+    """
+    Group the jobs of every batch by the input file they read.
+
+    Parameters
+    ----------
+    batches: list
+        Batch dictionaries from load_batches.
+
+    Returns
+    -------
+    file_jobs: dictionary
+        {resolved file path: list of job dictionaries}, where each job is
+            {
+                "batch": batch index,\n
+                "process": "height" or "width",\n
+                "file_name": file name string,\n
+                "out_path": figure path,\n
+                "settings": batch dictionary
+            }
+
+    See Also
+    --------
+    load_batches
+    run_file_jobs
+
+    Notes
+    -----
+    Files shared between batches or processes appear once, so they are read
+    once.
+
+    Example
+    -------
+    None
+
+    """
+    file_jobs = {}
+    for index, batch in enumerate(batches):
+        data_path = batch["data_path"]
+        out_path = output_directory(data_path=data_path)
+        for process in batch_processes(batch_dictionary=batch):
+            suffix = process_suffixes[process][0]
+            for file in batch["data_files"]:
+                file_path = Path(f'{data_path}/{file}')
+                file_name = get_filename(file_path=file_path)
+                file_jobs.setdefault(str(file_path.resolve()), []).append({
+                    "batch": index,
+                    "process": process,
+                    "file_name": file_name,
+                    "out_path": Path(f'{out_path}/{file_name}_{suffix}.png'),
+                    "settings": batch})
+    return file_jobs
+
+
+def run_job(lateral : list,
+            profile : list,
+            job : dict,
+            interactive : bool = False) -> dict:
+    """
+    Run one height or width job on a profile that has already been read.
+
+    Parameters
+    ----------
+    lateral, profile: list
+        x- and y-data arrays.
+    job: dictionary
+        Job dictionary from schedule_file_jobs.
+    interactive: bool
+        If True, jobs that need regions of interest ask the user for them.
+
+    Returns
+    -------
+    results: dictionary
+        Results dictionary for the file, or None if the job needs user input
+        and interactive is False.
+
+    See Also
+    --------
+    calculated_level_film_thickness
+    calculate_profile_widths
+    calculate_profile_edge_widths
+
+    Notes
+    -----
+    Height jobs use the "regions" batch dictionary entry for the file, given
+    as {file name: [[base start, base end], [step start, step end]]}, when
+    it exists. Width jobs need no input when "width_method" is "edges".
+
+    Example
+    -------
+    None
+
+    """
+    settings = job["settings"]
+    file_name = job["file_name"]
+    if job["process"] == "height":
+        regions = settings.get("regions", {}).get(file_name)
+        if regions is None and not interactive:
+            return None
+        range_left, range_right = regions if regions else (None, None)
+        return calculated_level_film_thickness(
+            x_array=lateral,
+            y_array=profile,
+            file_name=file_name,
+            plot_dict=settings,
+            out_path=job["out_path"],
+            range_left=range_left,
+            range_right=range_right)
+    if settings.get("width_method", "manual") == "edges":
+        return calculate_profile_edge_widths(
+            x_arrays=[lateral],
+            y_arrays=[profile],
+            file_names=[file_name],
+            out_paths=[job["out_path"]],
+            plot_dict=settings,
+            height_fraction=settings.get("edge_fraction", 0.5))
+    if not interactive:
+        return None
+    return calculate_profile_widths(
+        lateral=lateral,
+        profile=profile,
+        file_name=file_name,
+        out_path=job["out_path"],
+        plot_dict=settings)
+
+
+def run_profile_jobs(lateral : list,
+                     profile : list,
+                     jobs : list) -> dict:
+    """
+    Run every job on a profile that does not need user input.
+
+    Parameters
+    ----------
+    lateral, profile: list
+        x- and y-data arrays.
+    jobs: list
+        Job dictionaries for this file from schedule_file_jobs.
+
+    Returns
+    -------
+    outcome: dictionary
+        {
+            "completed": list of (job, results) pairs,\n
+            "pending": jobs that need user input
+        }
+
+    See Also
+    --------
+    run_job
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    completed = []
+    pending = []
+    for job in jobs:
+        results = run_job(
+            lateral=lateral,
+            profile=profile,
+            job=job)
+        if results is None:
+            pending.append(job)
+        else:
+            completed.append((job, results))
+    return {"completed": completed, "pending": pending}
+
+
+def run_file_jobs(file_path : str,
+                  jobs : list) -> dict:
+    """
+    Read one file and run every job that does not need user input.
+
+    Parameters
+    ----------
+    file_path: string
+        Path to file.
+    jobs: list
+        Job dictionaries for this file from schedule_file_jobs.
+
+    Returns
+    -------
+    outcome: dictionary
+        {
+            "completed": list of (job, results) pairs,\n
+            "pending": jobs that need user input,\n
+            "lateral", "profile": data arrays if any job is pending
+        }
+
+    See Also
+    --------
+    run_profile_jobs
+
+    Notes
+    -----
+    Runs in a worker process. Only the arrays of files with pending jobs are
+    sent back to the main process.
+
+    Example
+    -------
+    None
+
+    """
+    lateral, profile = read_thickness_file(
+        file_type="Dektak",
+        file_path=file_path)
+    outcome = run_profile_jobs(
+        lateral=lateral,
+        profile=profile,
+        jobs=jobs)
+    if outcome["pending"]:
+        outcome.update({"lateral": lateral, "profile": profile})
+    return outcome
+
+
+def run_shared_file_jobs(handles : list,
+                         jobs : list) -> dict:
+    """
+    Run every job that does not need user input on a profile in shared
+    memory.
+
+    Parameters
+    ----------
+    handles: list
+        Lateral and profile array handles from SharedArrayPool.
+    jobs: list
+        Job dictionaries for this file from schedule_file_jobs.
+
+    Returns
+    -------
+    outcome: dictionary
+        See run_profile_jobs.
+
+    See Also
+    --------
+    attached
+    run_profile_jobs
+
+    Notes
+    -----
+    Runs in a worker process, on views of the main process's copy of the
+    profile, so no arrays are sent either way.
+
+    Example
+    -------
+    None
+
+    """
+    with attached(handles=handles) as (lateral, profile):
+        return run_profile_jobs(
+            lateral=lateral,
+            profile=profile,
+            jobs=jobs)
+
+
+def failed_outcome(jobs : list,
+                   error : Exception) -> dict:
+    """
+    Outcome recording every job of a file as failed with error.
+
+    Parameters
+    ----------
+    jobs: list
+        Job dictionaries of one file, see schedule_file_jobs.
+    error: Exception
+        Error raised while reading the file or running its jobs.
+
+    Returns
+    -------
+    outcome: dictionary
+        {
+            "completed": (job, {file name Error: error message}) for each
+                job,
+            "pending": []
+        }
+
+    See Also
+    --------
+    file_outcomes
+    shared_file_outcomes
+    run_manifest
+
+    Notes
+    -----
+    The error is printed once, with the file name, and recorded against
+    every job, so each batch results file reports the failure without
+    stopping the rest of the manifest.
+
+    Example
+    -------
+    None
+
+    """
+    print(f'{jobs[0]["file_name"]}: {error}')
+    return {
+        "completed": [
+            (job, {f'{job["file_name"]} Error': str(error)})
+            for job in jobs],
+        "pending": []}
+
+
+def file_outcomes(executor : ProcessPoolExecutor,
+                  file_jobs : dict) -> tuple:
+    """
+    Read and process every file on the worker pool.
+
+    Parameters
+    ----------
+    executor: ProcessPoolExecutor
+        Worker pool.
+    file_jobs: dictionary
+        {file path: jobs} from schedule_file_jobs.
+
+    Yields
+    ------
+    jobs, outcome: tuple
+        Jobs of each file and their outcome from run_file_jobs, in order of
+        completion.
+
+    See Also
+    --------
+    run_file_jobs
+    shared_file_outcomes
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    futures = {
+        executor.submit(run_file_jobs, file_path, jobs): jobs
+        for file_path, jobs in file_jobs.items()}
+    for future in as_completed(futures):
+        try:
+            outcome = future.result()
+        except Exception as error:
+            outcome = failed_outcome(jobs=futures[future], error=error)
+        yield futures[future], outcome
+
+
+def shared_file_outcomes(executor : ProcessPoolExecutor,
+                         file_jobs : dict,
+                         max_in_flight : int) -> tuple:
+    """
+    Read every file into shared memory and process it on the worker pool.
+
+    Parameters
+    ----------
+    executor: ProcessPoolExecutor
+        Worker pool.
+    file_jobs: dictionary
+        {file path: jobs} from schedule_file_jobs.
+    max_in_flight: int
+        Maximum number of files held in shared memory at once.
+
+    Yields
+    ------
+    jobs, outcome: tuple
+        Jobs of each file and their outcome from run_shared_file_jobs, in
+        order of completion, with "lateral" and "profile" views if any job
+        is pending. The views are valid until the next file is requested.
+
+    See Also
+    --------
+    SharedArrayPool
+    run_shared_file_jobs
+    file_outcomes
+
+    Notes
+    -----
+    Files are parsed in the main process into shared memory views from
+    SharedArrayPool.allocate, sized from the number of data lines. The
+    views are filled a block of lines at a time, so no full private copy of
+    a profile is made, and workers are sent only the array handles. Parsing is serial in the main process, overlapped with
+    the workers fitting earlier files. Jobs that need user input use the
+    same memory, so no profile is ever pickled. Each file's segment is
+    removed once its jobs are done, and every segment is removed if the run
+    stops early or fails.
+
+    Example
+    -------
+    None
+
+    """
+    files = iter(file_jobs.items())
+    running = {}
+    with SharedArrayPool() as arrays:
+        while True:
+            for file_path, jobs in files:
+                allocated = []
+
+                def allocate(rows : int) -> list:
+                    handles, views = arrays.allocate(shapes=[(rows,), (rows,)])
+                    allocated.extend(handles)
+                    return views
+
+                try:
+                    read_dektak_file(
+                        file_path=file_path,
+                        allocate=allocate)
+                    handles = allocated
+                except Exception as error:
+                    if allocated:
+                        arrays.release(handle=allocated[0])
+                    yield jobs, failed_outcome(jobs=jobs, error=error)
+                    continue
+                future = executor.submit(run_shared_file_jobs, handles, jobs)
+                running[future] = (jobs, handles)
+                if len(running) >= max_in_flight:
+                    break
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                jobs, handles = running.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as error:
+                    outcome = failed_outcome(jobs=jobs, error=error)
+                if outcome["pending"]:
+                    outcome["lateral"], outcome["profile"] = arrays.views(
+                        handles=handles)
+                yield jobs, outcome
+                outcome.pop("lateral", None)
+                outcome.pop("profile", None)
+                arrays.release(handle=handles[0])
+
+
+def initialise_worker(cache_path : str,
+                      cache_size : float) -> None:
+    """
+    Prepare a worker process for non-interactive batch jobs.
+
+    Parameters
+    ----------
+    cache_path: string
+        Result cache disk tier directory, None or "" for memory only.
+    cache_size: float
+        Maximum size of the result cache disk tier in MB.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    run_manifest
+    configure_cache
+
+    Notes
+    -----
+    Selects the Agg backend, as workers only save figures, and points the
+    worker at the shared disk cache so reruns skip unchanged fits and
+    figures.
+
+    Example
+    -------
+    None
+
+    """
+    matplotlib.use('Agg')
+    configure_cache(
+        directory=cache_path,
+        max_megabytes=cache_size)
+
+
+def batch_results(batch_dictionary : dict,
+                  process : str,
+                  file_results : dict,
+                  file_names : list = None) -> dict:
+    """
+    Assemble the results dictionary of one batch and process.
+
+    Parameters
+    ----------
+    batch_dictionary: dictionary
+        Batch dictionary.
+    process: string
+        "height" or "width".
+    file_results: dictionary
+        {file name: results dictionary} for the files of the batch.
+    file_names: list
+        Names the results are keyed by, if not the file names of
+        batch_dictionary["data_files"], e.g. averaged scan groups.
+
+    Returns
+    -------
+    results_dictionary: dictionary
+        Batch dictionary, individual file results and the batch average.
+
+    See Also
+    --------
+    average_step_and_error
+
+    Notes
+    -----
+    Files that failed carry an "Error" entry and are left out of the
+    average, as are non-finite values.
+
+    Example
+    -------
+    None
+
+    """
+    key = process_suffixes[process][1]
+    results_dictionary = dict(batch_dictionary)
+    values = []
+    if file_names is None:
+        file_names = [
+            get_filename(file_path=file)
+            for file in batch_dictionary["data_files"]]
+    for file_name in file_names:
+        results = file_results.get(file_name, {})
+        results_dictionary.update(results)
+        value = results.get(f'{file_name} {key}')
+        if f'{file_name} Error' not in results and value is not None and (
+                np.isfinite(value)):
+            values.append(value)
+    if values:
+        results_dictionary.update(average_step_and_error(x=values))
+    return results_dictionary
+
+
+def run_manifest(manifest : dict) -> dict:
+    """
+    Run every job of every batch in a manifest on one shared worker pool.
+
+    Parameters
+    ----------
+    manifest: dictionary
+        Manifest dictionary, see load_batches.
+
+    Returns
+    -------
+    results: dictionary
+        {results file path: results dictionary} for every batch and process.
+
+    See Also
+    --------
+    load_batches
+    schedule_file_jobs
+    run_file_jobs
+    batch_results
+
+    Notes
+    -----
+    Each unique file is read once, in a worker, which also runs every job on
+    that file that needs no user input. Jobs that need regions of interest
+    are completed in the main process as their files arrive, while the
+    workers carry on with the rest of the manifest. A file that fails, or a
+    region selection that fails or is cancelled, is reported and recorded as
+    "{file name} Error" for that job instead of stopping the run. One results file, {batch_name}_Height.json or
+    {batch_name}_Width.json, is written per batch and process, next to the
+    data, or next to the archive if the data is in a zip archive. With
+    "shared_memory" set to "True" in the manifest, files are read in the
+    main process into shared memory instead and workers attach to them, see
+    shared_file_outcomes.
+
+    Example
+    -------
+    None
+
+    """
+    batches = load_batches(manifest=manifest)
+    file_jobs = schedule_file_jobs(batches=batches)
+    cache_path = manifest.get("cache_path")
+    cache_size = manifest.get("cache_size", 256)
+    configure_cache(
+        directory=cache_path,
+        max_megabytes=cache_size)
+    collected = {}
+    with ProcessPoolExecutor(
+            max_workers=manifest.get("workers"),
+            initializer=initialise_worker,
+            initargs=(cache_path, cache_size)) as pool:
+        if manifest.get("shared_memory", "False") == "True":
+            outcomes = shared_file_outcomes(
+                executor=pool,
+                file_jobs=file_jobs,
+                max_in_flight=2 * (
+                    manifest.get("workers") or os.cpu_count()))
+        else:
+            outcomes = file_outcomes(
+                executor=pool,
+                file_jobs=file_jobs)
+        with closing(outcomes):
+            for _, outcome in outcomes:
+                completed = outcome["completed"]
+                for job in outcome["pending"]:
+                    try:
+                        completed.append((job, run_job(
+                            lateral=outcome["lateral"],
+                            profile=outcome["profile"],
+                            job=job,
+                            interactive=True)))
+                    except Exception as error:
+                        completed.extend(failed_outcome(
+                            jobs=[job],
+                            error=error)["completed"])
+                for job, file_results in completed:
+                    batch_key = (job["batch"], job["process"])
+                    collected.setdefault(batch_key, {})
+                    collected[batch_key][job["file_name"]] = file_results
+    results = {}
+    for index, batch in enumerate(batches):
+        for process in batch_processes(batch_dictionary=batch):
+            out_path = Path(
+                f'{output_directory(data_path=batch["data_path"])}/'
+                f'{batch["batch_name"]}_{process_suffixes[process][0]}.json')
+            results[out_path] = batch_results(
+                batch_dictionary=batch,
+                process=process,
+                file_results=collected.get((index, process), {}))
+            save_json_dicts(
+                out_path=out_path,
+                dictionary=results[out_path])
+    return results
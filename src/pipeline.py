@@ -0,0 +1,242 @@
+import asyncio
+
+from dataclasses import dataclass
+
+from src.fileIO import open_text, parse_dektak_text
+from src.datalevelling import (
+    fit_step_height, plot_dektak_thicknesses, suggest_regions)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One stage of a staged pipeline.
+
+    Attributes
+    ----------
+    name: string
+        Stage name, used in error messages.
+    function: function
+        function(value) returning the value passed to the next stage. Must
+        be picklable, i.e. defined at module level, for a process pool.
+    concurrency: int
+        Number of values this stage works on at once.
+    executor: Executor
+        Thread or process pool the function runs on, or None to run it in
+        the event loop, which suits quick steps and coroutine functions.
+    combine: function
+        Optional combine(value, result) run in the event loop to build the
+        value passed on, so a process pool stage need only send back what
+        it adds rather than everything it was given.
+
+    """
+
+    name : str
+    function : object
+    concurrency : int = 1
+    executor : object = None
+    combine : object = None
+
+
+async def run_stage(stage : Stage,
+                    inbox : asyncio.Queue,
+                    outbox : asyncio.Queue,
+                    next_concurrency : int) -> None:
+    """
+    Run a stage's workers until its input is finished.
+
+    Parameters
+    ----------
+    stage: Stage
+        Stage to run.
+    inbox, outbox: asyncio.Queue
+        Queues of (index, value, error) entries from the previous stage and
+        to the next, ended by one None per worker.
+    next_concurrency: int
+        Number of workers reading outbox, each of which is sent a None once
+        every worker of this stage has finished.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    run_pipeline
+
+    Notes
+    -----
+    An entry that failed in an earlier stage is passed on untouched, and an
+    error in this stage is recorded in the entry, so one bad file does not
+    stop the others.
+
+    Example
+    -------
+    None
+
+    """
+    loop = asyncio.get_running_loop()
+
+    async def work() -> None:
+        while (entry := await inbox.get()) is not None:
+            index, value, error = entry
+            if error is None:
+                try:
+                    if stage.executor is not None:
+                        result = await loop.run_in_executor(
+                            stage.executor,
+                            stage.function,
+                            value)
+                    elif asyncio.iscoroutinefunction(stage.function):
+                        result = await stage.function(value)
+                    else:
+                        result = stage.function(value)
+                    if stage.combine is not None:
+                        result = stage.combine(value, result)
+                    value = result
+                except Exception as exception:
+                    value, error = None, f'{stage.name}: {exception}'
+            await outbox.put((index, value, error))
+
+    await asyncio.gather(*(work() for _ in range(stage.concurrency)))
+    for _ in range(next_concurrency):
+        await outbox.put(None)
+
+
+async def run_pipeline(items : list,
+                       stages : list,
+                       queue_size : int = 4) -> list:
+    """
+    Pass every item through a chain of stages that all run at once.
+
+    Parameters
+    ----------
+    items: list
+        Input values of the first stage.
+    stages: list
+        Stages in order.
+    queue_size: int
+        Maximum number of values waiting between two stages.
+
+    Returns
+    -------
+    outputs: list
+        (value, error) for each item, in item order, where value is the
+        last stage's output and error is None, or value is None and error
+        names the stage that failed and why.
+
+    See Also
+    --------
+    Stage
+    run_stage
+
+    Notes
+    -----
+    Stages are joined by bounded queues, so a stage that falls behind makes
+    the stages before it wait rather than pile up values: at most
+    queue_size values wait between each pair of stages and concurrency
+    values are in each stage, however many items there are. Each stage
+    works on concurrency values at once, so reading, fitting and rendering
+    can keep the disks, processors and renderer busy together.
+
+    Example
+    -------
+    >>> outputs = asyncio.run(run_pipeline(
+    ...     items=file_paths,
+    ...     stages=[
+    ...         Stage(name='read', function=read, executor=threads),
+    ...         Stage(name='fit', function=fit, executor=processes)]))
+
+    """
+    queues = [
+        asyncio.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    outputs = [(None, 'not processed')] * len(items)
+
+    async def feed() -> None:
+        for index, item in enumerate(items):
+            await queues[0].put((index, item, None))
+        for _ in range(stages[0].concurrency):
+            await queues[0].put(None)
+
+    async def collect() -> None:
+        while (entry := await queues[-1].get()) is not None:
+            index, value, error = entry
+            outputs[index] = (value, error)
+
+    await asyncio.gather(
+        feed(),
+        collect(),
+        *(
+            run_stage(
+                stage=stage,
+                inbox=queues[index],
+                outbox=queues[index + 1],
+                next_concurrency=(
+                    stages[index + 1].concurrency
+                    if index + 1 < len(stages) else 1))
+            for index, stage in enumerate(stages)))
+    return outputs
+
+
+def read_stage(value : dict) -> dict:
+    """
+    Read a Dektak file's text, the file I/O stage of a step height batch.
+    """
+    with open_text(file_path=value["file_path"]) as infile:
+        return dict(value, text=infile.read())
+
+
+def parse_stage(value : dict) -> dict:
+    """
+    Parse a Dektak file's text into its lateral and profile arrays.
+    """
+    lateral, profile = parse_dektak_text(text=value.pop("text"))
+    return dict(value, lateral=lateral, profile=profile)
+
+
+def fit_stage(value : dict) -> dict:
+    """
+    Level and fit the step height of a parsed profile.
+
+    Uses the value's "regions", or suggest_regions if it has none. Runs in a
+    worker process and returns only the fit results and regions.
+    """
+    regions = value.get("regions") or suggest_regions(
+        x=value["lateral"],
+        y=value["profile"])
+    if regions[0] is None:
+        raise ValueError('no regions given or found')
+    step_results = fit_step_height(
+        x_array=value["lateral"],
+        y_array=value["profile"],
+        range_left=regions[0],
+        range_right=regions[1],
+        file_name=value["file_name"],
+        plot_dict=value["plot_dict"])
+    return {"step_results": step_results, "regions": regions}
+
+
+def render_stage(value : dict,
+                 out_paths : dict) -> dict:
+    """
+    Render the levelled step height figure of a fitted profile to
+    out_paths[file name], a figure path or batch report page.
+    """
+    file_name = value["file_name"]
+    step_results = value["step_results"]
+    plot_dektak_thicknesses(
+        x_array=value["lateral"],
+        y_array=value["profile"],
+        baseline_parameters=step_results[f'{file_name} Polynomial'],
+        step_height=step_results[f'{file_name} Thickness'],
+        plot_dict=value["plot_dict"],
+        out_path=out_paths[file_name])
+    return {"file_name": file_name, "step_results": step_results}
+
+
+def merge_stage(value : dict,
+                result : dict) -> dict:
+    """
+    Add a stage's result entries to the value it was given.
+    """
+    return dict(value, **result)
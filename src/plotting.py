@@ -1,4 +1,13 @@
-import matplotlib.pyplot as plt
+import json
+import threading
+import numpy as np
+
+from pathlib import Path
+from matplotlib.figure import Figure
+from src.fileIO import convert
+from src.resultcache import get_cache, cache_key, plot_settings
+from src.thumbnail import (
+    thumbnail_profile, thumbnail_xy_roi, thumbnail_dektak_thicknesses)
 
 
 def cm_to_inches(cm: float) -> float:
@@ -38,59 +47,665 @@ def cm_to_inches(cm: float) -> float:
     return round(cm * 0.393701, 2)
 
 
-def plotafm(x, y, label,
-            xlabel, ylabel, title, out_path,
-            line=False):
-    fig, ax = plt.subplots(
-        1,
-        figsize=[round(7.5 * 0.393701, 2), round(9 * 0.393701, 2)],
-        dpi=600)
-    if line:
-        ax.plot(
-            x, y,
-            'b',
-            lw=2,
-            label=label)
-    else:
-        ax.plot(
-            x, y,
-            'bx',
-            markersize=4,
-            label=label)
-    ax.grid(True)
-    #ax.legend(
-    #    frameon=True,
-    #    loc=0,
-    #    prop={'size': 10})
+figure_templates = {}
+templates_lock = threading.Lock()
+template_fields = (
+    "width",
+    "height",
+    "dpi",
+    "grid",
+    "legend_loc",
+    "legend_col",
+    "legend_size",
+    "axis_fontsize",
+    "label_size")
+
+
+class FigureTemplate:
+    """
+    A figure built once and redrawn for every file of the same plot type.
+
+    Axes, lines, text and fonts are created once by a template builder.
+    Rendering a file only replaces line data, axis limits and text, then
+    saves. Layout is recalculated only when the tick label widths change.
+
+    Parameters
+    ----------
+    figure: matplotlib Figure
+        Figure built without pyplot, so it is never shown or managed by the
+        pyplot figure manager.
+    artists: dictionary
+        Named axes, lines and text artists updated on each render.
+
+    """
+
+    def __init__(self,
+                 figure : Figure,
+                 artists : dict):
+        self.figure = figure
+        self.artists = artists
+        self.layout = None
+        self.lock = threading.Lock()
+
+    def autoscale(self) -> None:
+        """
+        Rescale every axes to its current data.
+        """
+        for ax in self.figure.axes:
+            ax.relim()
+            ax.autoscale_view()
+
+    def layout_signature(self) -> tuple:
+        """
+        Longest tick label on each axis, which is what sets the layout.
+        """
+        signature = []
+        for ax in self.figure.axes:
+            for axis in (ax.xaxis, ax.yaxis):
+                ticks = axis.get_major_locator()()
+                labels = axis.get_major_formatter().format_ticks(ticks)
+                signature.append(max((len(label) for label in labels), default=0))
+        return tuple(signature)
+
+    def save(self,
+             out_path : str,
+             tight_layout : bool = True,
+             **kwargs) -> None:
+        """
+        Save the figure, recalculating the layout only if it has changed.
+        out_path may also be a report page, or anything with a savefig
+        method taking the figure.
+        """
+        if tight_layout:
+            signature = self.layout_signature()
+            if signature != self.layout:
+                self.figure.tight_layout()
+                self.layout = signature
+        if hasattr(out_path, 'savefig'):
+            out_path.savefig(self.figure, **kwargs)
+        else:
+            self.figure.savefig(out_path, **kwargs)
+
+
+def get_template(kind : str,
+                 builder,
+                 **settings) -> FigureTemplate:
+    """
+    Return the figure template for a plot type and settings, building it once.
+
+    Parameters
+    ----------
+    kind: string
+        Plot type identifier.
+    builder: function
+        Function called with **settings to build a new FigureTemplate.
+    **settings
+        Json serialisable settings that change the figure construction, such
+        as the plot dictionary fields.
+
+    Returns
+    -------
+    template: FigureTemplate
+        Shared template for kind and settings.
+
+    See Also
+    --------
+    FigureTemplate
+    clear_templates
+
+    Notes
+    -----
+    Templates are shared between calls, so renderers hold the template lock
+    while they update and save it.
+
+    Example
+    -------
+    None
+
+    """
+    key = (kind, json.dumps(settings, sort_keys=True))
+    with templates_lock:
+        if key not in figure_templates:
+            figure_templates[key] = builder(**settings)
+        return figure_templates[key]
+
+
+def clear_templates() -> None:
+    """
+    Discard all figure templates.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    get_template
+
+    Notes
+    -----
+    Templates hold their figures for the life of the process. Clearing them
+    releases the memory at the end of a batch.
+
+    Example
+    -------
+    None
+
+    """
+    with templates_lock:
+        figure_templates.clear()
+
+
+def template_settings(plot_dict : dict) -> dict:
+    """
+    Keep only the plot dictionary entries used to build a figure template.
+
+    Parameters
+    ----------
+    plot_dict: dictionary
+        Plot settings or batch dictionary.
+
+    Returns
+    -------
+    settings: dictionary
+        Entries of plot_dict named in template_fields.
+
+    See Also
+    --------
+    get_template
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    return {field: plot_dict[field] for field in template_fields}
+
+
+def preview_dpi(plot_dict : dict) -> float:
+    """
+    Return the preview resolution if plot_dict asks for preview rendering.
+
+    Parameters
+    ----------
+    plot_dict: dictionary
+        Plot settings dictionary, optionally containing:
+            {
+                "render_tier": "preview" or "publish",\n
+                "preview_dpi": preview resolution, default 72
+            }
+
+    Returns
+    -------
+    dpi: float
+        Preview resolution, or None to save at the full figure resolution.
+
+    See Also
+    --------
+    save_tiered
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    if plot_dict and plot_dict.get("render_tier") == "preview":
+        return plot_dict.get("preview_dpi", 72)
+    return None
+
+
+def figure_data_path(out_path : str) -> Path:
+    """
+    Path of the stored plot data belonging to a figure.
+
+    Parameters
+    ----------
+    out_path: string
+        Figure path.
+
+    Returns
+    -------
+    data_path: Path
+        Figure path with a .npz extension.
+
+    See Also
+    --------
+    store_figure_data
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    return Path(out_path).with_suffix('.npz')
+
+
+def store_figure_data(out_path : str,
+                      kind : str,
+                      arrays : dict,
+                      parameters : dict,
+                      plot_dict : dict) -> None:
+    """
+    Store everything needed to render a figure again later.
+
+    Parameters
+    ----------
+    out_path: string
+        Figure path, the data is saved next to it as .npz.
+    kind: string
+        Renderer name in renderers.
+    arrays: dictionary
+        Data arrays passed to the renderer.
+    parameters: dictionary
+        Json serialisable renderer arguments.
+    plot_dict: dictionary
+        Plot settings dictionary.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    publish_figure
+
+    Notes
+    -----
+    Arrays are stored compressed as float32, which is ample for plotting and
+    keeps the data smaller than a full resolution image.
+
+    Example
+    -------
+    None
+
+    """
+    np.savez_compressed(
+        figure_data_path(out_path=out_path),
+        kind=kind,
+        parameters=json.dumps(parameters, default=convert),
+        plot_dict=json.dumps(
+            plot_settings(plot_dict=plot_dict) if plot_dict else {},
+            default=convert),
+        **{
+            name: np.asarray(array, dtype=np.float32)
+            for name, array in arrays.items()})
+
+
+def save_tiered(template : FigureTemplate,
+                out_path : str,
+                kind : str,
+                arrays : dict,
+                parameters : dict,
+                plot_dict : dict) -> None:
+    """
+    Save a rendered template at the resolution of the requested tier.
+
+    Parameters
+    ----------
+    template: FigureTemplate
+        Rendered figure template.
+    out_path: string
+        Path to save.
+    kind, arrays, parameters, plot_dict
+        Renderer name, data arrays, renderer arguments and plot settings,
+        see store_figure_data.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    preview_dpi
+    store_figure_data
+    publish_figure
+
+    Notes
+    -----
+    In the preview tier the figure is saved at the preview resolution and
+    its data stored alongside, so publish_figure can render it at full
+    resolution or as vector output later. Otherwise the figure is saved at
+    its own resolution. Figures saved to a report page are not stored.
+
+    Example
+    -------
+    None
+
+    """
+    dpi = preview_dpi(plot_dict=plot_dict)
+    if dpi is None:
+        template.save(out_path=out_path)
+        return
+    template.save(out_path=out_path, dpi=dpi)
+    if hasattr(out_path, 'savefig'):
+        return
+    store_figure_data(
+        out_path=out_path,
+        kind=kind,
+        arrays=arrays,
+        parameters=parameters,
+        plot_dict=plot_dict)
+
+
+def render_thumbnail(kind : str,
+                     arrays : dict,
+                     parameters : dict,
+                     plot_dict : dict,
+                     out_path : str) -> bool:
+    """
+    Draw a figure with the thumbnail backend if plot_dict asks for it.
+
+    Parameters
+    ----------
+    kind, arrays, parameters, plot_dict
+        Renderer name, data arrays, renderer arguments and plot settings,
+        see store_figure_data. plot_dict "render_backend" selects
+        "matplotlib", the default, or "thumbnail".
+    out_path: string
+        Path to save.
+
+    Returns
+    -------
+    drawn: bool
+        True if the thumbnail was saved, False if the figure is left to
+        matplotlib.
+
+    See Also
+    --------
+    render_panels
+    save_tiered
+
+    Notes
+    -----
+    Report pages and vector formats need matplotlib, so they are always
+    drawn by it. In the preview tier the data is stored alongside, so
+    publish_figure can render a full matplotlib figure later.
+
+    Example
+    -------
+    None
+
+    """
+    if (plot_dict or {}).get("render_backend", "matplotlib") != "thumbnail":
+        return False
+    if hasattr(out_path, 'savefig') or Path(out_path).suffix.lower() != '.png':
+        return False
+    thumbnail_renderers[kind](
+        **arrays,
+        **parameters,
+        plot_dict=plot_dict,
+        out_path=out_path)
+    if preview_dpi(plot_dict=plot_dict) is not None:
+        store_figure_data(
+            out_path=out_path,
+            kind=kind,
+            arrays=arrays,
+            parameters=parameters,
+            plot_dict=plot_dict)
+    return True
+
+
+def style_axes(ax,
+               xlabel : str,
+               ylabel : str,
+               axis_fontsize : float,
+               label_size : float) -> None:
+    """
+    Apply the standard axis label and tick styles.
+
+    Parameters
+    ----------
+    ax: matplotlib Axes
+        Axes to style.
+    xlabel, ylabel: string
+        Axis labels.
+    axis_fontsize, label_size: float
+        Font size of the axis labels and tick labels.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    None
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
     ax.set_xlabel(
         xlabel,
-        fontsize=15,
+        fontsize=axis_fontsize,
         fontweight='bold',
         color='black')
     ax.set_ylabel(
         ylabel,
-        fontsize=15,
+        fontsize=axis_fontsize,
         fontweight='bold',
         color='black')
-    #ax.set_title(
-    #    title,
-    #    fontsize=18,
-    #    fontweight='bold',
-    #    color='black')
     ax.tick_params(
         axis='both',
         colors='black',
-        labelsize=10)
-    plt.savefig(out_path, bbox_inches='tight')
-    fig.clf()
-    plt.cla()
-    plt.close(fig)
+        labelsize=label_size)
+
+
+def build_profile_template(line : bool,
+                           vertical_lines : int,
+                           text_box : bool,
+                           dpi : float) -> FigureTemplate:
+    """
+    Build the template used by plotafm and xy_tworois_plot.
+
+    Parameters
+    ----------
+    line: bool
+        If true, plots line, else plots markers.
+    vertical_lines: int
+        Number of region of interest markers.
+    text_box: bool
+        If true, adds the text display box.
+    dpi: float
+        Figure resolution.
+
+    Returns
+    -------
+    template: FigureTemplate
+        Figure template.
+
+    See Also
+    --------
+    plotafm
+    xy_tworois_plot
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    fig = Figure(
+        figsize=[round(7.5 * 0.393701, 2), round(9 * 0.393701, 2)],
+        dpi=dpi)
+    ax = fig.subplots(1)
+    if line:
+        data, = ax.plot([], [], 'b', lw=2)
+    else:
+        data, = ax.plot([], [], 'bx', markersize=4)
+    ax.grid(True)
+    markers = [
+        ax.axvline(x=0, color='g', linestyle='--')
+        for _ in range(vertical_lines)]
+    text = None
+    if text_box:
+        props = dict(
+            boxstyle='round',
+            facecolor='wheat',
+            alpha=0.5)
+        text = ax.text(
+            0.05,
+            0.05,
+            '',
+            transform=ax.transAxes,
+            fontsize=10,
+            verticalalignment='top',
+            bbox=props)
+    style_axes(
+        ax=ax,
+        xlabel='',
+        ylabel='',
+        axis_fontsize=15,
+        label_size=10)
+    return FigureTemplate(
+        figure=fig,
+        artists={
+            "ax": ax,
+            "data": data,
+            "markers": markers,
+            "text": text})
+
+
+def render_profile(x, y, label, xlabel, ylabel, out_path,
+                   line=False, vertical_lines=(), text_string=None,
+                   plot_dict=None) -> None:
+    """
+    Render a profile with optional region markers through a figure template.
+
+    Parameters
+    ----------
+    x, y: list
+        x- and y-data arrays.
+    label, xlabel, ylabel: string
+        Data label, x-axis label, y-axis label.
+    out_path: string
+        Save path.
+    line: bool
+        If true, plots line, else plots markers.
+    vertical_lines: list
+        x positions of region of interest markers.
+    text_string: string
+        Text for the display box, None for no box.
+    plot_dict: dictionary
+        Optional "dpi", "render_tier" and "preview_dpi" settings, 600 dpi
+        full resolution by default.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    build_profile_template
+    save_tiered
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    arrays = {"x": x, "y": y}
+    parameters = {
+        "label": label,
+        "xlabel": xlabel,
+        "ylabel": ylabel,
+        "line": bool(line),
+        "vertical_lines": list(vertical_lines),
+        "text_string": text_string}
+    if render_thumbnail(
+            kind='profile',
+            arrays=arrays,
+            parameters=parameters,
+            plot_dict=plot_dict,
+            out_path=out_path):
+        return
+    template = get_template(
+        'profile',
+        build_profile_template,
+        line=bool(line),
+        vertical_lines=len(vertical_lines),
+        text_box=text_string is not None,
+        dpi=(plot_dict or {}).get("dpi", 600))
+    with template.lock:
+        artists = template.artists
+        artists["data"].set_data(x, y)
+        artists["data"].set_label(label)
+        for marker, position in zip(artists["markers"], vertical_lines):
+            marker.set_xdata([position, position])
+        if text_string is not None:
+            artists["text"].set_text(text_string)
+        artists["ax"].set_xlabel(xlabel)
+        artists["ax"].set_ylabel(ylabel)
+        template.autoscale()
+        save_tiered(
+            template=template,
+            out_path=out_path,
+            kind='profile',
+            arrays=arrays,
+            parameters=parameters,
+            plot_dict=plot_dict)
+
+
+def plotafm(x, y, label,
+            xlabel, ylabel, title, out_path,
+            line=False, plot_dict=None):
+    '''
+    Plot (x, y) data on graph.
+    Args:
+        x: <array> x-data array
+        y: <array> y-data array
+        label: <string> data label
+        xlabel: <string> x-axis label
+        ylabel: <string> y-axis label
+        title: <string> plot title
+        out_path: <string> save path
+        line: <bool> if true, plots line, else plots markers
+        plot_dict: <dict> optional "dpi", "render_tier" and "preview_dpi"
+    Returns:
+        None
+    '''
+    render_profile(
+        x=x,
+        y=y,
+        label=label,
+        xlabel=xlabel,
+        ylabel=ylabel,
+        out_path=out_path,
+        line=line,
+        plot_dict=plot_dict)
 
 
 def xy_tworois_plot(x, y, label, text_string,
                     x1, x2, x3, x4,
                     xlabel, ylabel, title, out_path,
-                    line=False):
+                    line=False, plot_dict=None):
     '''
     Plot two regions of interest for (x, y) data on graph. Display start and
     end of regions of interest on x-axis.
@@ -109,81 +724,115 @@ def xy_tworois_plot(x, y, label, text_string,
         out_path: <string> save path
         line: <bool> if true, plots line, else plots markers
         show: <bool> if true, plot shows, always saves
+        plot_dict: <dict> optional "dpi", "render_tier" and "preview_dpi"
     Returns:
         None
     '''
-    fig, ax = plt.subplots(
-        1,
-        figsize=[round(7.5 * 0.393701, 2), round(9 * 0.393701, 2)],
-        dpi=600)
-    if line:
-        ax.plot(
-            x, y,
-            'b',
-            lw=2,
-            label=label)
-    else:
-        ax.plot(
-            x, y,
-            'bx',
-            markersize=4,
-            label=label)
-    ax.grid(True)
-    #ax.legend(
-    #    frameon=True,
-    #    loc=0,
-    #    prop={'size': 10})
-    ax.axvline(
-        x=x1,
-        color='g',
-        linestyle='--')
-    ax.axvline(
-        x=x2,
-        color='g',
-        linestyle='--')
-    ax.axvline(
-        x=x3,
-        color='g',
-        linestyle='--')
-    ax.axvline(
-        x=x4,
-        color='g',
-        linestyle='--')
-    ax.set_xlabel(
-        xlabel,
-        fontsize=15,
-        fontweight='bold',
-        color='black')
-    ax.set_ylabel(
-        ylabel,
-        fontsize=15,
-        fontweight='bold',
-        color='black')
-    #ax.set_title(
-    #    title,
-    #    fontsize=18,
-    #    fontweight='bold',
-    #    color='black')
-    ax.tick_params(
-        axis='both',
-        colors='black',
-        labelsize=10)
+    render_profile(
+        x=x,
+        y=y,
+        label=label,
+        xlabel=xlabel,
+        ylabel=ylabel,
+        out_path=out_path,
+        line=line,
+        vertical_lines=[x1, x2, x3, x4],
+        text_string=text_string,
+        plot_dict=plot_dict)
+
+
+def build_roi_template(width : float,
+                       height : float,
+                       dpi : float,
+                       grid : str,
+                       legend_loc : int,
+                       legend_col : int,
+                       legend_size : float,
+                       axis_fontsize : float,
+                       label_size : float) -> FigureTemplate:
+    """
+    Build the template used by xy_roi_plot.
+
+    Parameters
+    ----------
+    width, height, dpi, grid, legend_loc, legend_col, legend_size,
+    axis_fontsize, label_size
+        Plot dictionary fields, see xy_roi_plot.
+
+    Returns
+    -------
+    template: FigureTemplate
+        Figure template.
+
+    See Also
+    --------
+    xy_roi_plot
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    fig = Figure(
+        figsize=[
+            cm_to_inches(cm=width),
+            cm_to_inches(cm=height)],
+        dpi=dpi)
+    ax = fig.subplots(
+        nrows=1,
+        ncols=1)
+    data, = ax.plot(
+        [],
+        [],
+        'b',
+        lw=2,
+        label='Data')
+    ax.grid(
+        visible=grid == "True",
+        alpha=0.5)
+    left = ax.axvline(
+        x=0,
+        color='r',
+        linestyle='--',
+        lw=2)
+    right = ax.axvline(
+        x=0,
+        color='r',
+        linestyle='--',
+        lw=2)
     props = dict(
         boxstyle='round',
         facecolor='wheat',
         alpha=0.5)
-    ax.text(
+    text = ax.text(
         0.05,
         0.05,
-        text_string,
+        '',
         transform=ax.transAxes,
-        fontsize=10,
+        fontsize=14,
         verticalalignment='top',
         bbox=props)
-    plt.savefig(out_path, bbox_inches='tight')
-    fig.clf()
-    plt.cla()
-    plt.close(fig)
+    ax.legend(
+        loc=legend_loc,
+        ncol=legend_col,
+        prop={'size': legend_size})
+    style_axes(
+        ax=ax,
+        xlabel='Lateral (mm)',
+        ylabel='Profile (nm)',
+        axis_fontsize=axis_fontsize,
+        label_size=label_size)
+    return FigureTemplate(
+        figure=fig,
+        artists={
+            "data": data,
+            "left": left,
+            "right": right,
+            "text": text})
 
 
 def xy_roi_plot(x_array : list,
@@ -228,6 +877,70 @@ def xy_roi_plot(x_array : list,
     --------
     None
 
+    Notes
+    -----
+    Skipped if the same figure, from the same data and plot settings, has
+    already been saved to out_path and the file there is unchanged since.
+
+    Example
+    -------
+    None
+
+    """
+    key = cache_key(
+        'xy_roi_plot',
+        np.asarray(x_array),
+        np.asarray(y_array),
+        float(x1),
+        float(x2),
+        text_string,
+        plot_settings(plot_dict=plot_dict),
+        str(out_path))
+    if get_cache().figure_current(key=key, out_path=out_path):
+        return
+    render_xy_roi(
+        x_array=x_array,
+        y_array=y_array,
+        x1=x1,
+        x2=x2,
+        text_string=text_string,
+        plot_dict=plot_dict,
+        out_path=out_path)
+    get_cache().store_figure(key=key, out_path=out_path)
+
+
+def render_xy_roi(x_array : list,
+                  y_array : list,
+                  x1 : float,
+                  x2 : float,
+                  text_string : str,
+                  plot_dict : dict,
+                  out_path : str) -> None:
+    """
+    Render a region of interest figure through a figure template.
+
+    Parameters
+    ----------
+    x_array, y_array: list
+        x- and y-data arrays.
+    x1, x2: float
+        x data values for regions of interest.
+    text_string: string
+        Text for the display box.
+    plot_dict : dictionary
+        Plot settings dictionary, see xy_roi_plot.
+    out_path: string
+        Path so save.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    build_roi_template
+    xy_roi_plot
+
     Notes
     -----
     None
@@ -237,68 +950,286 @@ def xy_roi_plot(x_array : list,
     None
 
     """
-    fig, ax = plt.subplots(
-        nrows=1,
-        ncols=1,
+    arrays = {"x_array": x_array, "y_array": y_array}
+    parameters = {
+        "x1": float(x1),
+        "x2": float(x2),
+        "text_string": text_string}
+    if render_thumbnail(
+            kind='xy_roi',
+            arrays=arrays,
+            parameters=parameters,
+            plot_dict=plot_dict,
+            out_path=out_path):
+        return
+    template = get_template(
+        'xy_roi',
+        build_roi_template,
+        **template_settings(plot_dict=plot_dict))
+    with template.lock:
+        artists = template.artists
+        artists["data"].set_data(x_array, y_array)
+        artists["left"].set_xdata([x1, x1])
+        artists["right"].set_xdata([x2, x2])
+        artists["text"].set_text(text_string)
+        template.autoscale()
+        save_tiered(
+            template=template,
+            out_path=out_path,
+            kind='xy_roi',
+            arrays=arrays,
+            parameters=parameters,
+            plot_dict=plot_dict)
+
+
+def build_dektak_template(width : float,
+                          height : float,
+                          dpi : float,
+                          grid : str,
+                          legend_loc : int,
+                          legend_col : int,
+                          legend_size : float,
+                          axis_fontsize : float,
+                          label_size : float) -> FigureTemplate:
+    """
+    Build the template used by plot_dektak_thicknesses.
+
+    Parameters
+    ----------
+    width, height, dpi, grid, legend_loc, legend_col, legend_size,
+    axis_fontsize, label_size
+        Plot dictionary fields, see xy_roi_plot.
+
+    Returns
+    -------
+    template: FigureTemplate
+        Figure template with the raw data and baseline on the left and the
+        levelled data and step on the right.
+
+    See Also
+    --------
+    render_dektak_thicknesses
+
+    Notes
+    -----
+    Tick label size is left at the matplotlib default, as in the original
+    plot_dektak_thicknesses.
+
+    Example
+    -------
+    None
+
+    """
+    fig = Figure(
         figsize=[
-            cm_to_inches(cm=plot_dict["width"]),
-            cm_to_inches(cm=plot_dict["height"])],
-        dpi=plot_dict["dpi"])
-    ax.plot(
-        x_array,
-        y_array,
+            cm_to_inches(cm=width),
+            cm_to_inches(cm=height)],
+        dpi=dpi)
+    ax1, ax2 = fig.subplots(
+        nrows=1,
+        ncols=2)
+    data, = ax1.plot(
+        [],
+        [],
         'b',
         lw=2,
         label='Data')
-    if plot_dict["grid"] == "True":
-        grid = True
-    else:
-        grid = False
-    ax.grid(
-        visible=grid,
+    ax1.grid(
+        visible=grid == "True",
         alpha=0.5)
-    ax.axvline(
-        x=x1,
-        color='r',
-        linestyle='--',
-        lw=2)
-    ax.axvline(
-        x=x2,
-        color='r',
-        linestyle='--',
+    baseline, = ax1.plot(
+        [],
+        [],
+        'r',
+        lw=2,
+        label='Polynomial Baseline')
+    ax1.legend(
+        loc=legend_loc,
+        ncol=legend_col,
+        prop={'size': legend_size})
+    levelled, = ax2.plot(
+        [],
+        [],
+        'b',
+        lw=2,
+        label='Level Data')
+    step, = ax2.plot(
+        [],
+        [],
+        'r',
+        lw=2,
+        label='step')
+    zero, = ax2.plot(
+        [],
+        [],
+        'g',
         lw=2)
-    props = dict(
-        boxstyle='round',
-        facecolor='wheat',
+    ax2.grid(
+        visible=grid == "True",
         alpha=0.5)
-    ax.text(
-        0.05,
-        0.05,
-        text_string,
-        transform=ax.transAxes,
-        fontsize=14,
-        verticalalignment='top',
-        bbox=props)
-    ax.legend(
-        loc=plot_dict["legend_loc"],
-        ncol=plot_dict["legend_col"],
-        prop={'size': plot_dict["legend_size"]})
-    ax.set_xlabel(
-        'Lateral (mm)',
-        fontsize=plot_dict["axis_fontsize"],
-        fontweight='bold',
-        color='black')
-    ax.set_ylabel(
-        'Profile (nm)',
-        fontsize=plot_dict["axis_fontsize"],
-        fontweight='bold',
-        color='black')
-    ax.tick_params(
-        axis='both',
-        colors='black',
-        labelsize=plot_dict["label_size"])
-    fig.tight_layout()
-    plt.savefig(out_path)
-    fig.clf()
-    plt.cla()
-    plt.close(fig)
+    legend = ax2.legend(
+        loc=legend_loc,
+        ncol=legend_col,
+        prop={'size': legend_size})
+    for ax, ylabel in ((ax1, 'Profile (nm)'), (ax2, 'Vertical (nm)')):
+        ax.set_xlabel(
+            'Lateral (mm)',
+            fontsize=axis_fontsize,
+            fontweight='bold',
+            color='black')
+        ax.set_ylabel(
+            ylabel,
+            fontsize=axis_fontsize,
+            fontweight='bold',
+            color='black')
+    return FigureTemplate(
+        figure=fig,
+        artists={
+            "data": data,
+            "baseline": baseline,
+            "levelled": levelled,
+            "step": step,
+            "zero": zero,
+            "step_label": legend.get_texts()[1]})
+
+
+def render_dektak_thicknesses(x_array : list,
+                              y_array : list,
+                              y_baseline : list,
+                              step_height : float,
+                              plot_dict : dict,
+                              out_path : str) -> None:
+    """
+    Render a Dektak step height figure through a figure template.
+
+    Parameters
+    ----------
+    x_array, y_array, y_baseline: list
+        x-data array, y-data array, evaluated baseline.
+    step_height: float
+        Calculated step height (nm).
+    plot_dict : dictionary
+        Plot settings dictionary, see xy_roi_plot.
+    out_path: string
+        Path to save.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    build_dektak_template
+    plot_dektak_thicknesses
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    arrays = {
+        "x_array": x_array,
+        "y_array": y_array,
+        "y_baseline": y_baseline}
+    parameters = {"step_height": float(step_height)}
+    if render_thumbnail(
+            kind='dektak_thicknesses',
+            arrays=arrays,
+            parameters=parameters,
+            plot_dict=plot_dict,
+            out_path=out_path):
+        return
+    template = get_template(
+        'dektak_thicknesses',
+        build_dektak_template,
+        **template_settings(plot_dict=plot_dict))
+    with template.lock:
+        artists = template.artists
+        artists["data"].set_data(x_array, y_array)
+        artists["baseline"].set_data(x_array, y_baseline)
+        artists["levelled"].set_data(x_array, y_array - y_baseline)
+        artists["step"].set_data(
+            x_array,
+            step_height * np.ones_like(y_array))
+        artists["zero"].set_data(x_array, np.zeros_like(y_array))
+        label = f'step = {step_height:.2f} nm'
+        artists["step"].set_label(label)
+        artists["step_label"].set_text(label)
+        template.autoscale()
+        save_tiered(
+            template=template,
+            out_path=out_path,
+            kind='dektak_thicknesses',
+            arrays=arrays,
+            parameters=parameters,
+            plot_dict=plot_dict)
+
+
+renderers = {
+    'profile': render_profile,
+    'xy_roi': render_xy_roi,
+    'dektak_thicknesses': render_dektak_thicknesses}
+thumbnail_renderers = {
+    'profile': thumbnail_profile,
+    'xy_roi': thumbnail_xy_roi,
+    'dektak_thicknesses': thumbnail_dektak_thicknesses}
+
+
+def publish_figure(data_path : str,
+                   suffix : str = '.png',
+                   dpi : float = None) -> Path:
+    """
+    Render a previewed figure again at publication quality.
+
+    Parameters
+    ----------
+    data_path: string
+        Path to the .npz plot data stored next to a preview figure.
+    suffix: string
+        Output file extension. '.png' replaces the preview, '.pdf' or '.svg'
+        give vector output.
+    dpi: float
+        Resolution override, None for the "dpi" the figure was made with.
+
+    Returns
+    -------
+    out_path: Path
+        Path of the published figure.
+
+    See Also
+    --------
+    store_figure_data
+    save_tiered
+
+    Notes
+    -----
+    The figure is rendered from the stored arrays, so the original data file
+    and fit are not needed. Thumbnails are always published with matplotlib.
+
+    Example
+    -------
+    >>> publish_figure(data_path="/Path/To/Sample_Height.npz", suffix=".pdf")
+
+    """
+    with np.load(data_path) as data:
+        kind = str(data["kind"])
+        parameters = json.loads(str(data["parameters"]))
+        plot_dict = json.loads(str(data["plot_dict"]))
+        arrays = {
+            name: data[name] for name in data.files
+            if name not in ("kind", "parameters", "plot_dict")}
+    plot_dict["render_tier"] = "publish"
+    plot_dict["render_backend"] = "matplotlib"
+    if dpi is not None:
+        plot_dict["dpi"] = dpi
+    out_path = Path(data_path).with_suffix(suffix)
+    renderers[kind](
+        **arrays,
+        **parameters,
+        plot_dict=plot_dict,
+        out_path=out_path)
+    return out_path
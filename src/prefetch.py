@@ -0,0 +1,55 @@
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def prefetch(items : list,
+             load : object,
+             lookahead : int = 2) -> tuple:
+    """
+    Load upcoming items on a background thread while the caller works.
+
+    Parameters
+    ----------
+    items: list
+        Items to load, e.g. file paths, in order.
+    load: function
+        load(item) returning whatever the caller needs for the item.
+    lookahead: int
+        Number of items loaded ahead of the one being handed out.
+
+    Yields
+    ------
+    item, future: tuple
+        Each item, in order, with the future of load(item). future.result()
+        waits for the load if it has not finished, and raises any error it
+        hit.
+
+    See Also
+    --------
+    concurrent.futures.ThreadPoolExecutor
+
+    Notes
+    -----
+    At most lookahead + 1 items are held in memory, however long items is.
+    Loads run one at a time on a single thread, in order, so the next item
+    is always the first to finish. Numpy parsing and file reads release the
+    GIL for much of their time, so they overlap well with the caller waiting
+    on the user.
+
+    Example
+    -------
+    >>> for file_path, future in prefetch(items=file_paths, load=read_file):
+    ...     lateral, profile = future.result()
+
+    """
+    iterator = iter(items)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = deque(
+            (item, pool.submit(load, item))
+            for item in islice(iterator, lookahead + 1))
+        while pending:
+            item, future = pending.popleft()
+            for upcoming in islice(iterator, 1):
+                pending.append((upcoming, pool.submit(load, upcoming)))
+            yield item, future
@@ -0,0 +1,473 @@
+import numpy as np
+
+from dataclasses import dataclass, asdict
+
+from src.edgedetection import edge_widths
+from src.datalevelling import (
+    crop_xydata, fit_polynomial_steps, suggest_regions)
+from src.grating import (
+    period_step_heights, step_height_distribution, spectral_periods,
+    duty_cycles, level_gratings)
+
+
+@dataclass(frozen=True)
+class StepHeightResult:
+    """
+    Levelled step height of one profile.
+
+    Attributes
+    ----------
+    thickness, thickness_error: float
+        Step height and error, in the profile units (nm for Dektak files).
+    polynomial, polynomial_errors: tuple
+        Baseline polynomial coefficients, highest power first, and errors.
+    range_left, range_right: tuple
+        Base and step x ranges used for the fit.
+
+    """
+
+    thickness : float
+    thickness_error : float
+    polynomial : tuple
+    polynomial_errors : tuple
+    range_left : tuple
+    range_right : tuple
+
+    def as_dict(self,
+                file_name : str) -> dict:
+        """
+        Results dictionary keyed as in level_film_thickness.
+        """
+        return {
+            f'{file_name} Thickness': self.thickness,
+            f'{file_name} Thickness Error': self.thickness_error,
+            f'{file_name} Polynomial': list(self.polynomial),
+            f'{file_name} Polynomial Errors': list(self.polynomial_errors)}
+
+
+@dataclass(frozen=True)
+class WidthResult:
+    """
+    Edge to edge width of the feature in one profile.
+
+    Attributes
+    ----------
+    width, width_error: float
+        Feature width and error, in the lateral units (mm for Dektak files).
+        NaN if two edges were not found.
+    left_edge, right_edge: float
+        Interpolated edge positions.
+
+    """
+
+    width : float
+    width_error : float
+    left_edge : float
+    right_edge : float
+
+    def as_dict(self,
+                file_name : str) -> dict:
+        """
+        Results dictionary keyed as in calculate_profile_edge_widths.
+        """
+        return {
+            f'{file_name} Width': self.width,
+            f'{file_name} Width Error': self.width_error,
+            f'{file_name} Edges': [self.left_edge, self.right_edge]}
+
+
+@dataclass(frozen=True)
+class GratingResult:
+    """
+    Period, duty cycle and step height distribution of one grating profile.
+
+    Attributes
+    ----------
+    period, duty_cycle: float
+        Grating period, in the lateral units, and fraction of each period on
+        the grating top.
+    step_height, step_height_error: float
+        Mean and standard error of the per-period step heights, outliers
+        excluded.
+    step_heights: tuple
+        Individual per-period step heights, outliers included.
+    outliers: int
+        Number of per-period step heights rejected as outliers.
+
+    """
+
+    period : float
+    duty_cycle : float
+    step_height : float
+    step_height_error : float
+    step_heights : tuple
+    outliers : int
+
+    def as_dict(self,
+                file_name : str) -> dict:
+        """
+        Results dictionary keyed by file name.
+        """
+        return {
+            f'{file_name} {key.replace("_", " ").title()}': value
+            for key, value in asdict(self).items()}
+
+
+@dataclass(frozen=True)
+class ProfileResult:
+    """
+    Step height and feature width of one profile.
+
+    Attributes
+    ----------
+    step_height: StepHeightResult
+        Levelled step height, None if no regions were given or found.
+    width: WidthResult
+        Edge to edge feature width.
+
+    """
+
+    step_height : StepHeightResult
+    width : WidthResult
+
+    def as_dict(self,
+                file_name : str) -> dict:
+        """
+        Results dictionary combining both results.
+        """
+        results = self.width.as_dict(file_name=file_name)
+        if self.step_height is not None:
+            results.update(self.step_height.as_dict(file_name=file_name))
+        return results
+
+
+class ProfileAnalyzer:
+    """
+    Headless surface profile analysis on in-memory arrays.
+
+    Takes lateral and profile arrays, and optionally regions of interest,
+    and returns frozen result dataclasses. Nothing is read, written, plotted
+    or cached, and no user input is requested.
+
+    Parameters
+    ----------
+    polynomial_order: int
+        Degree of the step height baseline polynomial.
+    height_fraction: float
+        Fraction of the feature height at which width edges are located.
+    level_widths: bool
+        If True, remove the end to end tilt before finding width edges.
+    plateau_fraction: float
+        Fraction of each level or grating plateau used in averages.
+    hysteresis: float
+        Fraction of the profile range used as the dead band between levels.
+    outlier_threshold: float
+        Modified z-score above which grating step heights are outliers.
+
+    Notes
+    -----
+    Settings are fixed when the analyzer is made and no method changes any
+    shared state, so one analyzer can be used from many threads at once.
+    The many-profile methods pad profiles to a common length and solve them
+    together, so they are much faster than a loop over single profiles.
+
+    Example
+    -------
+    >>> analyzer = ProfileAnalyzer(polynomial_order=2)
+    >>> result = analyzer.step_height(
+    ...     lateral=lateral,
+    ...     profile=profile,
+    ...     range_left=[0.1, 0.3],
+    ...     range_right=[0.6, 0.8])
+    >>> result.thickness
+
+    """
+
+    def __init__(self,
+                 polynomial_order : int = 2,
+                 height_fraction : float = 0.5,
+                 level_widths : bool = True,
+                 plateau_fraction : float = 0.5,
+                 hysteresis : float = 0.1,
+                 outlier_threshold : float = 3.5):
+        self.polynomial_order = polynomial_order
+        self.height_fraction = height_fraction
+        self.level_widths = level_widths
+        self.plateau_fraction = plateau_fraction
+        self.hysteresis = hysteresis
+        self.outlier_threshold = outlier_threshold
+
+    def regions(self,
+                lateral : list,
+                profile : list,
+                range_left : list = None,
+                range_right : list = None) -> list:
+        """
+        Return the given regions, or suggested ones if either is None.
+        """
+        if range_left is None or range_right is None:
+            return suggest_regions(
+                x=lateral,
+                y=profile,
+                plateau_fraction=self.plateau_fraction,
+                hysteresis=self.hysteresis)
+        return range_left, range_right
+
+    def step_heights(self,
+                     laterals : list,
+                     profiles : list,
+                     ranges_left : list = None,
+                     ranges_right : list = None) -> list:
+        """
+        Levelled step heights of many profiles with one batched fit.
+
+        Parameters
+        ----------
+        laterals, profiles: list
+            Lists of x- and y-data arrays, one pair per profile.
+        ranges_left, ranges_right: list
+            Base and step x ranges for each profile. Missing lists or None
+            entries are replaced by suggest_regions.
+
+        Returns
+        -------
+        results: list
+            StepHeightResult for each profile, None where no regions were
+            given or found, a region holds no data, or the fit fails.
+
+        """
+        count = len(profiles)
+        ranges_left = ranges_left or [None] * count
+        ranges_right = ranges_right or [None] * count
+        fitted = []
+        crops = []
+        regions = []
+        for index in range(count):
+            lateral = np.asarray(laterals[index], dtype=float)
+            profile = np.asarray(profiles[index], dtype=float)
+            left, right = self.regions(
+                lateral=lateral,
+                profile=profile,
+                range_left=ranges_left[index],
+                range_right=ranges_right[index])
+            if left is None:
+                continue
+            base = crop_xydata(x=lateral, y=profile, x_range=left)
+            step = crop_xydata(x=lateral, y=profile, x_range=right)
+            if np.size(base[0]) == 0 or np.size(step[0]) == 0:
+                continue
+            fitted.append(index)
+            regions.append((
+                tuple(float(value) for value in left),
+                tuple(float(value) for value in right)))
+            crops.append((base, step))
+        results = [None] * count
+        for index, fit, (left, right) in zip(
+                fitted, self.fit_crops(crops=crops), regions):
+            if fit is None:
+                continue
+            parameter, error = fit
+            results[index] = StepHeightResult(
+                thickness=float(parameter[-1]),
+                thickness_error=float(error[-1]),
+                polynomial=tuple(parameter[:-1].tolist()),
+                polynomial_errors=tuple(error[:-1].tolist()),
+                range_left=left,
+                range_right=right)
+        return results
+
+    def fit_crops(self,
+                  crops : list) -> list:
+        """
+        Fit cropped base and step regions together with one batched solve.
+
+        Parameters
+        ----------
+        crops: list
+            ((x base, y base), (x step, y step)) for each profile.
+
+        Returns
+        -------
+        fits: list
+            (parameters, errors) for each profile, None where the fit
+            fails.
+
+        Notes
+        -----
+        If the batched solve fails, each profile is fitted on its own, so a
+        bad profile only loses its own result.
+
+        """
+        if not crops:
+            return []
+        try:
+            parameters, errors = fit_polynomial_steps(
+                x_bases=[base[0] for base, _ in crops],
+                y_bases=[base[1] for base, _ in crops],
+                x_steps=[step[0] for _, step in crops],
+                y_steps=[step[1] for _, step in crops],
+                polynomial_order=self.polynomial_order)
+        except Exception:
+            if len(crops) == 1:
+                return [None]
+            return [
+                fit for crop in crops for fit in self.fit_crops(crops=[crop])]
+        return list(zip(parameters, errors))
+
+    def step_height(self,
+                    lateral : list,
+                    profile : list,
+                    range_left : list = None,
+                    range_right : list = None) -> StepHeightResult:
+        """
+        Levelled step height of one profile, see step_heights.
+        """
+        return self.step_heights(
+            laterals=[lateral],
+            profiles=[profile],
+            ranges_left=[range_left],
+            ranges_right=[range_right])[0]
+
+    def widths(self,
+               laterals : list,
+               profiles : list) -> list:
+        """
+        Edge to edge feature widths of many profiles, processed together.
+
+        Parameters
+        ----------
+        laterals, profiles: list
+            Lists of x- and y-data arrays, one pair per profile.
+
+        Returns
+        -------
+        results: list
+            WidthResult for each profile.
+
+        """
+        edges = edge_widths(
+            lateral_arrays=laterals,
+            profile_arrays=profiles,
+            height_fraction=self.height_fraction,
+            level=self.level_widths)
+        return [
+            WidthResult(
+                width=float(width),
+                width_error=float(error),
+                left_edge=float(left),
+                right_edge=float(right))
+            for width, error, left, right in zip(
+                edges["Widths"],
+                edges["Width Errors"],
+                edges["Left Edges"],
+                edges["Right Edges"])]
+
+    def width(self,
+              lateral : list,
+              profile : list) -> WidthResult:
+        """
+        Edge to edge feature width of one profile, see widths.
+        """
+        return self.widths(laterals=[lateral], profiles=[profile])[0]
+
+    def gratings(self,
+                 laterals : list,
+                 profiles : list) -> list:
+        """
+        Period, duty cycle and step height distribution of many gratings.
+
+        Parameters
+        ----------
+        laterals, profiles: list
+            Lists of x- and y-data arrays, one pair per grating profile.
+
+        Returns
+        -------
+        results: list
+            GratingResult for each profile, measured after removing each
+            profile's tilt with level_gratings. Profiles in which
+            period_step_heights finds no grating have NaN period, duty
+            cycle and step height and no step heights.
+
+        """
+        profiles = level_gratings(
+            lateral_arrays=laterals,
+            profile_arrays=profiles,
+            hysteresis=self.hysteresis)
+        periods = spectral_periods(
+            lateral_arrays=laterals,
+            profile_arrays=profiles)
+        duties = duty_cycles(profile_arrays=profiles)
+        results = []
+        for period, duty, profile in zip(periods, duties, profiles):
+            step_heights = period_step_heights(
+                y=profile,
+                plateau_fraction=self.plateau_fraction,
+                hysteresis=self.hysteresis)["Step Heights"]
+            if step_heights.size == 0:
+                results.append(GratingResult(
+                    period=np.nan,
+                    duty_cycle=np.nan,
+                    step_height=np.nan,
+                    step_height_error=np.nan,
+                    step_heights=(),
+                    outliers=0))
+                continue
+            distribution = step_height_distribution(
+                step_heights=step_heights,
+                outlier_threshold=self.outlier_threshold)
+            results.append(GratingResult(
+                period=float(period),
+                duty_cycle=float(duty),
+                step_height=float(distribution["Mean Step Height"]),
+                step_height_error=float(distribution["Step Height Error"]),
+                step_heights=tuple(np.asarray(step_heights).tolist()),
+                outliers=len(distribution["Outlier Periods"])))
+        return results
+
+    def analyze_many(self,
+                     laterals : list,
+                     profiles : list,
+                     ranges_left : list = None,
+                     ranges_right : list = None) -> list:
+        """
+        Step height and feature width of many profiles.
+
+        Parameters
+        ----------
+        laterals, profiles: list
+            Lists of x- and y-data arrays, one pair per profile.
+        ranges_left, ranges_right: list
+            Optional base and step x ranges, see step_heights.
+
+        Returns
+        -------
+        results: list
+            ProfileResult for each profile.
+
+        """
+        step_heights = self.step_heights(
+            laterals=laterals,
+            profiles=profiles,
+            ranges_left=ranges_left,
+            ranges_right=ranges_right)
+        widths = self.widths(
+            laterals=laterals,
+            profiles=profiles)
+        return [
+            ProfileResult(step_height=step_height, width=width)
+            for step_height, width in zip(step_heights, widths)]
+
+    def analyze(self,
+                lateral : list,
+                profile : list,
+                range_left : list = None,
+                range_right : list = None) -> ProfileResult:
+        """
+        Step height and feature width of one profile, see analyze_many.
+        """
+        return self.analyze_many(
+            laterals=[lateral],
+            profiles=[profile],
+            ranges_left=[range_left],
+            ranges_right=[range_right])[0]
@@ -0,0 +1,142 @@
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+
+
+class ReportPage:
+    """
+    Stand-in for a figure path that adds the figure to a batch report.
+
+    Plotting functions save to it exactly as they would to a file path, and
+    the figure becomes the next page of the report, labelled with title.
+
+    Parameters
+    ----------
+    report: BatchReport
+        Report the page belongs to.
+    title: string
+        Page label, usually the file name.
+
+    """
+
+    def __init__(self,
+                 report,
+                 title : str):
+        self.report = report
+        self.title = title
+
+    def savefig(self,
+                figure : Figure,
+                **kwargs) -> None:
+        """
+        Add figure to the report as a labelled page.
+        """
+        self.report.add_figure(
+            figure=figure,
+            title=self.title,
+            **kwargs)
+
+    def __str__(self) -> str:
+        return f'{self.report.out_path}#{self.title}'
+
+
+class BatchReport:
+    """
+    Multi-page PDF of every figure in a batch, written one page at a time.
+
+    Each page is written to disk as soon as it is added, so memory use does
+    not grow with the number of files. Use as a context manager, or call
+    close, to finish the file.
+
+    Parameters
+    ----------
+    out_path: string
+        Path to save the report.
+
+    """
+
+    summary_lines = 64
+
+    def __init__(self,
+                 out_path : str):
+        self.out_path = out_path
+        self.pdf = PdfPages(out_path)
+        self.pages = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def page(self,
+             title : str) -> ReportPage:
+        """
+        Return an out_path for plotting functions that adds a titled page.
+        """
+        return ReportPage(report=self, title=title)
+
+    def add_figure(self,
+                   figure : Figure,
+                   title : str = None,
+                   **kwargs) -> None:
+        """
+        Write figure as the next page, with an optional title in the corner.
+        """
+        label = None
+        if title:
+            label = figure.text(
+                0.01,
+                0.99,
+                title,
+                fontsize=8,
+                verticalalignment='top')
+        try:
+            self.pdf.savefig(figure, **kwargs)
+        finally:
+            if label is not None:
+                label.remove()
+        self.pages += 1
+
+    def add_summary(self,
+                    batch_name : str,
+                    results : dict,
+                    file_results : dict = None) -> None:
+        """
+        Write a text summary page with the batch average and file results.
+
+        Parameters
+        ----------
+        batch_name: string
+            Batch name for the page heading.
+        results: dictionary
+            Average result and error from average_step_and_error.
+        file_results: dictionary
+            Optional {file name: (value, error)} listed below the average.
+            Long lists continue over further pages.
+
+        """
+        lines = [
+            f'{batch_name}',
+            '',
+            f'Average Result: {results["Average Result"]:.4g}',
+            f'Average Error: {results["Average Error"]:.4g}',
+            f'Files: {len(file_results or {})}',
+            '']
+        for file_name, (value, error) in (file_results or {}).items():
+            lines.append(f'{file_name}: {value:.4g} +/- {error:.2g}')
+        for start in range(0, len(lines), self.summary_lines):
+            figure = Figure(figsize=[8.27, 11.69])
+            figure.text(
+                0.08,
+                0.95,
+                '\n'.join(lines[start: start + self.summary_lines]),
+                fontsize=10,
+                family='monospace',
+                verticalalignment='top')
+            self.add_figure(figure=figure)
+
+    def close(self) -> None:
+        """
+        Finish and close the PDF file.
+        """
+        self.pdf.close()
@@ -0,0 +1,319 @@
+import os
+import json
+import copy
+import pickle
+import hashlib
+import threading
+import numpy as np
+
+from pathlib import Path
+from collections import OrderedDict
+
+from src.fileIO import convert
+
+
+plot_fields = (
+    "width",
+    "height",
+    "dpi",
+    "grid",
+    "legend_loc",
+    "legend_col",
+    "legend_size",
+    "axis_fontsize",
+    "label_size",
+    "render_tier",
+    "preview_dpi",
+    "render_backend",
+    "thumbnail_size")
+
+
+def cache_key(*parts) -> str:
+    """
+    Hash data arrays and settings into a cache key.
+
+    Parameters
+    ----------
+    *parts
+        Any mix of numpy arrays and json serialisable values, such as
+        function names, regions of interest and settings dictionaries.
+
+    Returns
+    -------
+    key: string
+        Hexadecimal digest identifying the parts.
+
+    See Also
+    --------
+    ResultCache
+
+    Notes
+    -----
+    Arrays are hashed from their raw bytes, dtype and shape, so hashing a
+    million point profile costs about as much as reading it once from memory.
+    Everything else is hashed from its sorted json representation.
+
+    Example
+    -------
+    >>> key = cache_key("fit", x_array, y_array, [0.1, 0.4], {"order": 2})
+
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            digest.update(f'{part.dtype.str}{part.shape}'.encode())
+            digest.update(part.view(np.uint8).data)
+        else:
+            digest.update(json.dumps(
+                part,
+                sort_keys=True,
+                default=convert).encode())
+        digest.update(b'|')
+    return digest.hexdigest()
+
+
+def plot_settings(plot_dict : dict) -> dict:
+    """
+    Keep only the plot dictionary entries that change a rendered figure.
+
+    Parameters
+    ----------
+    plot_dict: dictionary
+        Plot settings or batch dictionary.
+
+    Returns
+    -------
+    settings: dictionary
+        Entries of plot_dict named in plot_fields.
+
+    See Also
+    --------
+    cache_key
+
+    Notes
+    -----
+    Batch names, file lists and other unrelated keys are dropped so that
+    editing them does not invalidate cached figures.
+
+    Example
+    -------
+    None
+
+    """
+    return {
+        field: plot_dict[field] for field in plot_fields if field in plot_dict}
+
+
+class ResultCache:
+    """
+    Two tier cache of fit results and rendered figures.
+
+    A least recently used in-memory tier sits in front of an optional disk
+    tier of pickle files that is trimmed, oldest first, to a size limit. The
+    disk tier survives between runs and can be shared by worker processes.
+
+    Parameters
+    ----------
+    memory_items: int
+        Maximum number of entries held in memory.
+    directory: string
+        Disk tier directory, None for memory only.
+    max_bytes: int
+        Maximum total size of the disk tier.
+
+    """
+
+    def __init__(self,
+                 memory_items : int = 256,
+                 directory : str = None,
+                 max_bytes : int = 256 * 1024 ** 2):
+        self.memory_items = memory_items
+        self.directory = Path(directory) if directory else None
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self,
+            key : str) -> object:
+        """
+        Return a copy of the cached value for key, or None if absent.
+        """
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return copy.deepcopy(self.memory[key])
+        if self.directory is None:
+            return None
+        path = self.directory / f'{key}.pkl'
+        try:
+            with open(path, 'rb') as infile:
+                value = pickle.load(infile)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        self.remember(key=key, value=value)
+        return copy.deepcopy(value)
+
+    def put(self,
+            key : str,
+            value : object) -> None:
+        """
+        Store value under key in memory and, if enabled, on disk.
+        """
+        self.remember(key=key, value=copy.deepcopy(value))
+        if self.directory is None:
+            return
+        path = self.directory / f'{key}.pkl'
+        temporary = self.directory / f'{key}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as outfile:
+            pickle.dump(value, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        self.evict()
+
+    def remember(self,
+                 key : str,
+                 value : object) -> None:
+        """
+        Store value in the memory tier, dropping the least recently used.
+        """
+        with self.lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used disk entries beyond max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                status = entry.stat()
+                entries.append((status.st_mtime, status.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def figure_current(self,
+                       key : str,
+                       out_path : str) -> bool:
+        """
+        True if the figure for key was saved to out_path and the file there
+        still has the size and modification time recorded by store_figure.
+        Always False for report pages and other non-path outputs.
+        """
+        if not isinstance(out_path, (str, os.PathLike)):
+            return False
+        stamp = file_stamp(out_path=out_path)
+        return stamp is not None and self.get(key=key) == stamp
+
+    def store_figure(self,
+                     key : str,
+                     out_path : str) -> None:
+        """
+        Record that the figure for key was just saved to out_path, with the
+        size and modification time of the saved file. Nothing is stored for
+        report pages and other non-path outputs.
+        """
+        if not isinstance(out_path, (str, os.PathLike)):
+            return
+        stamp = file_stamp(out_path=out_path)
+        if stamp is not None:
+            self.put(key=key, value=stamp)
+
+
+def file_stamp(out_path : str) -> tuple:
+    """
+    (size, modification time in ns) of a file, or None if it does not
+    exist.
+    """
+    try:
+        status = os.stat(out_path)
+    except OSError:
+        return None
+    return status.st_size, status.st_mtime_ns
+
+
+result_cache = ResultCache()
+
+
+def configure_cache(directory : str = None,
+                    max_megabytes : float = 256,
+                    memory_items : int = 256) -> ResultCache:
+    """
+    Replace the shared result cache.
+
+    Parameters
+    ----------
+    directory: string
+        Disk tier directory, None for memory only.
+    max_megabytes: float
+        Maximum total size of the disk tier in MB.
+    memory_items: int
+        Maximum number of entries held in memory.
+
+    Returns
+    -------
+    result_cache: ResultCache
+        The new shared cache.
+
+    See Also
+    --------
+    ResultCache
+
+    Notes
+    -----
+    Usually called once per process with the "cache_path" and "cache_size"
+    entries of the batch dictionary.
+
+    Example
+    -------
+    None
+
+    """
+    global result_cache
+    result_cache = ResultCache(
+        memory_items=memory_items,
+        directory=directory,
+        max_bytes=int(max_megabytes * 1024 ** 2))
+    return result_cache
+
+
+def get_cache() -> ResultCache:
+    """
+    Return the shared result cache.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    result_cache: ResultCache
+        The cache set by configure_cache, memory only by default.
+
+    See Also
+    --------
+    configure_cache
+
+    Notes
+    -----
+    Look the cache up at call time rather than importing result_cache, so
+    that configure_cache takes effect everywhere.
+
+    Example
+    -------
+    None
+
+    """
+    return result_cache
@@ -0,0 +1,147 @@
+import os
+import json
+
+from pathlib import Path
+
+from src.fileIO import convert
+
+
+def read_result_log(file_path : str) -> dict:
+    """
+    Read the file results recorded in a results log.
+
+    Parameters
+    ----------
+    file_path: string
+        Path to .jsonl results log.
+
+    Returns
+    -------
+    file_results: dictionary
+        {file name: results dictionary}, empty if the log does not exist.
+
+    See Also
+    --------
+    ResultLog
+
+    Notes
+    -----
+    The log is read a line at a time. A line cut short by a crash is
+    ignored, and a file recorded more than once keeps its latest results.
+
+    Example
+    -------
+    None
+
+    """
+    file_results = {}
+    try:
+        infile = open(file_path, 'r')
+    except FileNotFoundError:
+        return file_results
+    with infile:
+        for line in infile:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            file_results[record["file_name"]] = record["results"]
+    return file_results
+
+
+def failed(file_name : str,
+           results : dict) -> bool:
+    """
+    True if the results of file_name record an error.
+    """
+    return f'{file_name} Error' in results
+
+
+class ResultLog:
+    """
+    Append-only JSON lines log of file results for crash-safe batches.
+
+    Each file's results are written as one line as soon as they exist, so an
+    interrupted batch loses at most the file it was working on. Lines are
+    flushed immediately and forced to disk every sync_every files and on
+    close, trading a handful of files at risk on power loss for far fewer
+    fsync calls.
+
+    Parameters
+    ----------
+    out_path: string
+        Path to .jsonl results log.
+    resume: bool
+        If True, keep the existing log and treat the files it records
+        without errors as completed. Otherwise start a new log.
+    sync_every: int
+        Number of files appended between fsync calls.
+
+    """
+
+    def __init__(self,
+                 out_path : str,
+                 resume : bool = False,
+                 sync_every : int = 16):
+        self.out_path = Path(out_path)
+        self.sync_every = sync_every
+        self.completed = {}
+        if resume:
+            self.completed = {
+                file_name: results
+                for file_name, results in read_result_log(
+                    file_path=self.out_path).items()
+                if not failed(file_name=file_name, results=results)}
+            self.trim()
+        self.outfile = open(self.out_path, 'a' if resume else 'w')
+        self.unsynced = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def trim(self) -> None:
+        """
+        Cut a partly written last line left by a crash from the log.
+        """
+        try:
+            with open(self.out_path, 'rb+') as logfile:
+                contents = logfile.read()
+                if contents and not contents.endswith(b'\n'):
+                    logfile.truncate(contents.rfind(b'\n') + 1)
+        except FileNotFoundError:
+            pass
+
+    def append(self,
+               file_name : str,
+               results : dict) -> None:
+        """
+        Record the results of file_name as the next line of the log.
+        """
+        self.outfile.write(json.dumps(
+            {"file_name": file_name, "results": results},
+            default=convert))
+        self.outfile.write('\n')
+        self.outfile.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Force every appended line to disk.
+        """
+        self.outfile.flush()
+        os.fsync(self.outfile.fileno())
+        self.unsynced = 0
+
+    def close(self) -> None:
+        """
+        Sync and close the log.
+        """
+        if self.outfile.closed:
+            return
+        self.sync()
+        self.outfile.close()
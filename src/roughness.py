@@ -0,0 +1,254 @@
+import numpy as np
+
+
+class MomentAccumulator:
+    """
+    Single pass accumulator of the height statistics of a levelled profile.
+
+    Heights are added a chunk at a time, in any chunk sizes, and the count,
+    mean, central moments and mean absolute height are merged into running
+    totals with the pairwise update of Chan et al., the chunked form of
+    Welford's algorithm. Nothing is kept of the chunks themselves, and the
+    result does not depend on how the profile was split.
+
+    Notes
+    -----
+    Heights are measured from the levelling reference line, so the mean
+    absolute height gives Ra about that line. Rq, Rsk and Rku are taken about
+    the mean of the heights.
+
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.moments = np.zeros(3)
+        self.absolute = 0.0
+
+    def accumulate(self,
+                   heights : list) -> None:
+        """
+        Merge a chunk of heights into the running totals.
+        """
+        heights = np.asarray(heights, dtype=float)
+        count = heights.size
+        if count == 0:
+            return
+        mean = heights.mean()
+        deviations = heights - mean
+        squares = deviations * deviations
+        moments = np.array([
+            squares.sum(),
+            (squares * deviations).sum(),
+            (squares * squares).sum()])
+        total = self.count + count
+        delta = mean - self.mean
+        m2, m3, m4 = self.moments
+        n_a, n_b = self.count, count
+        self.moments = np.array([
+            m2 + moments[0] + delta ** 2 * n_a * n_b / total,
+            m3 + moments[1]
+            + delta ** 3 * n_a * n_b * (n_a - n_b) / total ** 2
+            + 3 * delta * (n_a * moments[0] - n_b * m2) / total,
+            m4 + moments[2]
+            + delta ** 4 * n_a * n_b * (
+                n_a ** 2 - n_a * n_b + n_b ** 2) / total ** 3
+            + 6 * delta ** 2 * (
+                n_a ** 2 * moments[0] + n_b ** 2 * m2) / total ** 2
+            + 4 * delta * (n_a * moments[1] - n_b * m3) / total])
+        self.mean += delta * n_b / total
+        self.count = total
+        self.absolute += np.abs(heights).sum()
+
+    def parameters(self) -> dict:
+        """
+        Ra, Rq, Rsk and Rku of every height accumulated so far.
+        """
+        if self.count == 0:
+            return {"Ra": np.nan, "Rq": np.nan, "Rsk": np.nan, "Rku": np.nan}
+        variance = self.moments[0] / self.count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {
+                "Ra": self.absolute / self.count,
+                "Rq": np.sqrt(variance),
+                "Rsk": self.moments[1] / self.count / variance ** 1.5,
+                "Rku": self.moments[2] / self.count / variance ** 2}
+
+
+class WelchAccumulator:
+    """
+    Streaming Welch estimate of the power spectral density of a profile.
+
+    Heights are added a chunk at a time. Every complete, half overlapping,
+    Hann windowed segment is transformed as it becomes available and its
+    periodogram added to a running sum, so only the unfinished segment is
+    kept between chunks.
+
+    Parameters
+    ----------
+    spacing: float
+        Lateral distance between points.
+    segment_length: int
+        Points per segment. Sets the frequency resolution,
+        1 / (segment_length * spacing).
+
+    Notes
+    -----
+    Each segment has its mean removed before windowing. The one sided PSD is
+    scaled so that its integral over frequency is the height variance.
+    Complete segments within a chunk are transformed together as one 2D
+    rfft.
+
+    """
+
+    def __init__(self,
+                 spacing : float,
+                 segment_length : int = 256):
+        self.spacing = spacing
+        self.segment_length = segment_length
+        self.step = segment_length - segment_length // 2
+        self.window = np.hanning(segment_length + 1)[:-1]
+        self.scale = 1 / (np.sum(self.window ** 2) / spacing)
+        self.buffer = np.empty(0)
+        self.power = np.zeros(segment_length // 2 + 1)
+        self.segments = 0
+
+    def accumulate(self,
+                   heights : list) -> None:
+        """
+        Add a chunk of heights, transforming every completed segment.
+        """
+        self.buffer = np.concatenate((
+            self.buffer,
+            np.asarray(heights, dtype=float)))
+        count = (self.buffer.size - self.segment_length) // self.step + 1
+        if count < 1:
+            return
+        starts = np.arange(count) * self.step
+        segments = self.buffer[
+            starts[:, None] + np.arange(self.segment_length)]
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        spectra = np.fft.rfft(segments * self.window, axis=1)
+        self.power += np.sum(spectra.real ** 2 + spectra.imag ** 2, axis=0)
+        self.segments += count
+        self.buffer = self.buffer[count * self.step:]
+
+    def spectrum(self) -> list:
+        """
+        Frequencies and one sided PSD averaged over every segment so far.
+        """
+        frequency = np.fft.rfftfreq(self.segment_length, d=self.spacing)
+        if self.segments == 0:
+            return frequency, np.full(frequency.size, np.nan)
+        psd = self.power * self.scale / self.segments
+        psd[1: -1 if self.segment_length % 2 == 0 else None] *= 2
+        return frequency, psd
+
+
+def profile_roughness(heights : list,
+                      spacing : float,
+                      segment_length : int = 256,
+                      chunk_size : int = None) -> dict:
+    """
+    Roughness parameters and PSD of a levelled profile.
+
+    Parameters
+    ----------
+    heights: list
+        Levelled profile heights, measured from the reference line.
+    spacing: float
+        Lateral distance between points.
+    segment_length: int
+        Welch segment length, reduced to the profile length for short
+        profiles.
+    chunk_size: int
+        If given, the profile is passed through in chunks of this length,
+        as it would be when streamed from a file.
+
+    Returns
+    -------
+    roughness: dictionary
+        {
+            "Ra", "Rq", "Rsk", "Rku": roughness parameters,
+            "PSD Frequency": frequencies (1 / lateral unit),
+            "PSD": power spectral density (height unit^2 x lateral unit)
+        }
+
+    See Also
+    --------
+    MomentAccumulator
+    WelchAccumulator
+
+    Notes
+    -----
+    Both accumulators see each chunk once, so the cost is one pass over the
+    heights plus one FFT per half segment.
+
+    Example
+    -------
+    None
+
+    """
+    heights = np.asarray(heights, dtype=float)
+    moments = MomentAccumulator()
+    spectrum = WelchAccumulator(
+        spacing=spacing,
+        segment_length=max(min(segment_length, heights.size), 2))
+    chunk_size = chunk_size or max(heights.size, 1)
+    for start in range(0, heights.size, chunk_size):
+        chunk = heights[start: start + chunk_size]
+        moments.accumulate(heights=chunk)
+        spectrum.accumulate(heights=chunk)
+    frequency, psd = spectrum.spectrum()
+    return dict(
+        moments.parameters(),
+        **{"PSD Frequency": frequency, "PSD": psd})
+
+
+def region_roughness(regions : dict,
+                     file_name : str,
+                     segment_length : int = 256) -> dict:
+    """
+    Roughness of each levelled region of a profile.
+
+    Parameters
+    ----------
+    regions: dictionary
+        {region name: (x, heights)} of levelled regions, such as the base and
+        step plateaus from levelled_regions.
+    file_name: string
+        Sample name identifier.
+    segment_length: int
+        Welch segment length.
+
+    Returns
+    -------
+    roughness_results: dictionary
+        "{file_name} {region name} {parameter}" for each region and each
+        parameter of profile_roughness.
+
+    See Also
+    --------
+    profile_roughness
+    levelled_regions
+
+    Notes
+    -----
+    The point spacing of each region is its median x step.
+
+    Example
+    -------
+    None
+
+    """
+    roughness_results = {}
+    for region, (x, heights) in regions.items():
+        spacing = np.median(np.diff(x)) if len(x) > 1 else 1.0
+        roughness = profile_roughness(
+            heights=heights,
+            spacing=spacing,
+            segment_length=segment_length)
+        roughness_results.update({
+            f'{file_name} {region} {key}': value
+            for key, value in roughness.items()})
+    return roughness_results
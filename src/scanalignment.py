@@ -0,0 +1,370 @@
+import numpy as np
+
+from src.grating import pad_profiles
+
+
+def resample_profiles(lateral_arrays : list,
+                      profile_arrays : list,
+                      grid : list) -> list:
+    """
+    Linearly interpolate many profiles onto one lateral grid in one call.
+
+    Parameters
+    ----------
+    lateral_arrays, profile_arrays: list
+        Lists of x- and y-data arrays, one pair per profile, each with x
+        increasing.
+    grid: list
+        Common x positions.
+
+    Returns
+    -------
+    resampled: list
+        2D array, one row per profile, NaN outside each profile's x range.
+
+    See Also
+    --------
+    pad_profiles
+    numpy interp
+
+    Notes
+    -----
+    Every profile is offset along x by a multiple of the total x span, so
+    the padded rows join into one increasing array and a single searchsorted
+    call finds the interval of every grid point in every profile.
+
+    Example
+    -------
+    None
+
+    """
+    lateral, lengths = pad_profiles(arrays=lateral_arrays)
+    profiles, _ = pad_profiles(arrays=profile_arrays)
+    grid = np.asarray(grid, dtype=float)
+    rows = np.arange(lengths.size)[:, None]
+    valid = np.arange(lateral.shape[1]) < lengths[:, None]
+    last = lateral[rows[:, 0], lengths - 1]
+    lateral = np.where(valid, lateral, last[:, None])
+    minimum = min(np.nanmin(lateral), grid.min())
+    span = max(np.nanmax(lateral), grid.max()) - minimum + 1
+    offsets = rows * span
+    joined = (lateral - minimum + offsets).ravel()
+    targets = grid[None, :] - minimum + offsets
+    index = np.searchsorted(joined, targets.ravel()).reshape(targets.shape)
+    index -= rows * lateral.shape[1]
+    index = np.clip(index, 1, lengths[:, None] - 1)
+    x0 = lateral[rows, index - 1]
+    x1 = lateral[rows, index]
+    y0 = profiles[rows, index - 1]
+    y1 = profiles[rows, index]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(x1 > x0, (grid - x0) / (x1 - x0), 0)
+    resampled = y0 + t * (y1 - y0)
+    first = lateral[:, 0]
+    outside = (grid < first[:, None]) | (grid > last[:, None])
+    resampled[outside] = np.nan
+    return resampled
+
+
+def slope_correlation(profiles : list,
+                      smoothing : float = 10) -> tuple:
+    """
+    Cross-correlate the smoothed slopes of each resampled scan with the
+    first.
+
+    Parameters
+    ----------
+    profiles: list
+        2D array of scans on a common uniform grid, one row per scan.
+    smoothing: float
+        Standard deviation, in samples, of the Gaussian that smooths the
+        scan slopes before they are matched.
+
+    Returns
+    -------
+    correlation, energy: tuple
+        2D array of circular correlations of each row with the first, lag
+        in samples along axis 1, and the zero lag autocorrelation of each
+        row, so correlation / sqrt(energy * energy[0]) is at most 1.
+
+    See Also
+    --------
+    scan_shifts
+    correlation_peak
+
+    Notes
+    -----
+    The scans are differentiated, so offsets between scans do not bias the
+    match and nothing outside each scan contributes, then correlated as one
+    batched, zero padded rfft. Each spectrum is smoothed with the square
+    root of the Gaussian, as differentiating amplifies high frequency noise
+    that would otherwise swamp the edges.
+
+    Example
+    -------
+    None
+
+    """
+    slopes = np.nan_to_num(np.diff(profiles, axis=1))
+    size = 2 * slopes.shape[1]
+    spectra = np.fft.rfft(slopes, n=size, axis=1)
+    frequency = np.fft.rfftfreq(size)
+    spectra *= np.exp(-0.25 * (2 * np.pi * frequency * smoothing) ** 2)
+    correlation = np.fft.irfft(
+        spectra * np.conj(spectra[0]),
+        n=size,
+        axis=1)
+    energy = np.fft.irfft(np.abs(spectra) ** 2, n=size, axis=1)[:, 0]
+    return correlation, energy
+
+
+def correlation_peak(correlation : list) -> tuple:
+    """
+    Lag and height of the peak of each row of a circular correlation.
+
+    Parameters
+    ----------
+    correlation: list
+        2D array from slope_correlation.
+
+    Returns
+    -------
+    lag, peak: tuple
+        Signed lag of each row's peak in samples, and its height.
+
+    See Also
+    --------
+    slope_correlation
+
+    Notes
+    -----
+    The peak is refined to a fraction of a sample with a parabola through
+    the peak and its two neighbours.
+
+    Example
+    -------
+    None
+
+    """
+    size = correlation.shape[1]
+    peak = np.argmax(correlation, axis=1)
+    rows = np.arange(peak.size)
+    before = correlation[rows, peak - 1]
+    at = correlation[rows, peak]
+    after = correlation[rows, (peak + 1) % size]
+    curvature = before - 2 * at + after
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offset = np.where(
+            curvature < 0,
+            0.5 * (before - after) / curvature,
+            0)
+    lag = peak + offset
+    lag = np.where(lag > size / 2, lag - size, lag)
+    return lag, at - 0.25 * (before - after) * offset
+
+
+def scan_shifts(profiles : list,
+                spacing : float,
+                smoothing : float = 10) -> list:
+    """
+    Lateral shift of each resampled scan relative to the first.
+
+    Parameters
+    ----------
+    profiles: list
+        2D array of scans on a common uniform grid, one row per scan.
+    spacing: float
+        Grid spacing.
+    smoothing: float
+        Standard deviation, in samples, of the Gaussian that smooths the
+        scan slopes before they are matched.
+
+    Returns
+    -------
+    shifts: list
+        x shift of each scan, so that scan(x - shift) lines up with the
+        first scan. The first shift is 0.
+
+    See Also
+    --------
+    resample_profiles
+    slope_correlation
+    correlation_peak
+
+    Notes
+    -----
+    The smoothed slopes are cross-correlated with the first scan's and the
+    correlation peak is found to a fraction of a sample.
+
+    Example
+    -------
+    None
+
+    """
+    correlation, _ = slope_correlation(
+        profiles=profiles,
+        smoothing=smoothing)
+    lag, _ = correlation_peak(correlation=correlation)
+    return lag * spacing
+
+
+def average_scans(lateral_arrays : list,
+                  profile_arrays : list) -> dict:
+    """
+    Align repeated scans of the same feature and average them.
+
+    Parameters
+    ----------
+    lateral_arrays, profile_arrays: list
+        Lists of x- and y-data arrays, one pair per scan.
+
+    Returns
+    -------
+    average: dictionary
+        {
+            "Lateral": common x grid where every scan overlaps,
+            "Profile": mean aligned profile,
+            "Profile Error": standard error of the mean at each point,
+            "Shifts": x shift applied to each scan
+        }
+
+    See Also
+    --------
+    resample_profiles
+    scan_shifts
+
+    Notes
+    -----
+    Scans are resampled onto a uniform grid at the finest median spacing of
+    any scan, shifted to line up with the first scan, and resampled again
+    onto the x range all scans share. Averaging N scans reduces random noise
+    by root N, so a single fit of the average replaces N noisier fits.
+
+    Example
+    -------
+    None
+
+    """
+    lateral_arrays = [np.asarray(x, dtype=float) for x in lateral_arrays]
+    spacing = min(np.median(np.diff(x)) for x in lateral_arrays)
+    start = min(x[0] for x in lateral_arrays)
+    stop = max(x[-1] for x in lateral_arrays)
+    grid = np.arange(start, stop + 0.5 * spacing, spacing)
+    profiles = resample_profiles(
+        lateral_arrays=lateral_arrays,
+        profile_arrays=profile_arrays,
+        grid=grid)
+    shifts = scan_shifts(profiles=profiles, spacing=spacing)
+    shifted = [x - shift for x, shift in zip(lateral_arrays, shifts)]
+    start = max(x[0] for x in shifted)
+    stop = min(x[-1] for x in shifted)
+    grid = grid[(grid >= start) & (grid <= stop)]
+    aligned = resample_profiles(
+        lateral_arrays=shifted,
+        profile_arrays=profile_arrays,
+        grid=grid)
+    count = aligned.shape[0]
+    error = np.std(aligned, axis=0, ddof=1) / np.sqrt(count) if (
+        count > 1) else np.zeros(grid.size)
+    return {
+        "Lateral": grid,
+        "Profile": np.mean(aligned, axis=0),
+        "Profile Error": error,
+        "Shifts": shifts}
+
+
+def match_regions(reference_lateral : list,
+                  reference_profile : list,
+                  regions : list,
+                  lateral : list,
+                  profile : list,
+                  scale_range : float = 0.02,
+                  scale_steps : int = 9,
+                  points : int = 8192) -> dict:
+    """
+    Carry regions of interest from a reference scan over to a new scan.
+
+    Parameters
+    ----------
+    reference_lateral, reference_profile: list
+        x- and y-data arrays of the reference scan.
+    regions: list
+        [range_left, range_right] selected on the reference scan.
+    lateral, profile: list
+        x- and y-data arrays of the new scan.
+    scale_range: float
+        Largest fractional difference in lateral scale tried, 0 to match
+        the offset only.
+    scale_steps: int
+        Number of scales tried across +/- scale_range.
+    points: int
+        Largest number of grid points the scans are matched on.
+
+    Returns
+    -------
+    match: dictionary
+        {
+            "Regions": regions moved onto the new scan,\n
+            "Offset": lateral offset (mm),\n
+            "Scale": lateral scale,\n
+            "Score": normalised correlation of the matched slopes, 1 for
+            a perfect match
+        }
+        where a reference position x is at scale * x + offset on the new
+        scan.
+
+    See Also
+    --------
+    slope_correlation
+    scan_shifts
+
+    Notes
+    -----
+    The reference is stretched by every trial scale about x = 0 and
+    resampled, with the new scan, onto one uniform grid, so every scale is
+    matched by the same batched FFT cross-correlation. The scale with the
+    highest normalised peak wins, and its peak gives the offset to a
+    fraction of a grid step. Scans are matched on at most points grid
+    points, which keeps million point scans to a few milliseconds.
+
+    Example
+    -------
+    >>> match = match_regions(
+    ...     reference_lateral=x_ref,
+    ...     reference_profile=y_ref,
+    ...     regions=[[0.2, 0.8], [1.2, 1.8]],
+    ...     lateral=x,
+    ...     profile=y)
+
+    """
+    reference_lateral = np.asarray(reference_lateral, dtype=float)
+    lateral = np.asarray(lateral, dtype=float)
+    scales = np.linspace(
+        1 - scale_range,
+        1 + scale_range,
+        scale_steps if scale_range > 0 else 1)
+    stretched = [reference_lateral * scale for scale in scales]
+    start = min(lateral[0], min(x[0] for x in stretched))
+    stop = max(lateral[-1], max(x[-1] for x in stretched))
+    spacing = max(
+        min(np.median(np.diff(x)) for x in (reference_lateral, lateral)),
+        (stop - start) / points)
+    grid = np.arange(start, stop + 0.5 * spacing, spacing)
+    profiles = resample_profiles(
+        lateral_arrays=[lateral] + stretched,
+        profile_arrays=[profile] + [reference_profile] * scales.size,
+        grid=grid)
+    correlation, energy = slope_correlation(profiles=profiles)
+    lag, peak = correlation_peak(correlation=correlation)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.nan_to_num(peak[1:] / np.sqrt(energy[1:] * energy[0]))
+    best = np.argmax(scores)
+    scale = scales[best]
+    offset = -lag[best + 1] * spacing
+    return {
+        "Regions": [
+            [scale * bound + offset for bound in x_range]
+            for x_range in regions],
+        "Offset": offset,
+        "Scale": scale,
+        "Score": scores[best]}
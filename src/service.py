@@ -0,0 +1,492 @@
+import os
+import json
+import time
+import base64
+import tempfile
+import threading
+import numpy as np
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor
+
+from src.fileIO import convert, read_thickness_file
+from src.edgedetection import edge_widths
+from src.manifest import initialise_worker
+from src.datalevelling import (
+    level_film_thickness, level_film_thicknesses, suggest_regions)
+
+
+def job_arrays(job : dict) -> list:
+    """
+    Get the profile of a service job from raw arrays or an uploaded file.
+
+    Parameters
+    ----------
+    job: dictionary
+        Job dictionary containing either "lateral" and "profile" lists, or
+        the uploaded file as "text" or base64 encoded "content", with its
+        "file_name" and an optional "file_type".
+
+    Returns
+    -------
+    lateral, profile: list
+        x- and y-data arrays.
+
+    See Also
+    --------
+    read_thickness_file
+
+    Notes
+    -----
+    Uploads are written to a temporary directory under their own file name
+    and read with read_thickness_file, so they are sniffed, decompressed and
+    parsed exactly as files on disk are.
+
+    Example
+    -------
+    None
+
+    """
+    if "lateral" in job:
+        return (
+            np.asarray(job["lateral"], dtype=float),
+            np.asarray(job["profile"], dtype=float))
+    if "content" in job:
+        content = base64.b64decode(job["content"])
+    else:
+        content = job["text"].encode()
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(
+            directory,
+            os.path.basename(job.get("file_name", "upload.csv")))
+        with open(file_path, 'wb') as outfile:
+            outfile.write(content)
+        return read_thickness_file(
+            file_path=file_path,
+            file_type=job.get("file_type"))
+
+
+def run_height_jobs(jobs : list,
+                    start : int = 0) -> list:
+    """
+    Measure the step height of every job with batched polynomial fits.
+
+    Parameters
+    ----------
+    jobs: list
+        Job dictionaries, see job_arrays, each with a "file_name", optional
+        "regions" [[base start, base end], [step start, step end]] and
+        optional "polynomial_order" (default 2).
+    start: int
+        Request index of the first job, used to name jobs without a
+        "file_name" "Job {index}".
+
+    Returns
+    -------
+    results: list
+        Results dictionary for each job, or {"{file name} Error": message}.
+
+    See Also
+    --------
+    level_film_thicknesses
+    suggest_regions
+
+    Notes
+    -----
+    Runs in a worker process. Jobs without regions use suggest_regions.
+    Jobs of the same polynomial order are fitted in one batched solve; if
+    the batch fails, its jobs are fitted one at a time so a bad job only
+    fails itself.
+
+    Example
+    -------
+    None
+
+    """
+    results = [None] * len(jobs)
+    groups = {}
+    for index, job in enumerate(jobs):
+        file_name = job.get("file_name", f'Job {start + index}')
+        try:
+            lateral, profile = job_arrays(job=job)
+            regions = job.get("regions") or suggest_regions(
+                x=lateral,
+                y=profile)
+            if regions[0] is None:
+                raise ValueError('no regions given or found')
+        except Exception as error:
+            results[index] = {f'{file_name} Error': str(error)}
+            continue
+        groups.setdefault(job.get("polynomial_order", 2), []).append(
+            (index, file_name, lateral, profile, regions))
+    for polynomial_order, group in groups.items():
+        indices, file_names, laterals, profiles, regions = zip(*group)
+        try:
+            step_results = level_film_thicknesses(
+                x_arrays=laterals,
+                y_arrays=profiles,
+                ranges_left=[region[0] for region in regions],
+                ranges_right=[region[1] for region in regions],
+                file_names=file_names,
+                polynomial_order=polynomial_order)
+            for index, file_name in zip(indices, file_names):
+                results[index] = {
+                    key: value for key, value in step_results.items()
+                    if key.startswith(f'{file_name} ')}
+        except Exception:
+            for index, file_name, lateral, profile, region in group:
+                try:
+                    results[index] = level_film_thickness(
+                        x_array=lateral,
+                        y_array=profile,
+                        range_left=region[0],
+                        range_right=region[1],
+                        file_name=file_name,
+                        polynomial_order=polynomial_order)
+                except Exception as error:
+                    results[index] = {f'{file_name} Error': str(error)}
+    return results
+
+
+def run_width_jobs(jobs : list,
+                   start : int = 0) -> list:
+    """
+    Measure the feature width of every job from its detected edges.
+
+    Parameters
+    ----------
+    jobs: list
+        Job dictionaries, see job_arrays, each with a "file_name" and
+        optional "height_fraction" (default 0.5).
+    start: int
+        Request index of the first job, see run_height_jobs.
+
+    Returns
+    -------
+    results: list
+        {"{file name} Width", "{file name} Width Error", "{file name} Edges"}
+        for each job, or {"{file name} Error": message}.
+
+    See Also
+    --------
+    edge_widths
+
+    Notes
+    -----
+    Runs in a worker process. Jobs with the same height fraction are
+    processed together as one padded array; if the batch fails, its jobs
+    are processed one at a time so a bad job only fails itself.
+
+    Example
+    -------
+    None
+
+    """
+    results = [None] * len(jobs)
+    groups = {}
+    for index, job in enumerate(jobs):
+        file_name = job.get("file_name", f'Job {start + index}')
+        try:
+            lateral, profile = job_arrays(job=job)
+        except Exception as error:
+            results[index] = {f'{file_name} Error': str(error)}
+            continue
+        groups.setdefault(job.get("height_fraction", 0.5), []).append(
+            (index, file_name, lateral, profile))
+    for height_fraction, group in groups.items():
+        try:
+            group_results = width_results(
+                group=group,
+                height_fraction=height_fraction)
+        except Exception:
+            group_results = []
+            for member in group:
+                try:
+                    group_results += width_results(
+                        group=[member],
+                        height_fraction=height_fraction)
+                except Exception as error:
+                    group_results.append({f'{member[1]} Error': str(error)})
+        for (index, *_), result in zip(group, group_results):
+            results[index] = result
+    return results
+
+
+def width_results(group : list,
+                  height_fraction : float) -> list:
+    """
+    Measure the widths of (index, file name, lateral, profile) jobs in one
+    edge_widths call and return their results dictionaries in order.
+    """
+    _, file_names, laterals, profiles = zip(*group)
+    edges = edge_widths(
+        lateral_arrays=laterals,
+        profile_arrays=profiles,
+        height_fraction=height_fraction)
+    return [
+        {
+            f'{file_name} Width': edges["Widths"][position],
+            f'{file_name} Width Error': edges["Width Errors"][position],
+            f'{file_name} Edges': [
+                edges["Left Edges"][position],
+                edges["Right Edges"][position]]}
+        for position, file_name in enumerate(file_names)]
+
+
+def json_values(value : object) -> object:
+    """
+    Copy of value with numpy types converted to python ones and NaN and
+    infinite floats replaced by None, so it can be sent as strict JSON.
+    """
+    if isinstance(value, dict):
+        return {key: json_values(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_values(item) for item in value]
+    if isinstance(value, (np.generic, np.ndarray)):
+        return json_values(convert(value))
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def warm_worker(delay : float = 0.2) -> int:
+    """
+    Return the worker process id, once its imports and setup are done.
+    Waiting for delay keeps each warm-up call on a worker of its own.
+    """
+    time.sleep(delay)
+    return os.getpid()
+
+
+job_runners = {
+    "height": run_height_jobs,
+    "width": run_width_jobs}
+
+
+class AnalysisService:
+    """
+    Warm worker pool that runs batches of height and width jobs.
+
+    Parameters
+    ----------
+    workers: int
+        Number of worker processes, default one per CPU.
+    max_pending: int
+        Maximum number of requests queued or running at once. Further
+        requests are refused until one finishes.
+    batch_size: int
+        Maximum number of jobs sent to a worker in one go. Larger requests
+        are split across workers.
+    cache_path: string
+        Result cache disk tier directory, None or "" for memory only.
+    cache_size: float
+        Maximum size of the result cache disk tier in MB.
+
+    """
+
+    def __init__(self,
+                 workers : int = None,
+                 max_pending : int = 8,
+                 batch_size : int = 32,
+                 cache_path : str = None,
+                 cache_size : float = 256):
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=initialise_worker,
+            initargs=(cache_path, cache_size))
+        self.pids = sorted(set(self.pool.map(
+            warm_worker,
+            [0.2] * self.workers)))
+
+    def run(self,
+            process : str,
+            jobs : list,
+            timeout : float = 0) -> list:
+        """
+        Run jobs of one process, "height" or "width", on the worker pool.
+
+        Returns the results in job order, or None if max_pending requests
+        are already running and no slot frees up within timeout seconds.
+        Raises KeyError for an unknown process, and RuntimeError if a worker
+        fails, once every chunk has finished.
+        """
+        runner = job_runners[process]
+        if not self.slots.acquire(timeout=timeout):
+            return None
+        try:
+            futures = [
+                self.pool.submit(
+                    runner,
+                    jobs[start: start + self.batch_size],
+                    start)
+                for start in range(0, len(jobs), self.batch_size)]
+            results, failures = [], []
+            for future in futures:
+                try:
+                    results += future.result()
+                except Exception as error:
+                    failures.append(str(error) or type(error).__name__)
+            if failures:
+                raise RuntimeError(f'worker failed: {"; ".join(failures)}')
+            return results
+        finally:
+            self.slots.release()
+
+    def close(self) -> None:
+        """
+        Shut the worker pool down.
+        """
+        self.pool.shutdown()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP front end for AnalysisService.
+
+    GET /health returns the worker process ids. POST /height and POST /width
+    take {"jobs": [job, ...]}, or a single job dictionary, and return
+    {"results": [results, ...]} in job order. POST /batch takes
+    {"jobs": [...]} with a "process" entry in each job. See job_arrays,
+    run_height_jobs and run_width_jobs for the job dictionaries.
+
+    """
+
+    def send_json(self,
+                  status : int,
+                  dictionary : dict) -> None:
+        """
+        Send dictionary as a JSON response, with NaN and infinite values
+        sent as null so that strict JSON parsers accept it.
+        """
+        body = json.dumps(json_values(dictionary), allow_nan=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip('/') != '/health':
+            self.send_json(404, {"error": f'unknown path {self.path}'})
+            return
+        service = self.server.service
+        self.send_json(200, {
+            "status": "ok",
+            "workers": service.workers,
+            "pids": service.pids})
+
+    def do_POST(self) -> None:
+        process = self.path.strip('/')
+        if process not in ("height", "width", "batch"):
+            self.send_json(404, {"error": f'unknown path {self.path}'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as error:
+            self.send_json(400, {"error": f'invalid JSON: {error}'})
+            return
+        if not isinstance(request, dict):
+            self.send_json(400, {"error": 'request must be a JSON object'})
+            return
+        jobs = request.get("jobs", [request])
+        if not isinstance(jobs, list) or not all(
+                isinstance(job, dict) for job in jobs):
+            self.send_json(400, {"error": '"jobs" must be a list of objects'})
+            return
+        try:
+            if process == "batch":
+                results = self.run_batch(jobs=jobs)
+            else:
+                results = self.server.service.run(
+                    process=process,
+                    jobs=jobs,
+                    timeout=self.server.queue_timeout)
+        except RuntimeError as error:
+            self.send_json(500, {"error": str(error)})
+            return
+        if results is None:
+            self.send_json(503, {"error": 'service busy, try again'})
+            return
+        self.send_json(200, {"results": results})
+
+    def run_batch(self,
+                  jobs : list) -> list:
+        """
+        Run a mixed list of jobs, grouped by their "process" entry.
+        """
+        results = [None] * len(jobs)
+        groups = {}
+        for index, job in enumerate(jobs):
+            process = job.get("process", "height")
+            if process not in job_runners:
+                results[index] = {"Error": f'unknown process {process}'}
+                continue
+            groups.setdefault(process, []).append(index)
+        for process, indices in groups.items():
+            group_results = self.server.service.run(
+                process=process,
+                jobs=[
+                    dict({"file_name": f'Job {index}'}, **jobs[index])
+                    for index in indices],
+                timeout=self.server.queue_timeout)
+            if group_results is None:
+                return None
+            for index, result in zip(indices, group_results):
+                results[index] = result
+        return results
+
+    def log_message(self, *args) -> None:
+        if self.server.verbose:
+            super().log_message(*args)
+
+
+def serve(host : str = '127.0.0.1',
+          port : int = 8765,
+          service : AnalysisService = None,
+          queue_timeout : float = 30,
+          verbose : bool = False) -> ThreadingHTTPServer:
+    """
+    Create the HTTP server for an analysis service.
+
+    Parameters
+    ----------
+    host, port: string, int
+        Address to listen on. Port 0 picks a free port.
+    service: AnalysisService
+        Warm worker pool, a new default one if None.
+    queue_timeout: float
+        Seconds a request waits for a free slot before a 503 response.
+    verbose: bool
+        If True, log every request.
+
+    Returns
+    -------
+    server: ThreadingHTTPServer
+        Server with the service attached. Call serve_forever to run it,
+        and shutdown, server_close and service.close to stop it.
+
+    See Also
+    --------
+    AnalysisService
+    ServiceHandler
+
+    Notes
+    -----
+    Each connection is handled on its own thread and requests are limited
+    by the service's max_pending. Listens on localhost only by default.
+
+    Example
+    -------
+    >>> server = serve(port=8765)
+    >>> server.serve_forever()
+
+    """
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.service = service or AnalysisService()
+    server.queue_timeout = queue_timeout
+    server.verbose = verbose
+    return server
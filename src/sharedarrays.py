@@ -0,0 +1,429 @@
+import numpy as np
+
+from dataclasses import dataclass
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+
+@dataclass(frozen=True)
+class ArrayHandle:
+    """
+    Lightweight, picklable reference to an array in shared memory.
+
+    Attributes
+    ----------
+    name: string
+        Shared memory segment name.
+    shape: tuple
+        Array shape.
+    dtype: string
+        Array data type string, e.g. "<f8".
+    offset: int
+        Byte offset of the array from the start of the segment.
+
+    """
+
+    name : str
+    shape : tuple
+    dtype : str
+    offset : int = 0
+
+
+def segment_view(segment : shared_memory.SharedMemory,
+                 handle : ArrayHandle,
+                 writeable : bool = False) -> list:
+    """
+    Get an array view of a handle's data in an open shared memory segment.
+
+    Parameters
+    ----------
+    segment: SharedMemory
+        Open segment named by the handle.
+    handle: ArrayHandle
+        Shape, dtype and offset of the array in the segment.
+    writeable: bool
+        If True, the view can be written to.
+
+    Returns
+    -------
+    array: list
+        Array view of the segment memory. No data is copied.
+
+    See Also
+    --------
+    attached
+    SharedArrayPool
+
+    Notes
+    -----
+    The view keeps the segment's memory mapping in use, so the segment
+    cannot be closed while the view exists, see close_segment.
+
+    Example
+    -------
+    None
+
+    """
+    array = np.ndarray(
+        shape=handle.shape,
+        dtype=np.dtype(handle.dtype),
+        buffer=segment.buf,
+        offset=handle.offset)
+    array.flags.writeable = writeable
+    return array
+
+
+def close_segment(segment : shared_memory.SharedMemory) -> bool:
+    """
+    Close a shared memory segment if no array views of it are in use.
+
+    Parameters
+    ----------
+    segment: SharedMemory
+        Open segment.
+
+    Returns
+    -------
+    closed: bool
+        True if the segment was closed, False if array views of it are
+        still in use.
+
+    See Also
+    --------
+    segment_view
+    SharedArrayPool
+
+    Notes
+    -----
+    A segment with views still in use cannot be closed. Its mapping is
+    then released along with the last view, so the caller only has to keep
+    the segment object alive until then.
+
+    Example
+    -------
+    None
+
+    """
+    try:
+        segment.close()
+    except BufferError:
+        return False
+    return True
+
+
+def open_segment(name : str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing shared memory segment without taking ownership.
+
+    Parameters
+    ----------
+    name: string
+        Segment name, from an ArrayHandle.
+
+    Returns
+    -------
+    segment: SharedMemory
+        Open segment.
+
+    See Also
+    --------
+    attached
+
+    Notes
+    -----
+    On Python 3.13 and later the segment is not registered with this
+    process's resource tracker, so a worker exiting does not remove memory
+    owned by the main process. Earlier versions have no track argument and
+    attach as usual.
+
+    Example
+    -------
+    None
+
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+@contextmanager
+def attached(handles : list) -> list:
+    """
+    Attach to arrays in shared memory for the duration of a with block.
+
+    Parameters
+    ----------
+    handles: list
+        Array handles, from SharedArrayPool.
+
+    Yields
+    ------
+    arrays: list
+        Read only array view of each handle. No data is copied.
+
+    See Also
+    --------
+    SharedArrayPool
+
+    Notes
+    -----
+    Used in worker processes. Each segment is opened once however many of
+    the handles refer to it, and closed, but not removed, on leaving the
+    block. The pool that created the segments removes them.
+
+    Example
+    -------
+    >>> with attached(handles=handles) as (lateral, profile):
+    ...     results = process(lateral, profile)
+
+    """
+    segments = {}
+    try:
+        for handle in handles:
+            if handle.name not in segments:
+                segments[handle.name] = open_segment(name=handle.name)
+        yield [
+            segment_view(segment=segments[handle.name], handle=handle)
+            for handle in handles]
+    finally:
+        for segment in segments.values():
+            close_segment(segment=segment)
+
+
+class SharedArrayPool:
+    """
+    Owner of the shared memory segments that hold arrays for worker
+    processes.
+
+    Arrays are written into shared memory once, by the process that reads
+    them, and only their handles (segment name, shape, dtype and offset) are
+    sent to workers, which attach to the same memory without copying it.
+
+    Parameters
+    ----------
+    None
+
+    See Also
+    --------
+    ArrayHandle
+    attached
+
+    Notes
+    -----
+    Arrays allocated together share one segment, each starting on a 64 byte
+    boundary. Segments are removed when released, and every segment still
+    held is removed when the pool is closed, including when an error leaves
+    a with block. If the owning process is killed, the multiprocessing
+    resource tracker removes its segments.
+
+    Example
+    -------
+    >>> with SharedArrayPool() as pool:
+    ...     handles = pool.put(arrays=[lateral, profile])
+    ...     future = executor.submit(work, handles)
+    ...     pool.release(handle=handles[0])
+
+    """
+
+    alignment = 64
+
+    def __init__(self):
+        self.segments = {}
+        self.retained = []
+
+    def allocate(self,
+                 shapes : list,
+                 dtype : str = 'float64') -> tuple:
+        """
+        Allocate one segment holding an array of each shape.
+
+        Parameters
+        ----------
+        shapes: list
+            Shape of each array.
+        dtype: string
+            Data type of every array.
+
+        Returns
+        -------
+        handles, views: tuple
+            Handle and writeable view of each new array, so a reader can
+            write data straight into shared memory.
+
+        See Also
+        --------
+        put
+        release
+
+        Notes
+        -----
+        Each array starts on an alignment byte boundary. The contents are
+        not initialised.
+
+        Example
+        -------
+        >>> handles, (lateral, profile) = pool.allocate(
+        ...     shapes=[(rows,), (rows,)])
+
+        """
+        dtype = np.dtype(dtype)
+        offsets = []
+        size = 0
+        for shape in shapes:
+            offsets.append(size)
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            size += -(-nbytes // self.alignment) * self.alignment
+        segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.segments[segment.name] = segment
+        handles = [
+            ArrayHandle(
+                name=segment.name,
+                shape=tuple(int(length) for length in shape),
+                dtype=dtype.str,
+                offset=offset)
+            for shape, offset in zip(shapes, offsets)]
+        return handles, [
+            segment_view(segment=segment, handle=handle, writeable=True)
+            for handle in handles]
+
+    def put(self,
+            arrays : list) -> list:
+        """
+        Copy arrays into one new segment.
+
+        Parameters
+        ----------
+        arrays: list
+            Arrays to share.
+
+        Returns
+        -------
+        handles: list
+            Handle of each array, in order.
+
+        See Also
+        --------
+        allocate
+
+        Notes
+        -----
+        All arrays are stored with their common result type.
+
+        Example
+        -------
+        >>> handles = pool.put(arrays=[lateral, profile])
+
+        """
+        arrays = [np.asarray(array) for array in arrays]
+        handles, views = self.allocate(
+            shapes=[array.shape for array in arrays],
+            dtype=np.result_type(*arrays))
+        for view, array in zip(views, arrays):
+            view[...] = array
+        return handles
+
+    def views(self,
+              handles : list) -> list:
+        """
+        Get read only views of arrays held by this pool.
+
+        Parameters
+        ----------
+        handles: list
+            Handles of arrays in segments of this pool.
+
+        Returns
+        -------
+        arrays: list
+            Read only array view of each handle.
+
+        See Also
+        --------
+        attached
+
+        Notes
+        -----
+        Lets the owning process use the shared arrays without attaching to
+        its own segments.
+
+        Example
+        -------
+        None
+
+        """
+        return [
+            segment_view(segment=self.segments[handle.name], handle=handle)
+            for handle in handles]
+
+    def release(self,
+                handle : ArrayHandle) -> None:
+        """
+        Remove the segment holding handle's array, and every array in it.
+
+        Parameters
+        ----------
+        handle: ArrayHandle
+            Handle of any array in the segment.
+
+        Returns
+        -------
+        None
+
+        See Also
+        --------
+        close
+        close_segment
+
+        Notes
+        -----
+        Segments already released are ignored. The segment is unlinked at
+        once, so no new process can attach to it. If views of it are still
+        in use, it is kept open until the pool is discarded, and its memory
+        is freed with the last view.
+
+        Example
+        -------
+        None
+
+        """
+        segment = self.segments.pop(handle.name, None)
+        if segment is None:
+            return
+        if not close_segment(segment=segment):
+            self.retained.append(segment)
+        segment.unlink()
+
+    def close(self) -> None:
+        """
+        Remove every segment still held.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+
+        See Also
+        --------
+        release
+
+        Notes
+        -----
+        Called on leaving a with block, including on an error.
+
+        Example
+        -------
+        None
+
+        """
+        for name in list(self.segments):
+            self.release(handle=ArrayHandle(name=name, shape=(), dtype=''))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
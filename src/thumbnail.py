@@ -0,0 +1,416 @@
+import zlib
+import struct
+import numpy as np
+
+from pathlib import Path
+
+
+colours = {
+    "b": (0, 0, 255),
+    "r": (255, 0, 0),
+    "g": (0, 128, 0),
+    "frame": (96, 96, 96),
+    "grid": (224, 224, 224),
+    "background": (255, 255, 255)}
+
+
+def png_bytes(image : np.ndarray,
+              level : int = 6) -> bytes:
+    """
+    Encode an image as PNG.
+
+    Parameters
+    ----------
+    image: array
+        (height, width, 3) uint8 RGB image.
+    level: int
+        zlib compression level.
+
+    Returns
+    -------
+    png: bytes
+        PNG file contents.
+
+    See Also
+    --------
+    write_png
+
+    Notes
+    -----
+    Rows are stored unfiltered in a single IDAT chunk, which suits the flat
+    colours of a line drawing. Only the standard library zlib and struct are
+    used.
+
+    Example
+    -------
+    None
+
+    """
+    height, width, _ = image.shape
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, -1)
+
+    def chunk(tag : bytes, data : bytes) -> bytes:
+        return b''.join([
+            struct.pack('>I', len(data)),
+            tag,
+            data,
+            struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)])
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(raw.tobytes(), level)),
+        chunk(b'IEND', b'')])
+
+
+def write_png(out_path : str,
+              image : np.ndarray) -> None:
+    """
+    Save an (height, width, 3) uint8 RGB image as a PNG file.
+    """
+    Path(out_path).write_bytes(png_bytes(image=image))
+
+
+def data_limits(traces : list) -> tuple:
+    """
+    x and y limits of a panel's traces, with 5 % of the y range as margin.
+    """
+    xs = [np.asarray(x, dtype=float) for x, _, _ in traces]
+    ys = [np.asarray(y, dtype=float) for _, y, _ in traces]
+    x_min = min(np.nanmin(x) for x in xs)
+    x_max = max(np.nanmax(x) for x in xs)
+    y_min = min(np.nanmin(y) for y in ys)
+    y_max = max(np.nanmax(y) for y in ys)
+    if x_max <= x_min:
+        x_min, x_max = x_min - 1, x_max + 1
+    if y_max <= y_min:
+        y_min, y_max = y_min - 1, y_max + 1
+    margin = 0.05 * (y_max - y_min)
+    return (x_min, x_max), (y_min - margin, y_max + margin)
+
+
+def column_spans(columns : np.ndarray,
+                 rows : np.ndarray,
+                 line : bool) -> tuple:
+    """
+    Pixel rows covered by a trace in each pixel column.
+
+    Parameters
+    ----------
+    columns, rows: array
+        Pixel column and row of every data point.
+    line: bool
+        If True, consecutive points are joined, otherwise only the points
+        themselves are covered.
+
+    Returns
+    -------
+    first, low, high: tuple
+        First pixel column of the trace, and arrays of the lowest and
+        highest row covered in each column from there to its last column.
+
+    See Also
+    --------
+    draw_trace
+
+    Notes
+    -----
+    The trace is reduced to the minimum and maximum row of each column,
+    which keeps every spike however many points share a column, so a
+    million point scan costs two reductions and a few hundred pixels. Joined
+    traces are interpolated across columns without data and each column is
+    stretched to meet the next.
+
+    Example
+    -------
+    None
+
+    """
+    if np.any(np.diff(columns) < 0):
+        order = np.argsort(columns, kind='stable')
+        columns, rows = columns[order], rows[order]
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    occupied = columns[starts]
+    first = occupied[0]
+    span = occupied[-1] - first + 1
+    low = np.full(span, np.iinfo(np.int64).max)
+    high = np.full(span, np.iinfo(np.int64).min)
+    low[occupied - first] = np.minimum.reduceat(rows, starts)
+    high[occupied - first] = np.maximum.reduceat(rows, starts)
+    if line:
+        entry = np.interp(
+            np.arange(first, first + span),
+            occupied,
+            rows[starts]).round().astype(np.int64)
+        low = np.minimum(low, entry)
+        high = np.maximum(high, entry)
+        low[:-1] = np.minimum(low[:-1], entry[1:])
+        high[:-1] = np.maximum(high[:-1], entry[1:])
+    return first, low, high
+
+
+def draw_trace(canvas : np.ndarray,
+               x : np.ndarray,
+               y : np.ndarray,
+               colour : tuple,
+               limits : tuple,
+               line : bool = True,
+               line_width : int = 2) -> None:
+    """
+    Draw one trace into a panel of the canvas.
+
+    Parameters
+    ----------
+    canvas: array
+        (height, width, 3) uint8 panel view, drawn into in place.
+    x, y: array
+        Data arrays.
+    colour: tuple
+        RGB colour.
+    limits: tuple
+        ((x_min, x_max), (y_min, y_max)) data limits of the panel.
+    line: bool
+        If True, joins the points, otherwise draws them as dots.
+    line_width: int
+        Line width in pixels.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    column_spans
+
+    Notes
+    -----
+    Non-finite points and points outside the limits are left out.
+
+    Example
+    -------
+    None
+
+    """
+    height, width, _ = canvas.shape
+    (x_min, x_max), (y_min, y_max) = limits
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    columns = np.round(
+        (x[finite] - x_min) / (x_max - x_min) * (width - 1)).astype(np.int64)
+    rows = np.round(
+        (y_max - y[finite]) / (y_max - y_min) * (height - 1)).astype(np.int64)
+    inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+    if not np.any(inside):
+        return
+    first, low, high = column_spans(
+        columns=columns[inside],
+        rows=rows[inside],
+        line=line)
+    pixels = np.arange(height)[:, None]
+    mask = (pixels >= low) & (pixels <= high)
+    for shift in range(1, line_width):
+        mask[:, shift:] |= mask[:, :-shift].copy()
+        mask[shift:, :] |= mask[:-shift, :].copy()
+    canvas[:, first: first + mask.shape[1]][mask] = colour
+
+
+def draw_panel(canvas : np.ndarray,
+               traces : list,
+               vertical_lines : list = (),
+               line : bool = True,
+               grid : bool = False,
+               line_width : int = 2) -> None:
+    """
+    Draw a framed panel of traces into a canvas view.
+
+    Parameters
+    ----------
+    canvas: array
+        (height, width, 3) uint8 panel view, drawn into in place.
+    traces: list
+        (x, y, colour) for each trace, drawn in order.
+    vertical_lines: list
+        x positions of red region of interest markers.
+    line: bool
+        If True, joins the points of the first trace, otherwise draws them
+        as dots. Later traces are always joined.
+    grid: bool
+        If True, draws a light 4 x 4 grid.
+    line_width: int
+        Line width in pixels.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    render_panels
+
+    Notes
+    -----
+    Each panel is scaled to its own traces, as matplotlib autoscaling does.
+
+    Example
+    -------
+    None
+
+    """
+    limits = data_limits(traces=traces)
+    plot = canvas[1:-1, 1:-1]
+    height, width, _ = plot.shape
+    if grid:
+        for fraction in (0.25, 0.5, 0.75):
+            plot[int(fraction * (height - 1)), :] = colours["grid"]
+            plot[:, int(fraction * (width - 1))] = colours["grid"]
+    for index, (x, y, colour) in enumerate(traces):
+        draw_trace(
+            canvas=plot,
+            x=x,
+            y=y,
+            colour=colours.get(colour, colour),
+            limits=limits,
+            line=line or index > 0,
+            line_width=line_width)
+    (x_min, x_max), _ = limits
+    for position in vertical_lines:
+        column = int(round((position - x_min) / (x_max - x_min) * (width - 1)))
+        if 0 <= column < width:
+            plot[:, column: column + line_width] = colours["r"]
+    canvas[[0, -1], :] = colours["frame"]
+    canvas[:, [0, -1]] = colours["frame"]
+
+
+def render_panels(panels : list,
+                  size : tuple,
+                  out_path : str,
+                  line_width : int = 2) -> np.ndarray:
+    """
+    Draw panels side by side and save them as a PNG thumbnail.
+
+    Parameters
+    ----------
+    panels: list
+        Keyword arguments of draw_panel for each panel, left to right.
+    size: tuple
+        (width, height) of the thumbnail in pixels.
+    out_path: string
+        Path to save, or None to only return the image.
+    line_width: int
+        Line width in pixels.
+
+    Returns
+    -------
+    image: array
+        (height, width, 3) uint8 RGB image.
+
+    See Also
+    --------
+    draw_panel
+    png_bytes
+
+    Notes
+    -----
+    Thumbnails carry no axes labels, tick labels or legends, only the
+    traces in their matplotlib colours, as a quick visual check of a fit.
+
+    Example
+    -------
+    >>> render_panels(
+    ...     panels=[{"traces": [(x, y, "b"), (x, baseline, "r")]}],
+    ...     size=(320, 180),
+    ...     out_path="/Path/To/Sample_Height.png")
+
+    """
+    width, height = (int(value) for value in size)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[...] = colours["background"]
+    edges = np.linspace(0, width, len(panels) + 1).astype(int)
+    gap = 4
+    for panel, left, right in zip(panels, edges[:-1], edges[1:]):
+        draw_panel(
+            canvas=image[gap: height - gap, left + gap: right - gap],
+            line_width=line_width,
+            **panel)
+    if out_path is not None:
+        write_png(out_path=out_path, image=image)
+    return image
+
+
+def thumbnail_size(plot_dict : dict,
+                   panels : int = 1) -> tuple:
+    """
+    Thumbnail (width, height) in pixels, from plot_dict "thumbnail_size"
+    per panel, default [240, 180].
+    """
+    width, height = (plot_dict or {}).get("thumbnail_size", [240, 180])
+    return width * panels, height
+
+
+def thumbnail_profile(x, y, label, xlabel, ylabel, out_path,
+                      line=False, vertical_lines=(), text_string=None,
+                      plot_dict=None) -> None:
+    """
+    Thumbnail of a profile with optional region markers, taking the
+    arguments of render_profile. Labels and text are not drawn.
+    """
+    render_panels(
+        panels=[{
+            "traces": [(x, y, "b")],
+            "vertical_lines": vertical_lines,
+            "line": line,
+            "grid": (plot_dict or {}).get("grid") == "True"}],
+        size=thumbnail_size(plot_dict=plot_dict),
+        out_path=out_path)
+
+
+def thumbnail_xy_roi(x_array : list,
+                     y_array : list,
+                     x1 : float,
+                     x2 : float,
+                     text_string : str,
+                     plot_dict : dict,
+                     out_path : str) -> None:
+    """
+    Thumbnail of a region of interest figure, taking the arguments of
+    render_xy_roi. The text box is not drawn.
+    """
+    render_panels(
+        panels=[{
+            "traces": [(x_array, y_array, "b")],
+            "vertical_lines": [x1, x2],
+            "grid": plot_dict.get("grid") == "True"}],
+        size=thumbnail_size(plot_dict=plot_dict),
+        out_path=out_path)
+
+
+def thumbnail_dektak_thicknesses(x_array : list,
+                                 y_array : list,
+                                 y_baseline : list,
+                                 step_height : float,
+                                 plot_dict : dict,
+                                 out_path : str) -> None:
+    """
+    Thumbnail of a Dektak step height figure, taking the arguments of
+    render_dektak_thicknesses: the data and baseline on the left and the
+    levelled data, step and zero on the right.
+    """
+    x_array = np.asarray(x_array, dtype=float)
+    levelled = np.asarray(y_array, dtype=float) - y_baseline
+    ends = [np.nanmin(x_array), np.nanmax(x_array)]
+    grid = plot_dict.get("grid") == "True"
+    render_panels(
+        panels=[
+            {
+                "traces": [(x_array, y_array, "b"), (x_array, y_baseline, "r")],
+                "grid": grid},
+            {
+                "traces": [
+                    (x_array, levelled, "b"),
+                    (ends, [step_height, step_height], "r"),
+                    (ends, [0, 0], "g")],
+                "grid": grid}],
+        size=thumbnail_size(plot_dict=plot_dict, panels=2),
+        out_path=out_path)
@@ -0,0 +1,428 @@
+import os
+import json
+import time
+import socket
+import hashlib
+
+from pathlib import Path
+
+from src.fileIO import convert, load_json, save_json_dicts
+from src.filepaths import output_directory
+from src.manifest import (
+    load_batches, schedule_file_jobs, batch_processes, batch_results,
+    run_file_jobs, initialise_worker, process_suffixes)
+
+
+def queue_paths(queue_path : str) -> dict:
+    """
+    Directories of a work queue.
+
+    Parameters
+    ----------
+    queue_path: string
+        Queue directory, on a share every machine can reach.
+
+    Returns
+    -------
+    paths: dictionary
+        {
+            "tasks": one json file per input file and its jobs,\n
+            "leases": one lease file per task being worked on,\n
+            "results": one json file per finished task
+        }
+
+    See Also
+    --------
+    enqueue_manifest
+
+    Notes
+    -----
+    None
+
+    Example
+    -------
+    None
+
+    """
+    return {
+        name: Path(f'{queue_path}/{name}')
+        for name in ("tasks", "leases", "results")}
+
+
+def write_atomic(out_path : str,
+                 dictionary : dict) -> None:
+    """
+    Write a json file so that readers only ever see the complete file.
+    """
+    temporary = Path(f'{out_path}.{socket.gethostname()}.{os.getpid()}.tmp')
+    with open(temporary, 'w') as outfile:
+        json.dump(dictionary, outfile, default=convert)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(temporary, out_path)
+
+
+def enqueue_manifest(manifest : dict,
+                     queue_path : str) -> int:
+    """
+    Split a manifest into one task per input file in a queue directory.
+
+    Parameters
+    ----------
+    manifest: dictionary
+        Manifest dictionary, see load_batches.
+    queue_path: string
+        Queue directory, created if needed.
+
+    Returns
+    -------
+    tasks: int
+        Number of tasks in the queue.
+
+    See Also
+    --------
+    schedule_file_jobs
+    run_queue_worker
+    reduce_queue
+
+    Notes
+    -----
+    The manifest is saved in the queue as manifest.json, with its batch
+    dictionaries resolved, for the workers and the reducer. Each task is
+    named after a hash of its file path, so enqueueing the same manifest
+    again adds nothing and keeps finished results.
+
+    Example
+    -------
+    None
+
+    """
+    paths = queue_paths(queue_path=queue_path)
+    for path in paths.values():
+        path.mkdir(parents=True, exist_ok=True)
+    batches = load_batches(manifest=manifest)
+    write_atomic(
+        out_path=Path(f'{queue_path}/manifest.json'),
+        dictionary=dict(
+            manifest,
+            batches=batches,
+            dictionaries=[],
+            defaults={}))
+    file_jobs = schedule_file_jobs(batches=batches)
+    for file_path, jobs in file_jobs.items():
+        task_id = hashlib.sha1(file_path.encode()).hexdigest()[:16]
+        task_path = Path(f'{paths["tasks"]}/{task_id}.json')
+        if task_path.is_file():
+            continue
+        write_atomic(
+            out_path=task_path,
+            dictionary={
+                "file_path": file_path,
+                "jobs": [
+                    dict(job, out_path=str(job["out_path"]))
+                    for job in jobs]})
+    return len(file_jobs)
+
+
+def lease_expired(lease_path : str,
+                  lease_time : float) -> bool:
+    """
+    True if a lease file was last renewed more than lease_time seconds ago.
+    """
+    try:
+        return time.time() - os.stat(lease_path).st_mtime > lease_time
+    except FileNotFoundError:
+        return False
+
+
+def take_lease(lease_path : str,
+               worker : str) -> bool:
+    """
+    Create a lease file, returning False if one already exists.
+    """
+    try:
+        descriptor = os.open(
+            lease_path,
+            os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(descriptor, 'w') as outfile:
+        json.dump({"worker": worker, "claimed": time.time()}, outfile)
+    return True
+
+
+def steal_lease(lease_path : str,
+                worker : str,
+                lease_time : float) -> bool:
+    """
+    Take over an expired lease, returning False if another worker got it.
+    """
+    stale_path = Path(f'{lease_path}.{worker}')
+    try:
+        os.rename(lease_path, stale_path)
+    except (FileNotFoundError, PermissionError):
+        return False
+    if not lease_expired(lease_path=stale_path, lease_time=lease_time):
+        try:
+            os.link(stale_path, lease_path)
+        except OSError:
+            pass
+        os.remove(stale_path)
+        return False
+    os.remove(stale_path)
+    return take_lease(lease_path=lease_path, worker=worker)
+
+
+def claim_task(queue_path : str,
+               worker : str,
+               lease_time : float = 600) -> tuple:
+    """
+    Claim the next unfinished task of a queue.
+
+    Parameters
+    ----------
+    queue_path: string
+        Queue directory.
+    worker: string
+        Worker name, written into the lease.
+    lease_time: float
+        Seconds after which another worker may take over a lease. Must be
+        longer than the time to process one file.
+
+    Returns
+    -------
+    task_id, busy: tuple
+        Claimed task id, or None if no task could be claimed, and the
+        number of unfinished tasks leased by other workers.
+
+    See Also
+    --------
+    run_queue_worker
+
+    Notes
+    -----
+    A lease is taken by creating its file exclusively, which only one
+    worker can do, including over network shares. An expired lease is
+    renamed aside, which again only one worker can do, before it is taken.
+    A task finished while the list was being made is let go again. Tasks
+    are tried in an order that differs between workers, so they
+    rarely contend for the same file.
+
+    Example
+    -------
+    None
+
+    """
+    paths = queue_paths(queue_path=queue_path)
+    finished = {path.stem for path in paths["results"].glob('*.json')}
+    tasks = sorted(
+        (path.stem for path in paths["tasks"].glob('*.json')
+         if path.stem not in finished),
+        key=lambda task_id: hashlib.sha1(
+            f'{worker}{task_id}'.encode()).hexdigest())
+    busy = 0
+    for task_id in tasks:
+        lease_path = Path(f'{paths["leases"]}/{task_id}.lease')
+        claimed = take_lease(lease_path=lease_path, worker=worker) or (
+            lease_expired(lease_path=lease_path, lease_time=lease_time)
+            and steal_lease(
+                lease_path=lease_path,
+                worker=worker,
+                lease_time=lease_time))
+        if not claimed:
+            busy += 1
+        elif Path(f'{paths["results"]}/{task_id}.json').is_file():
+            os.remove(lease_path)
+        else:
+            return task_id, busy
+    return None, busy
+
+
+def run_task(queue_path : str,
+             task_id : str) -> None:
+    """
+    Process one claimed task, write its results and release its lease.
+
+    Parameters
+    ----------
+    queue_path: string
+        Queue directory.
+    task_id: string
+        Claimed task id.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    run_file_jobs
+
+    Notes
+    -----
+    Jobs that need regions of interest selected cannot run unattended and
+    are recorded as errors, as is a file that fails. A task finished by two
+    workers, after a lease was taken over, is written twice with the same
+    results.
+
+    Example
+    -------
+    None
+
+    """
+    paths = queue_paths(queue_path=queue_path)
+    task = load_json(file_path=Path(f'{paths["tasks"]}/{task_id}.json'))
+    jobs = [dict(job, out_path=Path(job["out_path"])) for job in task["jobs"]]
+    try:
+        outcome = run_file_jobs(
+            file_path=task["file_path"],
+            jobs=jobs)
+        completed = outcome["completed"] + [
+            (job, {f'{job["file_name"]} Error':
+                   'regions of interest needed, add them to "regions"'})
+            for job in outcome["pending"]]
+    except Exception as error:
+        print(f'{jobs[0]["file_name"]}: {error}')
+        completed = [
+            (job, {f'{job["file_name"]} Error': str(error)}) for job in jobs]
+    write_atomic(
+        out_path=Path(f'{paths["results"]}/{task_id}.json'),
+        dictionary={"results": [
+            [job["batch"], job["process"], job["file_name"], results]
+            for job, results in completed]})
+    try:
+        os.remove(Path(f'{paths["leases"]}/{task_id}.lease'))
+    except FileNotFoundError:
+        pass
+
+
+def run_queue_worker(queue_path : str,
+                     lease_time : float = 600,
+                     poll : float = 5) -> int:
+    """
+    Work through a queue until every task is finished.
+
+    Parameters
+    ----------
+    queue_path: string
+        Queue directory.
+    lease_time: float
+        Seconds after which a lease may be taken over, see claim_task.
+    poll: float
+        Seconds to wait before looking again when every unfinished task is
+        leased by another worker.
+
+    Returns
+    -------
+    processed: int
+        Number of tasks this worker processed.
+
+    See Also
+    --------
+    enqueue_manifest
+    claim_task
+    run_task
+
+    Notes
+    -----
+    Any number of workers, on any machines sharing the queue directory,
+    can run at once. A worker stays until the last task is finished, so it
+    can take over tasks from workers that stop or crash.
+
+    Example
+    -------
+    >>> run_queue_worker(queue_path='/share/queue')
+
+    """
+    manifest = load_json(file_path=Path(f'{queue_path}/manifest.json'))
+    initialise_worker(
+        cache_path=manifest.get("cache_path"),
+        cache_size=manifest.get("cache_size", 256))
+    worker = f'{socket.gethostname()}-{os.getpid()}'
+    processed = 0
+    while True:
+        task_id, busy = claim_task(
+            queue_path=queue_path,
+            worker=worker,
+            lease_time=lease_time)
+        if task_id is not None:
+            run_task(queue_path=queue_path, task_id=task_id)
+            processed += 1
+        elif busy:
+            time.sleep(poll)
+        else:
+            return processed
+
+
+def queue_finished(queue_path : str) -> bool:
+    """
+    True if every task of a queue has results.
+    """
+    paths = queue_paths(queue_path=queue_path)
+    finished = {path.stem for path in paths["results"].glob('*.json')}
+    return all(
+        path.stem in finished for path in paths["tasks"].glob('*.json'))
+
+
+def reduce_queue(queue_path : str,
+                 wait : bool = True,
+                 poll : float = 5) -> dict:
+    """
+    Combine the results of every task into the batch results files.
+
+    Parameters
+    ----------
+    queue_path: string
+        Queue directory.
+    wait: bool
+        If True, wait for every task to finish first, otherwise combine the
+        results finished so far.
+    poll: float
+        Seconds between checks while waiting.
+
+    Returns
+    -------
+    results: dictionary
+        {results file path: results dictionary} for every batch and process.
+
+    See Also
+    --------
+    batch_results
+    run_manifest
+
+    Notes
+    -----
+    Run once, by any one machine. Results files are written as by
+    run_manifest, {batch_name}_Height.json or {batch_name}_Width.json next
+    to the data.
+
+    Example
+    -------
+    None
+
+    """
+    while wait and not queue_finished(queue_path=queue_path):
+        time.sleep(poll)
+    manifest = load_json(file_path=Path(f'{queue_path}/manifest.json'))
+    batches = load_batches(manifest=manifest)
+    collected = {}
+    results_path = queue_paths(queue_path=queue_path)["results"]
+    for task_path in sorted(results_path.glob('*.json')):
+        task_results = load_json(file_path=task_path)["results"]
+        for batch, process, file_name, file_results in task_results:
+            collected.setdefault((batch, process), {})
+            collected[(batch, process)][file_name] = file_results
+    results = {}
+    for index, batch in enumerate(batches):
+        for process in batch_processes(batch_dictionary=batch):
+            out_path = Path(
+                f'{output_directory(data_path=batch["data_path"])}/'
+                f'{batch["batch_name"]}_{process_suffixes[process][0]}.json')
+            results[out_path] = batch_results(
+                batch_dictionary=batch,
+                process=process,
+                file_results=collected.get((index, process), {}))
+            save_json_dicts(
+                out_path=out_path,
+                dictionary=results[out_path])
+    return results